@@ -13,6 +13,7 @@ class ApiKeys(Enum):
     ApiVersions = ApiKey(code=18, min_version=0, max_version=4)
     DescribeTopicPartitions = ApiKey(code=75, min_version=0, max_version=0)
     Fetch = ApiKey(code=1, min_version=0, max_version=17)
+    Produce = ApiKey(code=0, min_version=9, max_version=11)
 
 
 class ErrorCode(Enum):
@@ -21,5 +22,10 @@ class ErrorCode(Enum):
     NONE = 0
     OFFSET_OUT_OF_RANGE = 1
     CORRUPT_MESSAGE = 2
+    INVALID_REQUIRED_ACKS = 21
     UNSUPPORTED_VERSION = 35
+    KAFKA_STORAGE_ERROR = 56
+    FETCH_SESSION_ID_NOT_FOUND = 70
+    INVALID_FETCH_SESSION_EPOCH = 71
+    INVALID_RECORD = 87
     UNKNOWN_TOPIC_ID = 100
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from ..utils import INT16, INT32, INT8, encode_compact_array, sum_bytes
+from ..kafka_encode import KafkaWriter
+from ..utils import INT16, INT32
 from .api_key import ApiKey, ErrorCode
 
 
@@ -22,42 +23,35 @@ class ApiVersionsResponse:
     throttle_time_ms: int
     tag_buffer: int
 
-    def encode(self) -> bytes:
-        throttle_time_ms = (0).to_bytes(INT32)
-
+    def write(self, writer: KafkaWriter):
         if self.version <= 2:
 
-            def key_to_bytes(key: ApiKeysResponse):
-                return self.api_key_to_bytes(key)
+            def write_key(writer: KafkaWriter, key: ApiKeysResponse):
+                self.write_api_key(writer, key)
         else:
 
-            def key_to_bytes(key: ApiKeysResponse):
-                return self.api_key_to_bytes(key) + key.tag_buffer.to_bytes(INT8)
+            def write_key(writer: KafkaWriter, key: ApiKeysResponse):
+                self.write_api_key(writer, key)
+                writer.write_tag_buffer(key.tag_buffer)
 
-        api_keys = encode_compact_array(self.api_keys, key_to_bytes)
-        error_code = self.error_code.to_bytes(INT16)
         match self.version:
             case 0:
-                return error_code + api_keys
-
+                writer.write_error_code(self.error_code)
+                writer.write_compact_array(self.api_keys, write_key)
             case 1 | 2:
-                return error_code + api_keys + throttle_time_ms
+                writer.write_error_code(self.error_code)
+                writer.write_compact_array(self.api_keys, write_key)
+                writer.write_int(self.throttle_time_ms, INT32)
             case 3 | 4:
-                return (
-                    error_code
-                    + api_keys
-                    + throttle_time_ms
-                    + self.tag_buffer.to_bytes(INT8)
-                )
+                writer.write_error_code(self.error_code)
+                writer.write_compact_array(self.api_keys, write_key)
+                writer.write_int(self.throttle_time_ms, INT32)
+                writer.write_tag_buffer(self.tag_buffer)
             case _:
-                return ErrorCode.UNSUPPORTED_VERSION.value.to_bytes(INT16)
+                writer.write_error_code(ErrorCode.UNSUPPORTED_VERSION.value)
 
     @staticmethod
-    def api_key_to_bytes(api_key: ApiKey) -> bytes:
-        min_version = api_key.min_version
-        max_version = api_key.max_version
-        return (
-            api_key.code.to_bytes(INT16)
-            + min_version.to_bytes(INT16)
-            + max_version.to_bytes(INT16)
-        )
+    def write_api_key(writer: KafkaWriter, api_key: ApiKey):
+        writer.write_int(api_key.code, INT16)
+        writer.write_int(api_key.min_version, INT16)
+        writer.write_int(api_key.max_version, INT16)
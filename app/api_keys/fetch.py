@@ -2,14 +2,10 @@ from __future__ import annotations
 from dataclasses import dataclass
 from uuid import UUID
 
+from app.kafka_encode import Buffer, KafkaWriter
 from app.utils import (
     INT32,
     INT64,
-    INT8,
-    encode_compact_array,
-    encode_error_code,
-    encode_tag_buffer,
-    encode_var_int,
 )
 
 
@@ -63,13 +59,12 @@ class FetchResponse_V17:
     responses: list[FetchResponses_v17]
     tag_buffer: int
 
-    def encode(self) -> bytes:
-        throtle_time_ms = self.throttle_time_ms.to_bytes(INT32)
-        error_code = encode_error_code(self.error_code)
-        session_id = self.session_id.to_bytes(INT32)
-        responses = encode_compact_array(self.responses, lambda r: r.encode())
-        tag = encode_tag_buffer(self.tag_buffer)
-        return throtle_time_ms + error_code + session_id + responses + tag
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.throttle_time_ms, INT32)
+        writer.write_error_code(self.error_code)
+        writer.write_int(self.session_id, INT32)
+        writer.write_compact_array(self.responses, lambda w, r: r.write(w))
+        writer.write_tag_buffer(self.tag_buffer)
 
 
 @dataclass
@@ -78,10 +73,10 @@ class FetchResponses_v17:
     partitions: list[FetchPartitonResponse]
     tag_buffer: int
 
-    def encode(self) -> bytes:
-        partitions = encode_compact_array(self.partitions, lambda p: p.encode())
-        tag = encode_tag_buffer(self.tag_buffer)
-        return self.topic_id.bytes + partitions + tag
+    def write(self, writer: KafkaWriter):
+        writer.write_uuid(self.topic_id)
+        writer.write_compact_array(self.partitions, lambda w, p: p.write(w))
+        writer.write_tag_buffer(self.tag_buffer)
 
 
 @dataclass
@@ -93,39 +88,25 @@ class FetchPartitonResponse:
     log_start_offset: int
     aborted_transactions: list[FetchAbortedTransaction]
     preferred_read_replica: int
-    records: bytes  # COMPACT_RECORDS
+    records: list[Buffer]  # COMPACT_RECORDS, possibly spanning segments
     tag_buffer: int
 
-    def encode(self) -> bytes:
-        index = self.partition_index.to_bytes(INT32)
-        error_code = encode_error_code(self.error_code)
-        high_watermark = self.high_watermark.to_bytes(INT64)
-        last_stable_offset = self.last_stable_offset.to_bytes(INT64)
-        log_start_offset = self.log_start_offset.to_bytes(INT64)
-        aborted_transactions = encode_compact_array(
-            self.aborted_transactions, lambda a: a.encode()
-        )
-        preferred_read_replica = self.preferred_read_replica.to_bytes(INT32)
-        size_records = len(self.records)
-        size_records = encode_var_int(size_records)
-        records_bytes = (1).to_bytes(INT8) if size_records == 0 else self.records
-
-        records = size_records + records_bytes
-
-
-        tag = encode_tag_buffer(self.tag_buffer)
-
-        return (
-            index
-            + error_code
-            + high_watermark
-            + last_stable_offset
-            + log_start_offset
-            + aborted_transactions
-            + preferred_read_replica
-            + records
-            + tag
-        )
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.partition_index, INT32)
+        writer.write_error_code(self.error_code)
+        writer.write_int(self.high_watermark, INT64)
+        writer.write_int(self.last_stable_offset, INT64)
+        writer.write_int(self.log_start_offset, INT64)
+        writer.write_compact_array(self.aborted_transactions, lambda w, a: a.write(w))
+        writer.write_int(self.preferred_read_replica, INT32)
+        writer.write_unsigned_varint(self.records_size())
+        # the log bytes are referenced, not copied into the response
+        for records in self.records:
+            writer.write_buffer(records)
+        writer.write_tag_buffer(self.tag_buffer)
+
+    def records_size(self) -> int:
+        return sum(len(r) for r in self.records)
 
 
 @dataclass
@@ -134,8 +115,7 @@ class FetchAbortedTransaction:
     first_offset: int
     tag_buffer: int
 
-    def encode(self) -> bytes:
-        id = self.producer_id.to_bytes(INT64)
-        offset = self.first_offset.to_bytes(INT64)
-        tag = encode_tag_buffer(self.tag_buffer)
-        return id + offset + tag
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.producer_id, INT64)
+        writer.write_int(self.first_offset, INT64)
+        writer.write_tag_buffer(self.tag_buffer)
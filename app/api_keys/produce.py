@@ -0,0 +1,90 @@
+from __future__ import annotations
+from dataclasses import dataclass
+
+from app.kafka_encode import KafkaWriter
+from app.utils import INT32, INT64
+
+
+# https://kafka.apache.org/protocol.html#The_Messages_Produce
+# versions 9 to 11 share the flexible layout below
+
+
+@dataclass
+class ProduceRequest:
+    transactional_id: str | None
+    acks: int
+    timeout_ms: int
+    topic_data: list[ProduceTopicData]
+    tag_buffer: int
+
+
+@dataclass
+class ProduceTopicData:
+    name: str
+    partition_data: list[ProducePartitionData]
+    tag_buffer: int
+
+
+@dataclass
+class ProducePartitionData:
+    index: int
+    records: memoryview | None  # COMPACT_RECORDS
+    tag_buffer: int
+
+
+@dataclass
+class ProduceResponse:
+    responses: list[ProduceTopicResponse]
+    throttle_time_ms: int
+    tag_buffer: int
+
+    def write(self, writer: KafkaWriter):
+        writer.write_compact_array(self.responses, lambda w, r: r.write(w))
+        writer.write_int(self.throttle_time_ms, INT32)
+        writer.write_tag_buffer(self.tag_buffer)
+
+
+@dataclass
+class ProduceTopicResponse:
+    name: str
+    partition_responses: list[ProducePartitionResponse]
+    tag_buffer: int
+
+    def write(self, writer: KafkaWriter):
+        writer.write_compact_string(self.name)
+        writer.write_compact_array(self.partition_responses, lambda w, p: p.write(w))
+        writer.write_tag_buffer(self.tag_buffer)
+
+
+@dataclass
+class ProducePartitionResponse:
+    index: int
+    error_code: int
+    base_offset: int
+    log_append_time_ms: int
+    log_start_offset: int
+    record_errors: list[ProduceRecordError]
+    error_message: str | None
+    tag_buffer: int
+
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.index, INT32)
+        writer.write_error_code(self.error_code)
+        writer.write_signed_int(self.base_offset, INT64)
+        writer.write_signed_int(self.log_append_time_ms, INT64)
+        writer.write_signed_int(self.log_start_offset, INT64)
+        writer.write_compact_array(self.record_errors, lambda w, e: e.write(w))
+        writer.write_compact_nullable_string(self.error_message)
+        writer.write_tag_buffer(self.tag_buffer)
+
+
+@dataclass
+class ProduceRecordError:
+    batch_index: int
+    batch_index_error_message: str | None
+    tag_buffer: int
+
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.batch_index, INT32)
+        writer.write_compact_nullable_string(self.batch_index_error_message)
+        writer.write_tag_buffer(self.tag_buffer)
@@ -0,0 +1,92 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+from app.framing import MAX_FRAME_SIZE
+from app.kafka_encode import Buffer
+from app.utils import INT32
+
+
+# per connection buffering, reads stop past READ_LIMIT and the handler waits
+# for the client to consume responses past WRITE_HIGH_WATER
+READ_LIMIT = 64 * 1024
+WRITE_HIGH_WATER = 256 * 1024
+
+
+async def serve(
+    address: tuple[str, int],
+    respond: Callable[[bytes], Awaitable[list[Buffer]]],
+    max_connections: int,
+    threads: int,
+):
+    """Serves every connection from one event loop. Idle connections only cost
+    a StreamReader/StreamWriter pair, connections over max_connections are
+    closed right after accept.
+
+    respond runs blocking work on the default executor of the loop, `threads`
+    threads created here, in the process that serves, and shut down with
+    the server."""
+    executor = ThreadPoolExecutor(threads, thread_name_prefix="respond")
+    asyncio.get_running_loop().set_default_executor(executor)
+    connections = asyncio.Semaphore(max_connections)
+
+    async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if connections.locked():
+            print("connection limit reached, closing socket", file=sys.stderr)
+            await close(writer)
+            return
+
+        async with connections:
+            await handle_client(reader, writer, respond)
+
+    server = await asyncio.start_server(
+        on_connect, *address, reuse_port=True, limit=READ_LIMIT
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def handle_client(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    respond: Callable[[bytes], Awaitable[list[Buffer]]],
+):
+    writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+
+    try:
+        while True:
+            try:
+                size_bytes = await reader.readexactly(INT32)
+                msg_size = int.from_bytes(size_bytes)
+                if msg_size > MAX_FRAME_SIZE:
+                    print(f"frame of {msg_size} bytes, closing socket", file=sys.stderr)
+                    break
+                data = size_bytes + await reader.readexactly(msg_size)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+
+            # a delayed Fetch only holds this connection, responses stay in order
+            response = await respond(data)
+            # vectored write, asyncio hands the buffers to sendmsg
+            writer.writelines(response)
+            try:
+                # backpressure: stop reading requests while the client is not
+                # reading responses
+                await writer.drain()
+            except ConnectionError:
+                break
+    finally:
+        await close(writer)
+
+
+async def close(writer: asyncio.StreamWriter):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        # reset by the client, the transport is closed all the same
+        pass
@@ -0,0 +1,62 @@
+"""CRC-32C (Castagnoli), the checksum of Kafka record batches.
+
+The `crc32c` package is used when it is installed; it runs at memory
+bandwidth. The pure Python fallback is table driven, slicing by 8 bytes."""
+
+from struct import Struct
+
+from app.kafka_encode import Buffer
+
+# reversed 0x1EDC6F41
+POLYNOMIAL = 0x82F63B78
+WORDS = Struct("<II")
+
+
+def _tables() -> list[list[int]]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ POLYNOMIAL if crc & 1 else crc >> 1
+        table.append(crc)
+
+    # tables[k][b]: crc of byte b followed by k zero bytes
+    tables = [table]
+    for _ in range(7):
+        previous = tables[-1]
+        tables.append([(c >> 8) ^ table[c & 0xFF] for c in previous])
+    return tables
+
+
+TABLES = _tables()
+
+
+def crc32c_python(data: Buffer, crc: int = 0) -> int:
+    t0, t1, t2, t3, t4, t5, t6, t7 = TABLES
+    view = memoryview(data).cast("B")
+    crc ^= 0xFFFFFFFF
+    words = len(view) // 8 * 8
+    for low, high in WORDS.iter_unpack(view[:words]):
+        low ^= crc
+        crc = (
+            t7[low & 0xFF]
+            ^ t6[(low >> 8) & 0xFF]
+            ^ t5[(low >> 16) & 0xFF]
+            ^ t4[low >> 24]
+            ^ t3[high & 0xFF]
+            ^ t2[(high >> 8) & 0xFF]
+            ^ t1[(high >> 16) & 0xFF]
+            ^ t0[high >> 24]
+        )
+    for byte in view[words:]:
+        crc = t0[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+try:
+    from crc32c import crc32c
+
+    NATIVE = True
+except ImportError:
+    crc32c = crc32c_python
+    NATIVE = False
@@ -0,0 +1,232 @@
+"""Decompression of the records of compressed batches.
+
+The codec is in the low 3 bits of the batch attributes. gzip comes from the
+stdlib; snappy, lz4 and zstd use the python-snappy, lz4 and zstandard
+packages when they are installed, snappy and lz4 fall back to the pure
+Python decoders below."""
+
+import zlib
+from enum import IntEnum
+from struct import Struct
+from typing import Callable
+
+from app.kafka_encode import Buffer
+
+COMPRESSION_MASK = 0x07
+
+
+class Compression(IntEnum):
+    NONE = 0
+    GZIP = 1
+    SNAPPY = 2
+    LZ4 = 3
+    ZSTD = 4
+
+
+class UnsupportedCompressionError(ValueError):
+    pass
+
+
+def decompress_gzip(data: Buffer) -> bytes:
+    # gzip header, or a bare zlib stream
+    return zlib.decompress(data, wbits=zlib.MAX_WBITS | 32)
+
+
+# https://github.com/google/snappy/blob/main/format_description.txt
+
+
+def snappy_decompress_block(data: Buffer) -> bytes:
+    view = memoryview(data).cast("B")
+    length, position = _uvarint(view, 0)
+    out = bytearray()
+    end = len(view)
+    while position < end:
+        tag = view[position]
+        position += 1
+        kind = tag & 0x03
+        if kind == 0:  # literal
+            size = tag >> 2
+            if size >= 60:
+                n = size - 59
+                size = int.from_bytes(view[position : position + n], "little")
+                position += n
+            size += 1
+            out += view[position : position + size]
+            position += size
+            continue
+
+        if kind == 1:
+            size = ((tag >> 2) & 0x07) + 4
+            offset = ((tag >> 5) << 8) | view[position]
+            position += 1
+        else:
+            size = (tag >> 2) + 1
+            n = 2 if kind == 2 else 4
+            offset = int.from_bytes(view[position : position + n], "little")
+            position += n
+        _copy_match(out, offset, size)
+
+    if len(out) != length:
+        raise ValueError(f"snappy: {len(out)} bytes decoded, {length} expected")
+    return bytes(out)
+
+
+# java snappy (xerial) stream: magic, version, compatible version, then
+# blocks prefixed by their int32 size
+XERIAL_MAGIC = b"\x82SNAPPY\x00"
+XERIAL_HEADER_SIZE = len(XERIAL_MAGIC) + 8
+BLOCK_SIZE = Struct(">i")
+
+
+def decompress_snappy_with(block: Callable[[Buffer], bytes], data: Buffer) -> bytes:
+    view = memoryview(data).cast("B")
+    if view[: len(XERIAL_MAGIC)] != XERIAL_MAGIC:
+        return block(view)
+
+    out = bytearray()
+    position = XERIAL_HEADER_SIZE
+    while position < len(view):
+        (size,) = BLOCK_SIZE.unpack_from(view, position)
+        position += BLOCK_SIZE.size
+        out += block(view[position : position + size])
+        position += size
+    return bytes(out)
+
+
+# https://github.com/lz4/lz4/blob/dev/doc/lz4_Frame_format.md
+LZ4_MAGIC = 0x184D2204
+LZ4_BLOCK_SIZE = Struct("<I")
+LZ4_UNCOMPRESSED = 0x80000000
+
+
+def lz4_decompress_frame(data: Buffer) -> bytes:
+    view = memoryview(data).cast("B")
+    if int.from_bytes(view[:4], "little") != LZ4_MAGIC:
+        raise ValueError("lz4: not a frame")
+    flags = view[4]
+    position = 6  # magic, FLG, BD
+    if flags & 0x08:  # content size
+        position += 8
+    if flags & 0x01:  # dictionary id
+        position += 4
+    position += 1  # header checksum
+    block_checksum = flags & 0x10
+
+    # blocks may refer to the previous ones, decode them all in one buffer
+    out = bytearray()
+    while True:
+        (size,) = LZ4_BLOCK_SIZE.unpack_from(view, position)
+        position += LZ4_BLOCK_SIZE.size
+        if size == 0:  # end mark
+            break
+        block = view[position : position + (size & ~LZ4_UNCOMPRESSED)]
+        position += len(block)
+        if size & LZ4_UNCOMPRESSED:
+            out += block
+        else:
+            _lz4_decompress_block(block, out)
+        if block_checksum:
+            position += 4
+    return bytes(out)
+
+
+def _lz4_decompress_block(block: memoryview, out: bytearray):
+    position = 0
+    end = len(block)
+    while position < end:
+        token = block[position]
+        position += 1
+
+        size = token >> 4
+        if size == 15:
+            while True:
+                extra = block[position]
+                position += 1
+                size += extra
+                if extra != 255:
+                    break
+        out += block[position : position + size]
+        position += size
+        if position >= end:  # the last sequence has no match
+            break
+
+        offset = block[position] | (block[position + 1] << 8)
+        position += 2
+        size = token & 0x0F
+        if size == 15:
+            while True:
+                extra = block[position]
+                position += 1
+                size += extra
+                if extra != 255:
+                    break
+        _copy_match(out, offset, size + 4)
+
+
+def _copy_match(out: bytearray, offset: int, size: int):
+    if offset == 0 or offset > len(out):
+        raise ValueError(f"match offset {offset} out of range")
+    start = len(out) - offset
+    if size <= offset:
+        out += out[start : start + size]
+        return
+    # overlapping: the match repeats the last `offset` bytes
+    pattern = out[start:]
+    repeat, rest = divmod(size, offset)
+    out += pattern * repeat + pattern[:rest]
+
+
+def _uvarint(view: memoryview, position: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = view[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _codecs() -> dict[int, Callable[[Buffer], bytes]]:
+    codecs: dict[int, Callable[[Buffer], bytes]] = {
+        Compression.GZIP: decompress_gzip,
+    }
+
+    try:
+        import snappy
+
+        snappy_block = snappy.decompress
+    except ImportError:
+        snappy_block = snappy_decompress_block
+    codecs[Compression.SNAPPY] = lambda data: decompress_snappy_with(
+        snappy_block, data
+    )
+
+    try:
+        import lz4.frame
+
+        codecs[Compression.LZ4] = lz4.frame.decompress
+    except ImportError:
+        codecs[Compression.LZ4] = lz4_decompress_frame
+
+    try:
+        import zstandard
+
+        codecs[Compression.ZSTD] = lambda data: (
+            zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        )
+    except ImportError:
+        pass
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def decompress(codec: int, data: Buffer) -> bytes:
+    decode = CODECS.get(codec)
+    if decode is None:
+        name = Compression(codec).name if codec in Compression else codec
+        raise UnsupportedCompressionError(f"compression {name} is not supported")
+    return decode(data)
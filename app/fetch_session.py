@@ -0,0 +1,135 @@
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable
+from uuid import UUID
+
+from app.api_keys import ErrorCode
+from app.api_keys.fetch import (
+    FetchRequest_V17,
+    FetchRequest_V17Partition,
+    FetchRequest_V17Topic,
+)
+from app.utils import INT32_MAX
+
+# KIP-227: Introduce Incremental FetchRequests to Increase Partition Scalability
+NO_SESSION = 0
+# a full fetch that opens a session
+INITIAL_EPOCH = 0
+# a full fetch without (or closing) a session
+FINAL_EPOCH = -1
+
+
+@dataclass
+class FetchSession:
+    id: int
+    # epoch the next incremental fetch must carry
+    epoch: int
+    # the last fetch position sent for each partition, in the order they
+    # were added
+    partitions: dict[tuple[UUID, int], FetchRequest_V17Partition]
+    # (fetch offset, log end) of the partitions last answered without
+    # records, they are not read again until one of them moves
+    idle: dict[tuple[UUID, int], tuple[int, Hashable]] = field(default_factory=dict)
+
+    def topics(self) -> list[FetchRequest_V17Topic]:
+        topics: dict[UUID, FetchRequest_V17Topic] = {}
+        for (topic_id, _), p in self.partitions.items():
+            topic = topics.get(topic_id)
+            if topic is None:
+                topic = topics[topic_id] = FetchRequest_V17Topic(topic_id, [], 0)
+            topic.partitions.append(p)
+        return list(topics.values())
+
+
+@dataclass
+class SessionFetch:
+    """What a Fetch reads once resolved against its session."""
+
+    error: ErrorCode
+    session_id: int
+    topics: list[FetchRequest_V17Topic]
+    # only the partitions with records or errors are answered
+    incremental: bool
+    idle: dict[tuple[UUID, int], tuple[int, Hashable]] = field(default_factory=dict)
+
+
+class FetchSessionCache:
+    """Fetch sessions by id, the least recently used is evicted to make room
+    for a new one past max_sessions.
+
+    A consumer with a session only sends the partitions whose fetch position
+    changed, and the topics it stops fetching."""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[int, FetchSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def update(self, body: FetchRequest_V17) -> SessionFetch:
+        session_id, epoch = body.session_id, body.session_epoch
+        if epoch in (INITIAL_EPOCH, FINAL_EPOCH):
+            # a full fetch replaces the session it carries
+            if session_id != NO_SESSION:
+                self.remove(session_id)
+            session_id = NO_SESSION
+            if epoch == INITIAL_EPOCH:
+                session_id = self._create(body)
+            return SessionFetch(ErrorCode.NONE, session_id, body.topics, False)
+        if session_id == NO_SESSION:
+            return session_error(ErrorCode.INVALID_FETCH_SESSION_EPOCH)
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return session_error(ErrorCode.FETCH_SESSION_ID_NOT_FOUND)
+            if epoch != session.epoch:
+                return session_error(ErrorCode.INVALID_FETCH_SESSION_EPOCH)
+            self._sessions.move_to_end(session_id)
+            session.epoch = next_epoch(epoch)
+
+            for topic in body.topics:
+                for p in topic.partitions:
+                    session.partitions[topic.topic_id, p.partition] = p
+            for forgotten in body.forgotten_topics_data:
+                for index in forgotten.partitions:
+                    session.partitions.pop((forgotten.topic_id, index), None)
+                    session.idle.pop((forgotten.topic_id, index), None)
+            topics = session.topics()
+        return SessionFetch(ErrorCode.NONE, session_id, topics, True, session.idle)
+
+    def remove(self, session_id: int):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _create(self, body: FetchRequest_V17) -> int:
+        """Id of the new session, NO_SESSION when there is nothing to keep."""
+        if self.max_sessions <= 0 or not body.topics:
+            return NO_SESSION
+        partitions = {
+            (topic.topic_id, p.partition): p
+            for topic in body.topics
+            for p in topic.partitions
+        }
+        with self._lock:
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+            session_id = NO_SESSION
+            while session_id == NO_SESSION or session_id in self._sessions:
+                session_id = random.randint(1, INT32_MAX)
+            self._sessions[session_id] = FetchSession(
+                session_id, next_epoch(INITIAL_EPOCH), partitions
+            )
+        return session_id
+
+
+def next_epoch(epoch: int) -> int:
+    return 1 if epoch == INT32_MAX else epoch + 1
+
+
+def session_error(error: ErrorCode) -> SessionFetch:
+    return SessionFetch(error, NO_SESSION, [], False)
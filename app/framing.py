@@ -0,0 +1,105 @@
+import os
+import socket
+from typing import Iterator
+
+from app.kafka_encode import Buffer
+from app.utils import INT32
+
+
+# https://kafka.apache.org/protocol.html#protocol_common
+# every request is an INT32 msg_size followed by msg_size bytes
+MAX_FRAME_SIZE = 100 * 1024 * 1024  # socket.request.max.bytes default
+RECV_SIZE = 64 * 1024
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+
+
+class FrameBuffer:
+    """Reusable growable receive buffer that splits the byte stream of a
+    connection into complete length-prefixed frames."""
+
+    def __init__(self, capacity: int = RECV_SIZE):
+        self._buffer = bytearray(capacity)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def recv_into(self, client: socket.socket, size: int = RECV_SIZE) -> int:
+        self._reserve(size)
+        view = memoryview(self._buffer)
+        n = client.recv_into(view[self._end :], size)
+        view.release()
+        self._end += n
+        return n
+
+    def feed(self, data: bytes) -> None:
+        size = len(data)
+        self._reserve(size)
+        self._buffer[self._end : self._end + size] = data
+        self._end += size
+
+    def frames(self) -> Iterator[bytes]:
+        """Yields every complete frame (msg_size prefix included) currently
+        buffered, leaving a trailing partial frame for the next read. The
+        buffer must not be fed until the iteration ends."""
+        # frames are copied once, out of a view of the buffer; it cannot
+        # grow while the view is held
+        view = memoryview(self._buffer)
+        try:
+            while len(self) >= INT32:
+                start = self._start
+                msg_size = int.from_bytes(self._buffer[start : start + INT32])
+                if msg_size > MAX_FRAME_SIZE:
+                    raise ValueError(
+                        f"frame of {msg_size} bytes exceeds {MAX_FRAME_SIZE}"
+                    )
+
+                frame_end = start + INT32 + msg_size
+                if frame_end > self._end:
+                    # make room for the rest of the frame in one go
+                    view.release()
+                    self._reserve(frame_end - self._end)
+                    break
+
+                frame = bytes(view[start:frame_end])
+                self._start = frame_end
+                yield frame
+        finally:
+            view.release()
+
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _reserve(self, size: int) -> None:
+        if len(self._buffer) - self._end >= size:
+            return
+
+        pending = len(self)
+        if self._start > 0:
+            self._buffer[:pending] = self._buffer[self._start : self._end]
+            self._start, self._end = 0, pending
+
+        capacity = len(self._buffer)
+        while capacity - pending < size:
+            capacity *= 2
+        if capacity > len(self._buffer):
+            self._buffer.extend(bytes(capacity - len(self._buffer)))
+
+
+def send_buffers(client: socket.socket, buffers: list[Buffer]):
+    """Writes the buffers with sendmsg (writev), so payloads referenced by
+    the response, such as Fetch records, are never joined into one bytes
+    object."""
+    views = [memoryview(b).cast("B") for b in buffers if len(b) != 0]
+    first = 0
+    while first < len(views):
+        sent = client.sendmsg(views[first : first + IOV_MAX])
+        while sent > 0:
+            size = views[first].nbytes
+            if sent >= size:
+                sent -= size
+                first += 1
+            else:
+                views[first] = views[first][sent:]
+                sent = 0
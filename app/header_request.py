@@ -2,7 +2,8 @@ from dataclasses import dataclass
 from typing import Optional
 
 from app.api_keys.api_key import ApiKeys, ErrorCode
-from app.utils import INT16, INT32, INT8
+from app.kafka_encode import KafkaWriter
+from app.utils import INT32
 
 
 @dataclass
@@ -14,26 +15,20 @@ class HeaderRequest:
     client_id: str
     tag_buffer: Optional[int]
 
-    def encode(self) -> bytes:
-        id = self.correlation_id.to_bytes(INT32)
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.correlation_id, INT32)
 
         if self.api_key == ApiKeys.ApiVersions.value.code:
-            return id
+            return
 
-        if self.tag_buffer is None:
-            return id
-        else:
-            tag_buffer = self.tag_buffer.to_bytes(INT8)
-
-            return id + tag_buffer
+        if self.tag_buffer is not None:
+            writer.write_tag_buffer(self.tag_buffer)
 
 
 @dataclass
 class UnknownApiKeyResponse:
     api_key: int
 
-    def encode(self) -> bytes:
-        error = ErrorCode.UNKNOWN.value.to_bytes(INT16)
-        key = self.api_key.to_bytes(INT32)
-
-        return key + error
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.api_key, INT32)
+        writer.write_error_code(ErrorCode.UNKNOWN.value)
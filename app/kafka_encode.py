@@ -1,5 +1,130 @@
-from typing import Protocol
+from struct import Struct
+from typing import Callable, Protocol
+from uuid import UUID
+
+from app.utils import INT16, INT32, INT64, INT8, encode_unsigned_varint
+
+UNSIGNED_INTS = {
+    INT8: Struct(">B"),
+    INT16: Struct(">H"),
+    INT32: Struct(">I"),
+    INT64: Struct(">Q"),
+}
+
+SIGNED_INTS = {
+    INT8: Struct(">b"),
+    INT16: Struct(">h"),
+    INT32: Struct(">i"),
+    INT64: Struct(">q"),
+}
+
+Buffer = bytes | bytearray | memoryview
+
+
+class KafkaWriter:
+    """Single pass encoder.
+
+    Fields are appended to a bytearray chunk, payloads written with
+    `write_buffer` (Fetch records) are kept as references next to the chunks
+    instead of being copied. `getvalue` joins everything with one allocation
+    of the precomputed size, `buffers` hands the pieces out for vectored
+    writes."""
+
+    __slots__ = ("_buffers", "_chunk", "_size")
+
+    def __init__(self):
+        self._buffers: list[Buffer] = []
+        self._chunk = bytearray()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size + len(self._chunk)
+
+    def write_int(self, value: int, type_int: int):
+        self._chunk += UNSIGNED_INTS[type_int].pack(value)
+
+    def write_signed_int(self, value: int, type_int: int):
+        self._chunk += SIGNED_INTS[type_int].pack(value)
+
+    def write_bool(self, value: bool):
+        self._chunk.append(value)
+
+    def write_tag_buffer(self, tag: int):
+        self._chunk.append(tag)
+
+    def write_error_code(self, code: int):
+        self.write_signed_int(code, INT16)
+
+    def write_unsigned_varint(self, value: int):
+        self._chunk += encode_unsigned_varint(value)
+
+    def write_bytes(self, data: Buffer):
+        self._chunk += data
+
+    def write_buffer(self, data: Buffer):
+        """Appends data by reference, it must not change until the message is
+        sent."""
+        if len(data) == 0:
+            return
+        self._flush()
+        self._buffers.append(data)
+        self._size += len(data)
+
+    def write_uuid(self, uuid: UUID):
+        self._chunk += uuid.bytes
+
+    def write_compact_string(self, string: str):
+        encode_str = string.encode()
+        self.write_unsigned_varint(len(encode_str) + 1)
+        self._chunk += encode_str
+
+    def write_compact_nullable_string(self, string: str | None):
+        if string is None:
+            self.write_unsigned_varint(0)
+        else:
+            self.write_compact_string(string)
+
+    def write_compact_array[T](
+        self, array: list[T], write: Callable[["KafkaWriter", T], None]
+    ):
+        self.write_unsigned_varint(len(array) + 1)
+        for v in array:
+            write(self, v)
+
+    def write_int32(self, value: int):
+        self.write_int(value, INT32)
+
+    def buffers(self) -> list[Buffer]:
+        self._flush()
+        return self._buffers
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.buffers())
+
+    def _flush(self):
+        if self._chunk:
+            self._size += len(self._chunk)
+            self._buffers.append(self._chunk)
+            self._chunk = bytearray()
+
+
+class Encoded:
+    """A message encoded ahead of time, written by reference."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def write(self, writer: KafkaWriter):
+        writer.write_buffer(self.data)
 
 
 class KafkaEncode(Protocol):
-    def encode(self) -> bytes: ...
+    def write(self, writer: KafkaWriter) -> None: ...
+
+
+def encode(message: KafkaEncode) -> bytes:
+    writer = KafkaWriter()
+    message.write(writer)
+    return writer.getvalue()
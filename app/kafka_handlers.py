@@ -1,6 +1,10 @@
-from dataclasses import dataclass
 import os
+import random
+import sys
+import threading
+import time
 from pathlib import Path
+from typing import Hashable
 from uuid import UUID
 
 from app.api_keys.api_version import (
@@ -23,10 +27,37 @@ from app.api_keys.fetch import (
     FetchResponse_V17,
     FetchResponses_v17,
 )
+from app.api_keys.produce import (
+    ProducePartitionData,
+    ProducePartitionResponse,
+    ProduceRequest,
+    ProduceResponse,
+    ProduceTopicResponse,
+)
+from app.checksum import NATIVE
+from app.fetch_session import FetchSessionCache, SessionFetch
 from app.header_request import HeaderRequest
+from app.kafka_encode import Buffer, Encoded, encode
 from app.kafka_parser import PartitionRecordValue
+from app.metadata import Context, MetadataFollower
+from app.metadata_snapshot import (
+    InvalidSnapshot,
+    MetadataSnapshot,
+    read_snapshot,
+    write_snapshot,
+)
+from app.purgatory import DelayedResponse, Purgatory
+from app.storage import (
+    SEGMENT_BYTES,
+    CorruptRecordsError,
+    InvalidRecordsError,
+    LogManager,
+    LogSegment,
+    valid_batches_size,
+)
+from app.topic_descriptions import TopicDescriptionCache
 
-from . import api_keys
+from . import api_keys, parallel_metadata
 from . import kafka_parser
 
 from app.api_keys import ErrorCode, ApiKeys
@@ -35,12 +66,6 @@ from app.api_keys.api_key import ApiKey
 from .utils import INT32
 
 
-@dataclass
-class Context:
-    topics: dict[str, UUID]
-    topics_partitions: dict[str, list[kafka_parser.PartitionRecordValue]]
-
-
 def get_log_dir() -> Path:
     log_dir = os.getenv("KAFKA_LOG_DIR")
     if log_dir:
@@ -50,48 +75,173 @@ def get_log_dir() -> Path:
 
 
 KAFKA_LOG_DIR = get_log_dir()
+LOGS = LogManager(
+    KAFKA_LOG_DIR, int(os.getenv("KAFKA_SEGMENT_BYTES", str(SEGMENT_BYTES)))
+)
+# produce requests with acks wait for their batches to be fsynced
+PRODUCE_FSYNC = os.getenv("KAFKA_PRODUCE_FSYNC", "1") != "0"
+# encoded ApiVersions bodies by request version and handled api keys
+API_VERSIONS_BODIES: dict[tuple[int, tuple[int, ...]], Encoded] = {}
+TOPIC_DESCRIPTIONS = TopicDescriptionCache()
+# fetch requests waiting for min_bytes, woken by produce
+FETCH_PURGATORY = Purgatory()
+FETCH_SESSIONS = FetchSessionCache(int(os.getenv("KAFKA_MAX_FETCH_SESSIONS", "1000")))
 
 
-def load_metada():
+def get_metadata_log() -> Path:
     env_path = os.getenv("KAFKA_LOG")
     if env_path is None:
         path = "__cluster_metadata-0/00000000000000000000.log"
     else:
         path = env_path
-    kafka_logs = KAFKA_LOG_DIR / path
+    return KAFKA_LOG_DIR / path
 
-    global KAFKA_METADA_BYTES
-    kafka_log_bytes = kafka_logs.read_bytes()
-    KAFKA_METADA_BYTES = kafka_log_bytes
-    batchs = kafka_parser.parse_kafka_cluster_log(kafka_log_bytes)
 
-    topics: dict[str, UUID] = {}
+def get_metadata_snapshot() -> Path:
+    env_path = os.getenv("KAFKA_METADATA_SNAPSHOT")
+    if env_path is None:
+        return get_metadata_log().with_suffix(".checkpoint")
+    return KAFKA_LOG_DIR / env_path
+
+
+def get_metadata_crc_check() -> bool:
+    """Whether the metadata batches are checked as they are loaded: by
+    default only with the native crc32c, the pure Python one makes loading
+    a large log noticeably slower."""
+    check = os.getenv("KAFKA_METADATA_CRC_CHECK", "always" if NATIVE else "off")
+    if check not in ("off", "always"):
+        raise ValueError(f"KAFKA_METADATA_CRC_CHECK: unknown mode {check!r}")
+    return check == "always"
+
+
+METADATA = MetadataFollower(get_metadata_log(), get_metadata_crc_check())
+METADATA_SNAPSHOT = get_metadata_snapshot()
+# log position covered by the snapshot on disk
+snapshot_position = -1
+
+
+def get_metadata_decode_workers() -> int:
+    """Processes decoding the metadata log at startup, 1 decodes it
+    sequentially."""
+    return int(os.getenv("KAFKA_METADATA_DECODE_WORKERS", "1"))
+
+
+def load_metada() -> Context:
+    """Starts from the snapshot, when it matches the log, so only the batches
+    appended after it are parsed."""
+    global snapshot_position
+    try:
+        snapshot = read_snapshot(METADATA_SNAPSHOT)
+    except (OSError, InvalidSnapshot) as e:
+        print(f"metadata snapshot {METADATA_SNAPSHOT} ignored: {e}", file=sys.stderr)
+        snapshot = None
+    if snapshot is not None and METADATA.restore(
+        snapshot.context,
+        snapshot.position,
+        snapshot.last_batch_position,
+        snapshot.last_batch_offset,
+    ):
+        snapshot_position = snapshot.position
+    # a large tail on several processes, then whatever it left sequentially
+    parallel_metadata.poll(METADATA, get_metadata_decode_workers())
+    METADATA.poll()
+    return METADATA.context
 
-    topics_partitions: dict[str, list[kafka_parser.PartitionRecordValue]] = {}
-    feature_levels = {}
 
-    for batch in batchs.values():
-        for record in batch.records:
-            match record.value:
-                case kafka_parser.PartitionRecordValue() as value:
-                    key = str(value.topic_uuid)
-                    if topics_partitions.get(key) is None:
-                        topics_partitions[key] = []
-                    topics_partitions[key].append(value)
+CONTEXT = load_metada()
 
-                case kafka_parser.TopicRecord() as value:
-                    topics[value.name] = value.uuid
-                case kafka_parser.FeatureLevelRecordValue() as value:
-                    feature_levels[value.name] = value.feature_level
 
-    return Context(topics, topics_partitions)
+def get_context() -> Context:
+    return CONTEXT
 
 
-CONTEXT = load_metada()
+def save_metadata_snapshot():
+    global snapshot_position
+    snapshot = MetadataSnapshot(
+        METADATA.context,
+        METADATA.position,
+        METADATA.last_batch_position,
+        METADATA.last_batch_offset,
+    )
+    write_snapshot(METADATA_SNAPSHOT, snapshot)
+    snapshot_position = snapshot.position
+
+
+def get_metadata_snapshot_interval_s() -> float:
+    return int(os.getenv("KAFKA_METADATA_SNAPSHOT_MS", "60000")) / 1000
+
+
+def save_loaded_metadata():
+    """Snapshots the metadata loaded at startup when the snapshot on disk is
+    behind it, so that the next startup does not replay the log again even
+    if the log is not followed."""
+    if get_metadata_snapshot_interval_s() <= 0:
+        return
+    if METADATA.position == snapshot_position:
+        return
+    try:
+        save_metadata_snapshot()
+    except OSError as e:
+        print(f"metadata snapshot failed: {e}", file=sys.stderr)
+
+
+def follow_metadata(interval_s: float, snapshot_interval_s: float):
+    """Applies the batches appended to the metadata log every interval_s,
+    swapping CONTEXT for the new immutable Context, and snapshots it every
+    snapshot_interval_s if it moved."""
+    global CONTEXT
+    snapshot_at = 0.0
+    while True:
+        try:
+            context = METADATA.poll()
+        except Exception as e:
+            print("metadata reload failed: ", e, file=sys.stderr)
+            context = None
+        if context is not None:
+            CONTEXT = context
+
+        now = time.monotonic()
+        due = snapshot_interval_s > 0 and now - snapshot_at >= snapshot_interval_s
+        if due and METADATA.position != snapshot_position:
+            snapshot_at = now
+            try:
+                save_metadata_snapshot()
+            except OSError as e:
+                print(f"metadata snapshot failed: {e}", file=sys.stderr)
+        time.sleep(interval_s)
+
+
+def start_metadata_follower():
+    interval_ms = int(os.getenv("KAFKA_METADATA_POLL_MS", "500"))
+    if interval_ms <= 0:
+        return
+    thread = threading.Thread(
+        target=follow_metadata,
+        args=(interval_ms / 1000, get_metadata_snapshot_interval_s()),
+        daemon=True,
+    )
+    thread.start()
 
 
-def get_context() -> Context:
-    return CONTEXT
+def get_fetch_crc_check() -> str:
+    check = os.getenv("KAFKA_FETCH_CRC_CHECK", "off")
+    if check not in ("off", "sampled", "always"):
+        raise ValueError(f"KAFKA_FETCH_CRC_CHECK: unknown mode {check!r}")
+    return check
+
+
+FETCH_CRC_CHECK = get_fetch_crc_check()
+FETCH_CRC_SAMPLE_RATE = float(os.getenv("KAFKA_FETCH_CRC_SAMPLE_RATE", "0.01"))
+
+
+def should_check_crc() -> bool:
+    match FETCH_CRC_CHECK:
+        case "always":
+            return True
+        case "sampled":
+            return random.random() < FETCH_CRC_SAMPLE_RATE
+        case _:
+            return False
 
 
 def describe_topic_partitions(
@@ -100,10 +250,8 @@ def describe_topic_partitions(
 ) -> DescribeTopicPartitionResponse:
     context = get_context()
 
-    def to_topic_response(topic_name: str) -> DescribeTopicResponse:
-        topic_uuid = context.topics.get(topic_name)
-
-        if topic_uuid is None:
+    def to_topic_response(topic_name: str) -> DescribeTopicResponse | Encoded:
+        if topic_name not in context.topics:
             return DescribeTopicResponse(
                 error_code=ErrorCode.UNKNOWN_TOPIC_OR_PARTITION,
                 topic=topic_name,
@@ -113,36 +261,7 @@ def describe_topic_partitions(
                 topic_authorized_operations=0x00000DF8,
                 tag_buffer=0,
             )
-
-        partitions = context.topics_partitions.get(str(topic_uuid), [])
-
-        def to_partiton_response(
-            p: kafka_parser.PartitionRecordValue,
-        ) -> DescribePartitionResponse:
-            return DescribePartitionResponse(
-                error_code=ErrorCode.NONE,
-                partition_index=p.id,
-                leader_id=p.leader,
-                leader_epoch=p.leader_epoch,
-                replica_nodes=p.replicas,
-                isr_nodes=p.sync_replicas,
-                eligible_leader_replicas=[],
-                last_known_elr=[],
-                offline_replicas=p.removing_replicas,
-                tag_buffer=0,
-            )
-
-        response_partitions = [to_partiton_response(p) for p in partitions]
-
-        return DescribeTopicResponse(
-            error_code=ErrorCode.NONE,
-            topic=topic_name,
-            topic_id=topic_uuid,
-            is_internal=False,
-            partitions=response_partitions,
-            topic_authorized_operations=0x00000DF8,
-            tag_buffer=0,
-        )
+        return TOPIC_DESCRIPTIONS.get(context, topic_name, describe_topic)
 
     topics = [to_topic_response(t) for t in body.topics]
 
@@ -155,8 +274,54 @@ def describe_topic_partitions(
     )
 
 
-def api_versions(
-    header: HeaderRequest, body: ApiVersionsRequest
+def describe_topic(
+    topic_name: str, topic_uuid: UUID, partitions: list[PartitionRecordValue]
+) -> DescribeTopicResponse:
+    def to_partiton_response(
+        p: kafka_parser.PartitionRecordValue,
+    ) -> DescribePartitionResponse:
+        return DescribePartitionResponse(
+            error_code=ErrorCode.NONE,
+            partition_index=p.id,
+            leader_id=p.leader,
+            leader_epoch=p.leader_epoch,
+            replica_nodes=p.replicas,
+            isr_nodes=p.sync_replicas,
+            eligible_leader_replicas=[],
+            last_known_elr=[],
+            offline_replicas=p.removing_replicas,
+            tag_buffer=0,
+        )
+
+    response_partitions = [to_partiton_response(p) for p in partitions]
+
+    return DescribeTopicResponse(
+        error_code=ErrorCode.NONE,
+        topic=topic_name,
+        topic_id=topic_uuid,
+        is_internal=False,
+        partitions=response_partitions,
+        topic_authorized_operations=0x00000DF8,
+        tag_buffer=0,
+    )
+
+
+def api_versions(header: HeaderRequest, body: ApiVersionsRequest) -> Encoded:
+    """Every client starts with ApiVersions and the answer only depends on the
+    request version and the handled api keys: it is encoded once for them,
+    the response header adds the correlation id."""
+    key = (header.api_version, tuple(get_handles()))
+    encoded = API_VERSIONS_BODIES.get(key)
+    if encoded is None:
+        encoded = Encoded(encode(api_versions_response(*key)))
+        # unsupported versions are answered with an error, not cached
+        if header.api_version <= ApiKeys.ApiVersions.value.max_version:
+            API_VERSIONS_BODIES[key] = encoded
+    return encoded
+
+
+def api_versions_response(
+    version: int, handled: tuple[int, ...]
 ) -> ApiVersionsResponse:
     def api_keys_to_response(k: ApiKey) -> ApiKeysResponse:
         return ApiKeysResponse(
@@ -166,10 +331,10 @@ def api_versions(
             tag_buffer=0,
         )
 
-    keys = [api_keys_to_response(k.value) for k in ApiKeys]
+    keys = [api_keys_to_response(k.value) for k in ApiKeys if k.value.code in handled]
 
     return ApiVersionsResponse(
-        version=header.api_version,
+        version=version,
         error_code=ErrorCode.NONE.value,
         api_keys=keys,
         throttle_time_ms=0,
@@ -177,32 +342,115 @@ def api_versions(
     )
 
 
-def fetch(header: HeaderRequest, body: FetchRequest_V17) -> FetchResponse_V17:
+def fetch(
+    header: HeaderRequest, body: FetchRequest_V17
+) -> FetchResponse_V17 | DelayedResponse:
+    """Answers once min_bytes are available, or after max_wait_ms: until then
+    the request is parked in FETCH_PURGATORY and woken by produce.
+
+    The partitions read are those of the fetch session, see FETCH_SESSIONS."""
+    session = FETCH_SESSIONS.update(body)
+    if session.error != ErrorCode.NONE:
+        return FetchResponse_V17(
+            throttle_time_ms=0,
+            error_code=session.error.value,
+            session_id=session.session_id,
+            responses=[],
+            tag_buffer=0,
+        )
+
+    response = read_fetch(body, session)
+    if body.max_wait_ms == 0 or fetch_satisfied(response, body.min_bytes):
+        return response
+
+    keys = []
+    for topic in session.topics:
+        topic_name = find_topic_name(topic.topic_id)
+        keys += [(topic_name, p.partition) for p in topic.partitions]
+
+    def complete(expired: bool) -> FetchResponse_V17 | None:
+        response = read_fetch(body, session)
+        if expired or fetch_satisfied(response, body.min_bytes):
+            return response
+        return None
+
+    deadline = time.monotonic() + body.max_wait_ms / 1000
+    return DelayedResponse(FETCH_PURGATORY, keys, deadline, complete)
+
+
+def fetch_satisfied(response: FetchResponse_V17, min_bytes: int) -> bool:
+    """Like Kafka's DelayedFetch, an error is answered right away."""
+    size = 0
+    for topic in response.responses:
+        for p in topic.partitions:
+            if p.error_code != ErrorCode.NONE.value:
+                return True
+            size += p.records_size()
+    return size >= min_bytes
+
+
+def read_fetch(body: FetchRequest_V17, session: SessionFetch) -> FetchResponse_V17:
+    remaining_bytes = body.max_bytes
+    responses = []
+    for topic in session.topics:
+        if session.incremental:
+            topic, ends = changed_partitions(topic, session.idle)
+            if not topic.partitions:
+                continue
+        response = to_response(topic, remaining_bytes, body.max_bytes)
+        remaining_bytes -= sum(p.records_size() for p in response.partitions)
+        if session.incremental:
+            # the consumer keeps what it was last told of the others
+            answered = []
+            for p in response.partitions:
+                key = (topic.topic_id, p.partition_index)
+                if p.records or p.error_code != ErrorCode.NONE.value:
+                    session.idle.pop(key, None)
+                    answered.append(p)
+                else:
+                    session.idle[key] = ends[p.partition_index]
+            response.partitions = answered
+            if not answered:
+                continue
+        responses.append(response)
+
     return FetchResponse_V17(
         error_code=ErrorCode.NONE.value,
         throttle_time_ms=0,
-        session_id=0,
-        responses=[to_response(t) for t in body.topics],
+        session_id=session.session_id,
+        responses=responses,
         tag_buffer=0,
     )
 
 
-def find_topic_name(topic_id: UUID) -> str | None:
-    context = get_context()
-    recorded_topic = list(
-        filter(lambda item: item[1] == topic_id, context.topics.items())
-    )
+def changed_partitions(
+    topic: FetchRequest_V17Topic, idle: dict[tuple[UUID, int], tuple[int, Hashable]]
+) -> tuple[FetchRequest_V17Topic, dict[int, tuple[int, Hashable]]]:
+    """The partitions of a fetch session worth reading: new fetch offset or
+    batches appended since they were last answered without records. Also
+    returns the (fetch offset, log end) of each."""
+    topic_name = find_topic_name(topic.topic_id)
+    if topic_name is None:
+        return topic, {}
+
+    partitions = []
+    ends = {}
+    for p in topic.partitions:
+        log = LOGS.get(topic_name, p.partition)
+        end = (p.fetch_offset, None if log is None else log.end())
+        if idle.get((topic.topic_id, p.partition)) != end:
+            partitions.append(p)
+            ends[p.partition] = end
+    return FetchRequest_V17Topic(topic.topic_id, partitions, topic.tag_buffer), ends
 
-    len_recorded_topic = len(recorded_topic)
-    if len_recorded_topic == 0:
-        return None
 
-    assert len_recorded_topic == 1, f"more topics founded {recorded_topic}"
-    topic_name, topic_uuid = recorded_topic[0]
-    return topic_name
+def find_topic_name(topic_id: UUID) -> str | None:
+    return get_context().topic_names.get(topic_id)
 
 
-def to_response(topic: FetchRequest_V17Topic) -> FetchResponses_v17:
+def to_response(
+    topic: FetchRequest_V17Topic, remaining_bytes: int, max_bytes: int
+) -> FetchResponses_v17:
     topic_name = find_topic_name(topic.topic_id)
     if topic_name is None:
         return FetchResponses_v17(
@@ -216,35 +464,154 @@ def to_response(topic: FetchRequest_V17Topic) -> FetchResponses_v17:
                     log_start_offset=0,
                     aborted_transactions=[],
                     preferred_read_replica=0,
-                    records=bytes(),
+                    records=[],
                     tag_buffer=0,
                 )
             ],
             0,
         )
 
-    return FetchResponses_v17(
-        topic.topic_id,
-        [to_partition_response(p.partition, topic_name) for p in topic.partitions],
-        0,
-    )
+    partitions = []
+    for p in topic.partitions:
+        # the first batch of the response is returned even if it is larger
+        # than the limits, so that the consumer can make progress
+        min_one_batch = remaining_bytes == max_bytes
+        partition_max_bytes = min(p.partition_max_bytes, max(remaining_bytes, 0))
+        response = to_partition_response(
+            p, topic_name, partition_max_bytes, min_one_batch
+        )
+        remaining_bytes -= response.records_size()
+        partitions.append(response)
+
+    return FetchResponses_v17(topic.topic_id, partitions, 0)
 
 
 def to_partition_response(
-    partition_index: int, topic_name: str
+    partition: FetchRequest_V17Partition,
+    topic_name: str,
+    max_bytes: int,
+    min_one_batch: bool,
 ) -> FetchPartitonResponse:
-    records_dir = KAFKA_LOG_DIR / Path(f"{topic_name}-{partition_index}")
-    records_file = records_dir / f"{0:020}.log"
+    log = LOGS.get(topic_name, partition.partition)
+    if log is None:
+        log_start_offset, high_watermark = 0, 0
+    else:
+        log_start_offset, high_watermark = log.offsets()
+
+    error_code = ErrorCode.NONE
+    fetch_offset = partition.fetch_offset
+    if log is None or fetch_offset == high_watermark:
+        records = []
+    elif not log_start_offset <= fetch_offset < high_watermark:
+        records = []
+        error_code = ErrorCode.OFFSET_OUT_OF_RANGE
+    else:
+        records = log.read(fetch_offset, max_bytes, min_one_batch)
+
+    if records and should_check_crc():
+        records, corrupt = valid_records(records)
+        if corrupt:
+            print(
+                f"{topic_name}-{partition.partition}: corrupt batch after "
+                f"offset {partition.fetch_offset}",
+                file=sys.stderr,
+            )
+        if not records:
+            error_code = ErrorCode.CORRUPT_MESSAGE
 
     return FetchPartitonResponse(
-        partition_index=partition_index,
-        error_code=ErrorCode.NONE.value,
-        high_watermark=0,
-        last_stable_offset=0,
-        log_start_offset=0,
+        partition_index=partition.partition,
+        error_code=error_code.value,
+        high_watermark=high_watermark,
+        # transactions are not tracked, every record is stable
+        last_stable_offset=high_watermark,
+        log_start_offset=log_start_offset,
         aborted_transactions=[],
         preferred_read_replica=0,
-        records=records_file.read_bytes(),
+        records=records,
+        tag_buffer=0,
+    )
+
+
+def produce(header: HeaderRequest, body: ProduceRequest) -> ProduceResponse | None:
+    """Appends the batches of every partition, then waits for them to be on
+    disk; concurrent requests appending to the same segment share fsyncs.
+    With acks=0 nothing is waited for and no response is sent."""
+    context = get_context()
+    responses = []
+    # partition responses waiting for their segment to be synced up to end
+    pending: list[tuple[ProducePartitionResponse, LogSegment, int]] = []
+    for topic in body.topic_data:
+        partitions = []
+        for p in topic.partition_data:
+            if body.acks not in (-1, 0, 1):
+                response = produce_error(p, ErrorCode.INVALID_REQUIRED_ACKS)
+            else:
+                response, appended = append_partition(context, topic.name, p)
+                if appended is not None:
+                    pending.append((response, *appended))
+            partitions.append(response)
+        responses.append(ProduceTopicResponse(topic.name, partitions, 0))
+
+    if body.acks == 0:
+        return None
+
+    if PRODUCE_FSYNC:
+        for response, segment, end in pending:
+            try:
+                segment.sync(end)
+            except OSError as e:
+                print(f"{segment.path}: fsync failed: {e}", file=sys.stderr)
+                response.error_code = ErrorCode.KAFKA_STORAGE_ERROR.value
+
+    return ProduceResponse(responses=responses, throttle_time_ms=0, tag_buffer=0)
+
+
+def append_partition(
+    context: Context, topic_name: str, partition: ProducePartitionData
+) -> tuple[ProducePartitionResponse, tuple[LogSegment, int] | None]:
+    topic_uuid = context.topics.get(topic_name)
+    if topic_uuid is None or context.get_partition(topic_uuid, partition.index) is None:
+        return produce_error(partition, ErrorCode.UNKNOWN_TOPIC_OR_PARTITION), None
+    if partition.records is None:
+        return produce_error(partition, ErrorCode.INVALID_RECORD), None
+
+    log = LOGS.get_or_create(topic_name, partition.index)
+    try:
+        base_offset, segment, end = log.append(bytearray(partition.records))
+    except CorruptRecordsError as e:
+        return produce_error(partition, ErrorCode.CORRUPT_MESSAGE, str(e)), None
+    except InvalidRecordsError as e:
+        return produce_error(partition, ErrorCode.INVALID_RECORD, str(e)), None
+    except OSError as e:
+        print(f"{topic_name}-{partition.index}: {e}", file=sys.stderr)
+        return produce_error(partition, ErrorCode.KAFKA_STORAGE_ERROR), None
+    FETCH_PURGATORY.notify((topic_name, partition.index))
+
+    response = ProducePartitionResponse(
+        index=partition.index,
+        error_code=ErrorCode.NONE.value,
+        base_offset=base_offset,
+        log_append_time_ms=-1,
+        log_start_offset=log.offsets()[0],
+        record_errors=[],
+        error_message=None,
+        tag_buffer=0,
+    )
+    return response, (segment, end)
+
+
+def produce_error(
+    partition: ProducePartitionData, error_code: ErrorCode, message: str | None = None
+) -> ProducePartitionResponse:
+    return ProducePartitionResponse(
+        index=partition.index,
+        error_code=error_code.value,
+        base_offset=-1,
+        log_append_time_ms=-1,
+        log_start_offset=-1,
+        record_errors=[],
+        error_message=message,
         tag_buffer=0,
     )
 
@@ -260,4 +627,21 @@ def get_handles():
             describe_topic_partitions,
         ),
         api_keys.ApiKeys.Fetch.value.code: (kafka_parser.parse_fetch_request, fetch),
+        api_keys.ApiKeys.Produce.value.code: (
+            kafka_parser.parse_produce_request,
+            produce,
+        ),
     }
+
+
+def valid_records(records: list[Buffer]) -> tuple[list[Buffer], bool]:
+    """The batches before the first corrupt one, the consumer gets
+    CORRUPT_MESSAGE when it fetches from there. True if one was found."""
+    valid = []
+    for view in records:
+        size = valid_batches_size(view)
+        if size > 0:
+            valid.append(view[:size])
+        if size < len(view):
+            return valid, True
+    return valid, False
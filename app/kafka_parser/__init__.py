@@ -5,7 +5,20 @@ from .parse_describe_topic_partition_request import (
 from .parse_api_version_request import parse_api_version_request
 from .parse_cluster_log import (
     parse_kafka_cluster_log,
+    iter_kafka_cluster_log,
+    read_kafka_cluster_log,
+    scan_kafka_cluster_log,
+    BATCH_HEADER,
+    BatchDecodeError,
+    CorruptBatchError,
+    TruncatedLogError,
+    int32_array,
+    intern_uuid,
     PartitionRecordValue,
+    PartitionChangeRecord,
+    RemoveTopicRecord,
+    MetadataRecordType,
+    NO_LEADER_CHANGE,
     FeatureLevelRecordValue,
     TopicRecord,
     RecordValue,
@@ -15,3 +28,4 @@ from .parse_cluster_log import (
 )
 
 from .parse_fetch_request import parse_fetch_request
+from .parse_produce_request import parse_produce_request
@@ -1,12 +1,12 @@
 from app.api_keys.api_version import ApiVersionsRequest
-from .parser_utils import parse_compact_string, digest
-from app.utils import INT8
+from .parser_utils import ByteReader
 
 
-def parse_api_version_request(data: bytes) -> ApiVersionsRequest:
-    name, data = parse_compact_string(data)
-    version, data = parse_compact_string(data)
-    tag_buffer = digest(data, INT8)
+def parse_api_version_request(data: bytes | memoryview) -> ApiVersionsRequest:
+    reader = ByteReader(data)
+    name = reader.read_compact_string()
+    version = reader.read_compact_string()
+    tag_buffer = reader.read_tag_buffer()
 
     return ApiVersionsRequest(
         client_software_name=name,
@@ -1,18 +1,22 @@
 from __future__ import annotations
 
+import mmap
+import sys
+import weakref
+from array import array
 from dataclasses import dataclass
-from typing import Optional
+from enum import IntEnum
+from struct import Struct
+from typing import BinaryIO, Callable, Iterator, Optional
 from uuid import UUID
-from app.kafka_parser.parser_utils import (
-    digest,
-    parse_compact_string,
-    parse_int,
-    assert_remain_bytes_is_zero,
-    parse_compact_array,
-    parse_uuid,
-    zigzag_decode,
-    parse_varint,
+from app.checksum import crc32c
+from app.compression import (
+    COMPRESSION_MASK,
+    Compression,
+    UnsupportedCompressionError,
+    decompress,
 )
+from app.kafka_parser.parser_utils import UUID_LEN, ByteReader
 from app.utils import (
     INT16,
     INT32,
@@ -21,42 +25,91 @@ from app.utils import (
 )
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PartitionRecordValue:
+    """A cluster can have millions of partitions: replica ids are kept in
+    int32 arrays and uuids as their 16 bytes, each interned so that records
+    with the same values share them."""
+
     id: int
-    topic_uuid: UUID
-    replicas: list[int]
-    sync_replicas: list[int]
-    removing_replicas: list[int]
-    adding_replicas: list[int]
+    topic_id: bytes
+    replicas: array[int]
+    sync_replicas: array[int]
+    removing_replicas: array[int]
+    adding_replicas: array[int]
     leader: int
     leader_epoch: int
     partition_epoch: int
-    directories: list[UUID]
+    directories: tuple[bytes, ...]
+
+    @property
+    def topic_uuid(self) -> UUID:
+        return UUID(bytes=self.topic_id)
+
+
+@dataclass(slots=True, frozen=True)
+class PartitionChangeRecord:
+    """Fields left to None are unchanged."""
+
+    id: int
+    topic_id: bytes
+    sync_replicas: array[int] | None
+    leader: int
+    replicas: array[int] | None
+    removing_replicas: array[int] | None
+    adding_replicas: array[int] | None
+    directories: tuple[bytes, ...] | None
+
 
+@dataclass(slots=True, frozen=True)
+class RemoveTopicRecord:
+    topic_id: bytes
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class FeatureLevelRecordValue:
     name: str
     feature_level: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TopicRecord:
     name: str
     uuid: UUID
 
 
-RecordValue = PartitionRecordValue | FeatureLevelRecordValue | TopicRecord
+RecordValue = (
+    PartitionRecordValue
+    | PartitionChangeRecord
+    | RemoveTopicRecord
+    | FeatureLevelRecordValue
+    | TopicRecord
+)
+
+
+class MetadataRecordType(IntEnum):
+    """Types of the records this broker materializes, see
+    metadata/src/main/resources/common/metadata in the Kafka sources."""
+
+    TOPIC = 2
+    PARTITION = 3
+    PARTITION_CHANGE = 5
+    REMOVE_TOPIC = 9
+    FEATURE_LEVEL = 12
+
+
+# PartitionChangeRecord leader when the leader does not change
+NO_LEADER_CHANGE = -2
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Record:
     timestamp_delta: int
-    value: RecordValue
+    # None for the record types that do not change the materialized metadata
+    value: RecordValue | None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class BatchRecords:
     id: int
     records: list[Record]
@@ -65,50 +118,138 @@ class BatchRecords:
     producer: Optional[Producer]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Producer:
     id: int
     epoch: int
 
 
-def parse_kafka_cluster_log(data: bytes) -> dict[int, BatchRecords]:
-    batchs = {}
-    while len(data) != 0:
-        batch_id, data = parse_int(data, INT64)
-        batch_length, data = parse_int(data, INT32)
-
-        batch_bytes, data = digest(data, batch_length)
-
-        assert len(batch_bytes) == batch_length
-        batch = parse_batch_record(batch_bytes, batch_id)
-        batchs[batch.id] = batch
-    return batchs
-
-
-def parse_batch_record(data: bytes, id: int):
-    partition_leader_epoch, data = digest(data, INT32)
-    magic_byte, data = digest(data, INT8)
-    crc, data = digest(data, INT32)
-    attributes, data = digest(data, INT16)
-    last_offset_delta, data = digest(data, INT32)
-    base_timestamp, data = parse_int(data, INT64)
-    max_timestamp, data = parse_int(data, INT64)
-
-    producer, data = parser_batch_producer(data)
-    base_sequence, data = digest(data, INT32)
-    n_records, data = parse_int(data, INT32)
+BATCH_OVERHEAD = INT64 + INT32
+# baseOffset: int64, batchLength: int32
+BATCH_HEADER = Struct(">qi")
+
+
+def parse_kafka_cluster_log(data: bytes | memoryview) -> dict[int, BatchRecords]:
+    """Decodes a whole log, which must end with a complete batch."""
+    return {batch.id: batch for batch in iter_kafka_cluster_log(data, complete=True)}
+
+
+def iter_kafka_cluster_log(
+    data: bytes | memoryview | mmap.mmap,
+    complete: bool = False,
+    check_crc: bool = True,
+) -> Iterator[BatchRecords]:
+    """Decodes the batches of data one at a time, up to the last complete
+    one: the tail of a log that is being appended to may be partially
+    written. With `complete`, a partial batch at the end raises
+    TruncatedLogError instead. Nothing but the batch being yielded is kept
+    alive."""
+    reader = ByteReader(data)
+    while reader.remaining() >= BATCH_OVERHEAD:
+        start = reader.offset
+        batch_id = reader.read_int(INT64)
+        batch_length = reader.read_int(INT32)
+        if reader.remaining() < batch_length:
+            reader.offset = start
+            break
+        yield parse_batch_record(reader.sub_reader(batch_length), batch_id, check_crc)
+    if complete and reader.remaining() > 0:
+        raise TruncatedLogError(reader.offset, reader.remaining())
+
+
+def scan_kafka_cluster_log(
+    data: bytes | memoryview | mmap.mmap, start: int = 0
+) -> Iterator[tuple[int, int, int]]:
+    """Yields (position, base_offset, size) of the complete batches of data
+    from start on, reading nothing but their headers."""
+    position = start
+    end = len(data)
+    while position + BATCH_OVERHEAD <= end:
+        base_offset, batch_length = BATCH_HEADER.unpack_from(data, position)
+        size = BATCH_OVERHEAD + batch_length
+        if position + size > end:
+            return
+        yield position, base_offset, size
+        position += size
+
+
+def read_kafka_cluster_log(
+    file: BinaryIO, check_crc: bool = True
+) -> Iterator[BatchRecords]:
+    """Like iter_kafka_cluster_log, reading one batch at a time from the
+    current position of file. After each batch the file is positioned at the
+    end of it, and a partial batch at the end is left unread."""
+    while True:
+        start = file.tell()
+        header = file.read(BATCH_OVERHEAD)
+        if len(header) < BATCH_OVERHEAD:
+            file.seek(start)
+            return
+        reader = ByteReader(header)
+        batch_id = reader.read_int(INT64)
+        batch_length = reader.read_int(INT32)
+        body = file.read(batch_length)
+        if len(body) < batch_length:
+            file.seek(start)
+            return
+        yield parse_batch_record(ByteReader(body), batch_id, check_crc)
+
+
+class BatchDecodeError(ValueError):
+    """A batch that cannot be decoded, the log cannot be read past it."""
+
+    def __init__(self, base_offset: int, reason: str):
+        super().__init__(f"batch {base_offset}: {reason}")
+        self.base_offset = base_offset
+
+
+class CorruptBatchError(BatchDecodeError):
+    def __init__(self, base_offset: int):
+        super().__init__(base_offset, "crc mismatch")
+
+
+class TruncatedLogError(ValueError):
+    """A log that ends in the middle of a batch."""
+
+    def __init__(self, position: int, size: int):
+        super().__init__(f"partial batch of {size} bytes at {position}")
+        self.position = position
+        self.size = size
+
+
+def parse_batch_record(reader: ByteReader, id: int, check_crc: bool = True):
+    partition_leader_epoch = reader.read_int(INT32)
+    magic_byte = reader.read_int(INT8)
+    crc = reader.read_int(INT32)
+    # the crc covers everything from the attributes to the end of the batch
+    if check_crc and crc32c(reader.view[reader.offset :]) != crc:
+        raise CorruptBatchError(id)
+    attributes = reader.read_int(INT16)
+    last_offset_delta = reader.read_int(INT32)
+    base_timestamp = reader.read_int(INT64)
+    max_timestamp = reader.read_int(INT64)
+
+    producer = parser_batch_producer(reader)
+    base_sequence = reader.read_int(INT32)
+    n_records = reader.read_int(INT32)
+
+    codec = attributes & COMPRESSION_MASK
+    if codec != Compression.NONE:
+        try:
+            reader = ByteReader(decompress(codec, reader.view[reader.offset :]))
+        except UnsupportedCompressionError as e:
+            raise BatchDecodeError(id, str(e)) from e
 
     records = []
 
     for _ in range(n_records):
-        record_length, data = parse_varint(data)
-        record_length = zigzag_decode(record_length)
-        record_bytes, data = digest(data, record_length)
+        record_length = reader.read_varint()
+        record_reader = reader.sub_reader(record_length)
 
         assert (
-            len(record_bytes) == record_length
-        ), f"record length {record_length} {len(record_bytes)}"
-        record = parse_record(record_bytes)
+            record_reader.remaining() == record_length
+        ), f"record length {record_length} {record_reader.remaining()}"
+        record = parse_record(record_reader)
         records.append(record)
 
     return BatchRecords(
@@ -120,77 +261,65 @@ def parse_batch_record(data: bytes, id: int):
     )
 
 
-def parser_batch_producer(data: bytes) -> tuple[Optional[Producer], bytes]:
-    producer_id, data = parse_int(data, INT64)
-    producer_epoch, data = parse_int(data, INT16)
+def parser_batch_producer(reader: ByteReader) -> Optional[Producer]:
+    not_set = -1
 
-    not_set_id = b"\xff" * INT64
-    not_set_epoch = b"\xff" * INT16
-    not_set = not_set_id + not_set_epoch
+    producer_id = reader.read_signed_int(INT64)
+    producer_epoch = reader.read_signed_int(INT16)
 
-    if producer_id + producer_epoch == not_set:
-        producer = None
-    else:
-        producer = Producer(producer_id, producer_epoch)
+    if producer_id == not_set and producer_epoch == not_set:
+        return None
 
-    return producer, data
+    return Producer(producer_id, producer_epoch)
 
 
-def parse_record(data: bytes) -> Record:
-    attributes, data = digest(data, INT8)
-    timestamp_delta, data = parse_int(data, INT8)
-    offset_delta, data = digest(data, INT8)
-    record_key, data = parse_record_key(data)
+def parse_record(reader: ByteReader) -> Record:
+    attributes = reader.read_int(INT8)
+    timestamp_delta = reader.read_varlong()
+    offset_delta = reader.read_varint()
+    skip_record_key(reader)
 
-    length, data = parse_varint(data)
-    length = zigzag_decode(length)
-    value_bytes, data = digest(data, length)
+    length = reader.read_varint()
+    value_reader = reader.sub_reader(length)
 
-    # print(", ".join([hex(b) for b in data]))
-    record_value = parse_record_value(value_bytes)
-    headers_array_count, data = digest(data, INT8)
-    assert_remain_bytes_is_zero(data)
+    record_value = parse_record_value(value_reader)
+    skip_record_headers(reader)
+    reader.assert_remain_bytes_is_zero()
 
     return Record(timestamp_delta, record_value)
 
 
-def parse_record_value(value_bytes: bytes) -> RecordValue:
-    frame_version, value_bytes = parse_int(value_bytes, INT8)
-    type_record_value, value_bytes = parse_int(value_bytes, INT8)
-    version_record_value, value_bytes = parse_int(value_bytes, INT8)
-    # rec = RecordValue(frame_version, version_record_value)
-
-    match type_record_value:
-        case 12:
-            return parse_feature_level_record_value(value_bytes)
-        case 2:
-            return parse_topic_record_value(value_bytes)
-        case 3:
-            return parse_partition_record_value(value_bytes)
-        case _:
-            raise NotImplementedError(
-                f"type record {type_record_value}, {frame_version,version_record_value}"
-            )
-
-
-def parse_partition_record_value(data: bytes) -> PartitionRecordValue:
-    id, data = parse_int(data, INT32)
-    toppic_uuid, data = parse_uuid(data)
-
-    replicas, data = parse_compact_arrayi32(data)
-    sync_replicas, data = parse_compact_arrayi32(data)
-    removing_replicas, data = parse_compact_arrayi32(data)
-    adding_replicas, data = parse_compact_arrayi32(data)
-    leader, data = parse_int(data, INT32)
-    leader_epoch, data = parse_int(data, INT32)
-    partition_epoch, data = parse_int(data, INT32)
-    directories, data = parse_compact_array(data, parse_uuid)
-    tagged_fields_count, data = digest(data, INT8)
-    assert tagged_fields_count == b"\x00"
+def parse_record_value(reader: ByteReader) -> RecordValue | None:
+    frame_version = reader.read_unsigned_varint()
+    type_record_value = reader.read_unsigned_varint()
+    version_record_value = reader.read_unsigned_varint()
+
+    parse = RECORD_VALUE_PARSERS.get(type_record_value)
+    if parse is None:
+        # the value reader is bounded by the record length, nothing to skip
+        return None
+    return parse(reader, version_record_value)
+
+
+def parse_partition_record_value(
+    reader: ByteReader, version: int
+) -> PartitionRecordValue:
+    id = reader.read_int(INT32)
+    topic_id = intern_uuid(reader.digest(UUID_LEN))
+
+    replicas = parse_compact_arrayi32(reader)
+    sync_replicas = parse_compact_arrayi32(reader)
+    removing_replicas = parse_compact_arrayi32(reader)
+    adding_replicas = parse_compact_arrayi32(reader)
+    leader = reader.read_signed_int(INT32)
+    leader_epoch = reader.read_signed_int(INT32)
+    partition_epoch = reader.read_signed_int(INT32)
+    directories = parse_directories(reader) if version >= 1 else ()
+    reader.read_tagged_fields()
 
     return PartitionRecordValue(
         id,
-        toppic_uuid,
+        topic_id,
         replicas,
         sync_replicas,
         removing_replicas,
@@ -202,45 +331,141 @@ def parse_partition_record_value(data: bytes) -> PartitionRecordValue:
     )
 
 
-def parse_compact_arrayi32(data: bytes) -> tuple[list[int], bytes]:
-    return parse_compact_array(data, lambda d: parse_int(d, INT32))
+def parse_partition_change_record(
+    reader: ByteReader, version: int
+) -> PartitionChangeRecord:
+    id = reader.read_int(INT32)
+    topic_id = intern_uuid(reader.digest(UUID_LEN))
+    # everything else is a tagged field
+    fields = reader.read_tagged_fields()
+
+    def replicas(tag: int) -> array[int] | None:
+        field = fields.get(tag)
+        if field is None:
+            return None
+        return parse_compact_arrayi32(ByteReader(field))
+
+    leader = NO_LEADER_CHANGE
+    if 1 in fields:
+        leader = ByteReader(fields[1]).read_signed_int(INT32)
+    directories = None
+    if 8 in fields:
+        directories = parse_directories(ByteReader(fields[8]))
+
+    return PartitionChangeRecord(
+        id,
+        topic_id,
+        sync_replicas=replicas(0),
+        leader=leader,
+        replicas=replicas(2),
+        removing_replicas=replicas(3),
+        adding_replicas=replicas(4),
+        directories=directories,
+    )
 
 
-def parse_compact_arrayuuid(data: bytes) -> tuple[list[UUID], bytes]:
-    return parse_compact_array(data, parse_uuid)
+def parse_remove_topic_record(reader: ByteReader, version: int) -> RemoveTopicRecord:
+    topic_id = intern_uuid(reader.digest(UUID_LEN))
+    reader.read_tagged_fields()
+    return RemoveTopicRecord(topic_id)
 
 
-def parse_feature_level_record_value(data: bytes) -> FeatureLevelRecordValue:
-    name, data = parse_compact_string(data)
-    feature_level, data = parse_int(data, INT16)
-    taggeed_field_count, data = parse_int(data, INT8)
+def parse_compact_arrayi32(reader: ByteReader) -> array[int]:
+    length = reader.read_unsigned_varint() - 1
+    return int32_array(reader.digest(length * INT32))
 
-    assert taggeed_field_count == 0
 
-    assert_remain_bytes_is_zero(data)
+# replica sets no record refers to any more are dropped
+_int32_arrays: weakref.WeakValueDictionary[bytes, array[int]] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def int32_array(data: bytes | memoryview) -> array[int]:
+    """Big endian int32s to an array, shared by every record with the same
+    values (a cluster has few distinct replica sets) as long as one of them
+    is alive: it must not be modified."""
+    key = bytes(data)
+    values = _int32_arrays.get(key)
+    if values is None:
+        values = array("i")
+        values.frombytes(key)
+        if sys.byteorder == "little":
+            values.byteswap()
+        values = _int32_arrays.setdefault(key, values)
+    return values
+
+
+def parse_directories(reader: ByteReader) -> tuple[bytes, ...]:
+    length = reader.read_unsigned_varint() - 1
+    return tuple(intern_uuid(reader.digest(UUID_LEN)) for _ in range(length))
+
+
+# bytes cannot be weakly referenced: interned uuids are kept in two
+# generations of at most MAX_INTERNED_UUIDS. When the current one is full it
+# becomes the old one and the previous old one is dropped, with the ids of
+# removed topics; ids seen again meanwhile are carried over
+MAX_INTERNED_UUIDS = 1 << 16
+_uuids: dict[bytes, bytes] = {}
+_old_uuids: dict[bytes, bytes] = {}
+
+
+def intern_uuid(data: bytes | memoryview) -> bytes:
+    """One bytes object per uuid: topic ids are repeated in every partition
+    record and directory ids in most of them."""
+    global _uuids, _old_uuids
+    uuid = bytes(data)
+    interned = _uuids.get(uuid)
+    if interned is None:
+        interned = _old_uuids.get(uuid, uuid)
+        if len(_uuids) >= MAX_INTERNED_UUIDS:
+            _old_uuids, _uuids = _uuids, {}
+        _uuids[interned] = interned
+    return interned
+
+
+def parse_feature_level_record_value(
+    reader: ByteReader, version: int
+) -> FeatureLevelRecordValue:
+    name = reader.read_compact_string()
+    feature_level = reader.read_int(INT16)
+    reader.read_tagged_fields()
+
+    reader.assert_remain_bytes_is_zero()
     return FeatureLevelRecordValue(
         name,
         feature_level,
     )
 
 
-def parse_topic_record_value(data: bytes) -> TopicRecord:
-    name, data = parse_compact_string(data)
-    uuid, data = parse_uuid(data)
-    taggeed_field_count, data = digest(data, INT8)
+def parse_topic_record_value(reader: ByteReader, version: int) -> TopicRecord:
+    name = reader.read_compact_string()
+    uuid = reader.read_uuid()
+    reader.read_tagged_fields()
 
-    assert_remain_bytes_is_zero(data)
+    reader.assert_remain_bytes_is_zero()
 
     return TopicRecord(name, uuid)
 
 
-def parse_record_key(data: bytes) -> tuple[Optional[str], bytes]:
-    null = -1
+RECORD_VALUE_PARSERS: dict[int, Callable[[ByteReader, int], RecordValue]] = {
+    MetadataRecordType.TOPIC: parse_topic_record_value,
+    MetadataRecordType.PARTITION: parse_partition_record_value,
+    MetadataRecordType.PARTITION_CHANGE: parse_partition_change_record,
+    MetadataRecordType.REMOVE_TOPIC: parse_remove_topic_record,
+    MetadataRecordType.FEATURE_LEVEL: parse_feature_level_record_value,
+}
+
 
-    key_length, data = parse_int(data, INT8)
-    length = zigzag_decode(key_length)
+def skip_record_key(reader: ByteReader):
+    length = reader.read_varint()
+    if length > 0:
+        reader.digest(length)
 
-    if length == null:
-        return None, data
 
-    raise NotImplementedError(f"key length {key_length}")
+def skip_record_headers(reader: ByteReader):
+    for _ in range(reader.read_varint()):
+        for _ in range(2):  # key, value
+            length = reader.read_varint()
+            if length > 0:
+                reader.digest(length)
@@ -1,4 +1,4 @@
-from .parser_utils import parse_compact_array, parse_compact_string, digest, parse_int
+from .parser_utils import ByteReader
 from app.utils import (
     INT32,
     INT8,
@@ -11,23 +11,25 @@ from app.api_keys import (
 
 
 def parse_describe_topic_partition_request(
-    body_bytes: bytes,
+    body_bytes: bytes | memoryview,
 ) -> DescribeTopicPartitionsRequest:
-    def compact_string_with_tag(body_bytes: bytes) -> tuple[str, bytes]:
-        name, body_bytes = parse_compact_string(body_bytes)
-        tag_buffer, body_bytes = digest(body_bytes, INT8)
-        return name, body_bytes
+    reader = ByteReader(body_bytes)
 
-    topics, body_bytes = parse_compact_array(body_bytes, compact_string_with_tag)
+    def compact_string_with_tag(reader: ByteReader) -> str:
+        name = reader.read_compact_string()
+        tag_buffer = reader.read_tag_buffer()
+        return name
 
-    reponse_partition_limit, body_bytes = parse_int(body_bytes, INT32)
+    topics = reader.read_compact_array(compact_string_with_tag)
 
-    if body_bytes[0] == NULL:
+    reponse_partition_limit = reader.read_int(INT32)
+
+    if reader.peek_int(INT8) == NULL:
         cursor = None
     else:
-        topic_name, body_bytes = parse_compact_string(body_bytes)
-        partition_index, body_bytes = parse_int(body_bytes, INT32)
-        tag_buffer, body_bytes = digest(body_bytes, INT8)
+        topic_name = reader.read_compact_string()
+        partition_index = reader.read_int(INT32)
+        tag_buffer = reader.read_tag_buffer()
         cursor = DescribeTopicCursor(
             topic_name=topic_name,
             partition_index=partition_index,
@@ -1,5 +1,3 @@
-from typing import Optional
-from uuid import UUID, uuid4
 from app.api_keys.fetch import (
     FetchForgottenTopic,
     FetchRequest_V17,
@@ -7,32 +5,26 @@ from app.api_keys.fetch import (
     FetchRequest_V17Topic,
 )
 from app.utils import INT32, INT64, INT8
-from .parser_utils import (
-    assert_remain_bytes_is_zero,
-    parse_compact_string,
-    parse_int,
-    parse_compact_array,
-    parse_tag_buffer,
-    parse_uuid,
-)
+from .parser_utils import ByteReader
 
 
-def parse_fetch_request(data: bytes) -> FetchRequest_V17:
-    max_wait_ms, data = parse_int(data, INT32)
-    min_bytes, data = parse_int(data, INT32)
-    max_bytes, data = parse_int(data, INT32)
-    isolation_level, data = parse_int(data, INT8)
-    session_id, data = parse_int(data, INT32)
-    session_epoch, data = parse_int(data, INT32)
+def parse_fetch_request(data: bytes | memoryview) -> FetchRequest_V17:
+    reader = ByteReader(data)
+    max_wait_ms = reader.read_int(INT32)
+    min_bytes = reader.read_int(INT32)
+    max_bytes = reader.read_int(INT32)
+    isolation_level = reader.read_int(INT8)
+    session_id = reader.read_int(INT32)
+    session_epoch = reader.read_signed_int(INT32)
 
-    topics, data = parse_compact_array(data, parse_fetch_topics)
-    forgotten_topics, data = parse_compact_array(data, parse_fetch_forgotten_topics)
+    topics = reader.read_compact_array(parse_fetch_topics)
+    forgotten_topics = reader.read_compact_array(parse_fetch_forgotten_topics)
 
-    rack_id, data = parse_compact_string(data)
+    rack_id = reader.read_compact_string()
 
-    tag_buffer, data = parse_tag_buffer(data)
+    tag_buffer = reader.read_tag_buffer()
 
-    assert_remain_bytes_is_zero(data)
+    reader.assert_remain_bytes_is_zero()
 
     return FetchRequest_V17(
         max_wait_ms,
@@ -48,14 +40,14 @@ def parse_fetch_request(data: bytes) -> FetchRequest_V17:
     )
 
 
-def parse_partition(data: bytes) -> tuple[FetchRequest_V17Partition, bytes]:
-    partition, data = parse_int(data, INT32)
-    current_leader_epoch, data = parse_int(data, INT32)
-    fetch_offset, data = parse_int(data, INT64)
-    last_fetched_epoch, data = parse_int(data, INT32)
-    last_start_offset, data = parse_int(data, INT64)
-    partition_max_bytes, data = parse_int(data, INT32)
-    tag, data = parse_tag_buffer(data)
+def parse_partition(reader: ByteReader) -> FetchRequest_V17Partition:
+    partition = reader.read_int(INT32)
+    current_leader_epoch = reader.read_int(INT32)
+    fetch_offset = reader.read_int(INT64)
+    last_fetched_epoch = reader.read_int(INT32)
+    last_start_offset = reader.read_int(INT64)
+    partition_max_bytes = reader.read_int(INT32)
+    tag = reader.read_tag_buffer()
     return FetchRequest_V17Partition(
         partition,
         current_leader_epoch,
@@ -64,23 +56,19 @@ def parse_partition(data: bytes) -> tuple[FetchRequest_V17Partition, bytes]:
         last_start_offset,
         partition_max_bytes,
         tag,
-    ), data
+    )
 
 
-def parse_fetch_topics(data: bytes) -> tuple[FetchRequest_V17Topic, bytes]:
-    id, data = parse_uuid(data)
-    partitions, data = parse_compact_array(data, parse_partition)
-    tag, data = parse_tag_buffer(data)
+def parse_fetch_topics(reader: ByteReader) -> FetchRequest_V17Topic:
+    id = reader.read_uuid()
+    partitions = reader.read_compact_array(parse_partition)
+    tag = reader.read_tag_buffer()
 
-    return FetchRequest_V17Topic(
-        topic_id=id, partitions=partitions, tag_buffer=tag
-    ), data
+    return FetchRequest_V17Topic(topic_id=id, partitions=partitions, tag_buffer=tag)
 
 
-def parse_fetch_forgotten_topics(
-    data: bytes,
-) -> tuple[FetchForgottenTopic, bytes]:
-    forgotten_topic_id, data = parse_uuid(data)
-    partitions, data = parse_compact_array(data, lambda d: parse_int(d, INT32))
-    tag, data = parse_tag_buffer(data)
-    return FetchForgottenTopic(forgotten_topic_id, partitions, tag), data
+def parse_fetch_forgotten_topics(reader: ByteReader) -> FetchForgottenTopic:
+    forgotten_topic_id = reader.read_uuid()
+    partitions = reader.read_compact_array(lambda r: r.read_int(INT32))
+    tag = reader.read_tag_buffer()
+    return FetchForgottenTopic(forgotten_topic_id, partitions, tag)
@@ -1,24 +1,27 @@
 from app.header_request import HeaderRequest
-from .parser_utils import parse_int, parse_nullable_string
+from .parser_utils import ByteReader
 from app.utils import INT32, INT16, INT8
 
 
-def parse_header_request(data: bytes) -> tuple[HeaderRequest, bytes]:
-    msg_size, data = parse_int(data, INT32)
-    api_key, data = parse_int(data, INT16)
-    api_version, data = parse_int(data, INT16)
-    correlation_id, data = parse_int(data, INT32)
-    is_header_v0 = len(data) == 0
+def parse_header_request(
+    data: bytes | memoryview,
+) -> tuple[HeaderRequest, memoryview]:
+    reader = ByteReader(data)
+    msg_size = reader.read_int(INT32)
+    api_key = reader.read_int(INT16)
+    api_version = reader.read_int(INT16)
+    correlation_id = reader.read_int(INT32)
+    is_header_v0 = reader.remaining() == 0
 
     if is_header_v0:
         client_id = ""
     else:
-        client_id, data = parse_nullable_string(data)
+        client_id = reader.read_nullable_string()
 
-    is_header_v2 = len(data) != 0
+    is_header_v2 = reader.remaining() != 0
 
     if is_header_v2:
-        tag_buffer, data = parse_int(data, INT8)
+        tag_buffer = reader.read_int(INT8)
     else:
         tag_buffer = None
 
@@ -29,4 +32,4 @@ def parse_header_request(data: bytes) -> tuple[HeaderRequest, bytes]:
         correlation_id,
         client_id,
         tag_buffer,
-    ), data
+    ), reader.digest(reader.remaining())
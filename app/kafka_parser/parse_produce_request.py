@@ -0,0 +1,37 @@
+from app.api_keys.produce import (
+    ProducePartitionData,
+    ProduceRequest,
+    ProduceTopicData,
+)
+from app.utils import INT16, INT32
+from .parser_utils import ByteReader
+
+
+def parse_produce_request(data: bytes | memoryview) -> ProduceRequest:
+    reader = ByteReader(data)
+    transactional_id = reader.read_compact_nullable_string()
+    acks = reader.read_signed_int(INT16)
+    timeout_ms = reader.read_int(INT32)
+    topic_data = reader.read_compact_array(parse_topic_data)
+    tag_buffer = reader.read_tag_buffer()
+
+    reader.assert_remain_bytes_is_zero()
+
+    return ProduceRequest(transactional_id, acks, timeout_ms, topic_data, tag_buffer)
+
+
+def parse_topic_data(reader: ByteReader) -> ProduceTopicData:
+    name = reader.read_compact_string()
+    partition_data = reader.read_compact_array(parse_partition_data)
+    tag = reader.read_tag_buffer()
+    return ProduceTopicData(name, partition_data, tag)
+
+
+def parse_partition_data(reader: ByteReader) -> ProducePartitionData:
+    index = reader.read_int(INT32)
+    size = reader.read_unsigned_varint()
+    # the batches are referenced, they are copied once when appended
+    records = None if size == 0 else reader.digest(size - 1)
+    tag = reader.read_tag_buffer()
+    return ProducePartitionData(index, records, tag)
+
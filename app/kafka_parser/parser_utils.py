@@ -1,59 +1,122 @@
+from struct import Struct
 from typing import Callable
 from uuid import UUID
-from app.utils import INT64, INT8, INT16
+from app.utils import INT32, INT64, INT8, INT16
 
-COMPACT_STRING_LEN = INT8
 NULLABLE_STRING_LEN = INT16
-
-
-def parse_int(data: bytes, type_int: int) -> tuple[int, bytes]:
-    value, data = digest(data, type_int)
-    return int.from_bytes(value), data
-
-
-def parse_tag_buffer(data: bytes) -> tuple[int, bytes]:
-    return parse_int(data, INT8)
-
-
-def digest(data: bytes, size: int) -> tuple[bytes, bytes]:
-    return data[:size], data[size:]
-
-
-def assert_remain_bytes_is_zero(data: bytes):
-    assert len(data) == 0, f"remain bytes: {data}\n"
-
-
-def parse_nullable_string(data: bytes) -> tuple[str, bytes]:
-    size_str, data = parse_int(data, NULLABLE_STRING_LEN)
-
-    string_bytes, data = digest(data, size_str)
-    return string_bytes.decode(), data
-
-
-def parse_compact_string(data: bytes) -> tuple[str, bytes]:
-    size_str, data = parse_int(data, COMPACT_STRING_LEN)
-
-    string_bytes, data = digest(data, size_str - 1)
-    return string_bytes.decode(), data
-
-
-def parse_uuid(data: bytes) -> tuple[UUID, bytes]:
-    uuid, data = digest(data, INT64 * 2)
-
-    return UUID(bytes=uuid), data
-
-
-def parse_compact_array[T](
-    data: bytes, callback: Callable[[bytes], tuple[T, bytes]]
-) -> tuple[list[T], bytes]:
-    length, data = parse_int(data, INT8)
-
-    array = []
-    for _ in range(length - 1):
-        value, data = callback(data)
-        array.append(value)
-
-    return array, data
+UUID_LEN = INT64 * 2
+MAX_VARINT_LEN = 10
+
+UNSIGNED_INTS = {
+    INT8: Struct(">B"),
+    INT16: Struct(">H"),
+    INT32: Struct(">I"),
+    INT64: Struct(">Q"),
+}
+
+SIGNED_INTS = {
+    INT8: Struct(">b"),
+    INT16: Struct(">h"),
+    INT32: Struct(">i"),
+    INT64: Struct(">q"),
+}
+
+
+class ByteReader:
+    """Cursor over a memoryview.
+
+    Every read advances `offset` instead of slicing off the tail of the
+    buffer, so parsing a message is O(len(message)) and `digest` hands out
+    views of the underlying bytes without copying them."""
+
+    __slots__ = ("view", "offset")
+
+    def __init__(self, data: bytes | bytearray | memoryview, offset: int = 0):
+        self.view = data if isinstance(data, memoryview) else memoryview(data)
+        self.offset = offset
+
+    def remaining(self) -> int:
+        return len(self.view) - self.offset
+
+    def peek_int(self, type_int: int) -> int:
+        return UNSIGNED_INTS[type_int].unpack_from(self.view, self.offset)[0]
+
+    def digest(self, size: int) -> memoryview:
+        start = self.offset
+        end = start + size
+        if size < 0 or end > len(self.view):
+            raise ValueError(
+                f"{size} bytes at {start} out of a {len(self.view)} bytes buffer"
+            )
+        self.offset = end
+        return self.view[start:end]
+
+    def sub_reader(self, size: int) -> "ByteReader":
+        return ByteReader(self.digest(size))
+
+    def read_int(self, type_int: int) -> int:
+        value = UNSIGNED_INTS[type_int].unpack_from(self.view, self.offset)[0]
+        self.offset += type_int
+        return value
+
+    def read_signed_int(self, type_int: int) -> int:
+        value = SIGNED_INTS[type_int].unpack_from(self.view, self.offset)[0]
+        self.offset += type_int
+        return value
+
+    def read_tag_buffer(self) -> int:
+        return self.read_int(INT8)
+
+    def read_nullable_string(self) -> str:
+        """A null string (length -1) is read as empty."""
+        size_str = self.read_signed_int(NULLABLE_STRING_LEN)
+        if size_str < 0:
+            return ""
+        return str(self.digest(size_str), "utf-8")
+
+    def read_compact_string(self) -> str:
+        """A null string (length 0) is read as empty."""
+        size_str = self.read_unsigned_varint()
+        if size_str == 0:
+            return ""
+        return str(self.digest(size_str - 1), "utf-8")
+
+    def read_compact_nullable_string(self) -> str | None:
+        size_str = self.read_unsigned_varint()
+        if size_str == 0:
+            return None
+        return str(self.digest(size_str - 1), "utf-8")
+
+    def read_uuid(self) -> UUID:
+        return UUID(bytes=bytes(self.digest(UUID_LEN)))
+
+    def read_tagged_fields(self) -> dict[int, memoryview]:
+        """Raw value of each tagged field, by tag."""
+        fields = {}
+        for _ in range(self.read_unsigned_varint()):
+            tag = self.read_unsigned_varint()
+            size = self.read_unsigned_varint()
+            fields[tag] = self.digest(size)
+        return fields
+
+    def read_compact_array[T](self, callback: Callable[["ByteReader"], T]) -> list[T]:
+        length = self.read_unsigned_varint()
+        return [callback(self) for _ in range(length - 1)]
+
+    def read_unsigned_varint(self) -> int:
+        value, self.offset = decode_unsigned_varint(self.view, self.offset)
+        return value
+
+    def read_varint(self) -> int:
+        value, self.offset = decode_unsigned_varint(self.view, self.offset)
+        return zigzag_decode(value)
+
+    def read_varlong(self) -> int:
+        return self.read_varint()
+
+    def assert_remain_bytes_is_zero(self):
+        remain = bytes(self.view[self.offset :])
+        assert len(remain) == 0, f"remain bytes: {remain}\n"
 
 
 def zigzag_decode(n: int) -> int:
@@ -65,17 +128,20 @@ https://protobuf.dev/programming-guides/encoding/
 """
 
 
-def parse_varint(data: bytes) -> tuple[int, bytes]:
-    def parse_byte(data: bytes) -> tuple[str, bytes]:
-        var_int_bytes, data = parse_int(data, INT8)
-        string_bits = bin(var_int_bytes)
-        string_bits = string_bits[2:].zfill(8)
-        return string_bits, data
-
-    first_string, data = parse_byte(data)
-    result_string = first_string[1:]
-    while first_string[0] == "1":
-        first_string, data = parse_byte(data)
-        result_string = first_string[1:] + result_string
-
-    return int(result_string, 2), data
+def decode_unsigned_varint(data: bytes | memoryview, offset: int) -> tuple[int, int]:
+    """Returns the varint starting at data[offset] and the offset right after it."""
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset + 1
+        shift += 7
+        if shift >= MAX_VARINT_LEN * 7:
+            raise ValueError(f"varint longer than {MAX_VARINT_LEN} bytes")
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 
 from app.header_request import HeaderRequest
-from .kafka_encode import KafkaEncode
+from .kafka_encode import Buffer, KafkaEncode, KafkaWriter
 from app.utils import INT32
 
 
@@ -11,8 +11,13 @@ class KafkaResponse:
     response_body: KafkaEncode
 
     def encode(self) -> bytes:
-        msg = self.header.encode() + self.response_body.encode()
+        return b"".join(self.buffers())
 
-        msg_size = len(msg)
+    def buffers(self) -> list[Buffer]:
+        writer = KafkaWriter()
+        self.header.write(writer)
+        self.response_body.write(writer)
 
-        return msg_size.to_bytes(INT32) + msg
+        msg_size = len(writer)
+
+        return [msg_size.to_bytes(INT32), *writer.buffers()]
@@ -1,46 +1,102 @@
+import argparse
+import asyncio
+import os
 import socket  # noqa: F401
 import threading
 import sys
 
+from app.api_keys import ApiKeys
+from app.framing import FrameBuffer, send_buffers
 from app.header_request import HeaderRequest, UnknownApiKeyResponse
 from app.kafka_response import KafkaResponse
-from .kafka_encode import KafkaEncode
-from . import kafka_handlers, kafka_parser
+from app.purgatory import DelayedResponse
+from .kafka_encode import Buffer, KafkaEncode
+from . import async_server, kafka_handlers, kafka_parser, workers
 
 
 def accept_client(client: socket.socket):
-    while True:
-        data = client.recv(1024)
-        if len(data) == 0:
-            break
-        try:
-            response_bytes = kafka_response(data)
-        except Exception as e:
-            print("exeception: ", e, file=sys.stderr)
-            response_bytes = b""
-            raise e
-            break
+    buffer = FrameBuffer()
+    try:
+        while True:
+            if buffer.recv_into(client) == 0:
+                break
+
+            # pipelined requests: answer every complete frame in a single write
+            responses: list[Buffer] = []
+            try:
+                for data in buffer.frames():
+                    response_buffers = kafka_response_buffers(data)
+
+                    size = sum(len(b) for b in response_buffers)
+                    log = f"input: {data}\noutput: {size} bytes\n"
+                    print(log)
+                    responses += response_buffers
+            except Exception as e:
+                # an oversized frame or a failed request: the frames before
+                # it are answered, then the connection is closed
+                print("exeception: ", e, file=sys.stderr)
+                send_buffers(client, responses)
+                break
+
+            send_buffers(client, responses)
+    except ConnectionError:
+        pass
+    finally:
+        print("closing socket")
+        client.close()
 
-        log = f"input: {data}\noutput: {response_bytes}\n"
-        print(log)
-        client.sendall(response_bytes)
 
-    print("closing socket")
-    client.close()
+def kafka_response(data: bytes) -> bytes:
+    return b"".join(kafka_response_buffers(data))
 
 
-def kafka_response(data: bytes) -> bytes:
+def kafka_response_buffers(data: bytes) -> list[Buffer]:
     header, body_bytes = kafka_parser.parse_header_request(data)
 
     return kafka_build_response(header, body_bytes)
 
 
-def kafka_build_response(header: HeaderRequest, body_bytes: bytes) -> bytes:
+async def kafka_response_buffers_async(data: bytes) -> list[Buffer]:
+    """Like kafka_response_buffers, delayed responses are awaited instead of
+    blocking the event loop."""
+    header, body_bytes = kafka_parser.parse_header_request(data)
+    if header.api_key == ApiKeys.Produce.value.code:
+        # appends and waits for an fsync: on the loop's executor threads the
+        # loop keeps serving, and requests of concurrent connections share
+        # fsyncs
+        loop = asyncio.get_running_loop()
+        response_body = await loop.run_in_executor(
+            None, kafka_body_response, header, body_bytes
+        )
+    else:
+        response_body = kafka_body_response(header, body_bytes)
+    if isinstance(response_body, DelayedResponse):
+        response_body = await response_body.wait_async()
+    return response_buffers(header, response_body)
+
+
+def kafka_build_response(
+    header: HeaderRequest, body_bytes: memoryview
+) -> list[Buffer]:
     response_body = kafka_body_response(header, body_bytes)
-    return KafkaResponse(header, response_body).encode()
+    if isinstance(response_body, DelayedResponse):
+        # only this connection's thread waits
+        response_body = response_body.wait()
+    return response_buffers(header, response_body)
+
+
+def response_buffers(
+    header: HeaderRequest, response_body: KafkaEncode | None
+) -> list[Buffer]:
+    if response_body is None:
+        # Produce with acks=0
+        return []
+    return KafkaResponse(header, response_body).buffers()
 
 
-def kafka_body_response(header: HeaderRequest, body_bytes: bytes) -> KafkaEncode:
+def kafka_body_response(
+    header: HeaderRequest, body_bytes: memoryview
+) -> KafkaEncode | DelayedResponse | None:
     handlers = kafka_handlers.get_handles()
     handler = handlers.get(header.api_key)
     if handler is None:
@@ -53,8 +109,8 @@ def kafka_body_response(header: HeaderRequest, body_bytes: bytes) -> KafkaEncode
     return response
 
 
-def main():
-    server = socket.create_server(("localhost", 9092), reuse_port=True)
+def serve_threads(address: tuple[str, int]):
+    server = socket.create_server(address, reuse_port=True)
 
     while True:
         client_socket, _ = server.accept()  # wait for client
@@ -62,5 +118,72 @@ def main():
         thread.start()
 
 
+SERVER_MODES = ["threads", "asyncio"]
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="app.main")
+    parser.add_argument(
+        "--server-mode",
+        choices=SERVER_MODES,
+        default=os.getenv("KAFKA_SERVER_MODE", "threads"),
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=int(os.getenv("KAFKA_MAX_CONNECTIONS", "50000")),
+    )
+    parser.add_argument(
+        "--produce-threads",
+        type=int,
+        default=int(os.getenv("KAFKA_PRODUCE_THREADS", "16")),
+        help="threads running Produce requests in asyncio mode",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="?",
+        const=os.cpu_count(),
+        default=int(os.getenv("KAFKA_WORKERS", "0")),
+        help="fork this many worker processes (default: number of CPUs)",
+    )
+    args = parser.parse_args(argv)
+    # argparse does not check defaults against choices
+    if args.server_mode not in SERVER_MODES:
+        parser.error(
+            f"KAFKA_SERVER_MODE: invalid choice {args.server_mode!r} "
+            f"(choose from {', '.join(SERVER_MODES)})"
+        )
+    return args
+
+
+def serve(args: argparse.Namespace):
+    address = ("localhost", 9092)
+    kafka_handlers.start_metadata_follower()
+
+    match args.server_mode:
+        case "asyncio":
+            server = async_server.serve(
+                address,
+                kafka_response_buffers_async,
+                args.max_connections,
+                args.produce_threads,
+            )
+            asyncio.run(server)
+        case _:
+            serve_threads(address)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    # once, before workers are forked
+    kafka_handlers.save_loaded_metadata()
+
+    if args.workers > 0:
+        sys.exit(workers.run_workers(args.workers, lambda: serve(args)))
+    else:
+        serve(args)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import os
+import sys
+from bisect import bisect_left
+from dataclasses import dataclass, replace
+from operator import attrgetter
+from pathlib import Path
+from typing import Iterable
+from uuid import UUID
+
+from app import kafka_parser
+from app.kafka_parser import PartitionRecordValue
+
+partition_id = attrgetter("id")
+
+
+@dataclass(frozen=True)
+class Context:
+    """Materialized cluster metadata.
+
+    A Context is never modified once built: metadata changes build a new one
+    (see ContextBuilder) that replaces it, so readers never need a lock."""
+
+    topics: dict[str, UUID]
+    topic_names: dict[UUID, str]
+    # partitions of each topic sorted by partition id
+    topics_partitions: dict[UUID, list[PartitionRecordValue]]
+    feature_levels: dict[str, int]
+
+    @staticmethod
+    def build(
+        topics: dict[str, UUID], partitions: Iterable[PartitionRecordValue]
+    ) -> Context:
+        builder = ContextBuilder()
+        for name, uuid in topics.items():
+            builder.apply(kafka_parser.TopicRecord(name, uuid))
+        for p in partitions:
+            builder.apply(p)
+        return builder.build()
+
+    def get_partition(
+        self, topic_id: UUID, partition_index: int
+    ) -> PartitionRecordValue | None:
+        partitions = self.topics_partitions.get(topic_id, [])
+        i = bisect_left(partitions, partition_index, key=partition_id)
+        if i < len(partitions) and partitions[i].id == partition_index:
+            return partitions[i]
+        return None
+
+
+EMPTY_CONTEXT = Context({}, {}, {}, {})
+
+
+class ContextBuilder:
+    """Applies metadata records on top of a Context. Only the dicts are
+    copied, partition lists of untouched topics are shared with the base."""
+
+    def __init__(self, base: Context = EMPTY_CONTEXT):
+        self.topics = dict(base.topics)
+        self.topic_names = dict(base.topic_names)
+        self.topics_partitions = dict(base.topics_partitions)
+        self.feature_levels = dict(base.feature_levels)
+        # partitions of the topics changed since the last build, by topic id
+        self._changed: dict[bytes, dict[int, PartitionRecordValue]] = {}
+
+    def apply(self, value: kafka_parser.RecordValue):
+        match value:
+            case kafka_parser.PartitionRecordValue():
+                self._partitions(value.topic_id)[value.id] = value
+            case kafka_parser.PartitionChangeRecord():
+                partitions = self._partitions(value.topic_id)
+                current = partitions.get(value.id)
+                # a complete log has no change to an unknown partition
+                if current is not None:
+                    partitions[value.id] = apply_partition_change(current, value)
+            case kafka_parser.RemoveTopicRecord():
+                self._remove_topic(value.topic_id)
+            case kafka_parser.TopicRecord():
+                self.topics[value.name] = value.uuid
+                self.topic_names[value.uuid] = value.name
+            case kafka_parser.FeatureLevelRecordValue():
+                self.feature_levels[value.name] = value.feature_level
+
+    def apply_batch(self, batch: kafka_parser.BatchRecords):
+        for record in batch.records:
+            self.apply(record.value)
+
+    def apply_batches(self, batchs: Iterable[kafka_parser.BatchRecords]):
+        for batch in batchs:
+            self.apply_batch(batch)
+
+    def _remove_topic(self, topic_id: bytes):
+        uuid = UUID(bytes=topic_id)
+        name = self.topic_names.pop(uuid, None)
+        if name is not None and self.topics.get(name) == uuid:
+            del self.topics[name]
+        self.topics_partitions.pop(uuid, None)
+        self._changed.pop(topic_id, None)
+
+    def _partitions(self, topic_id: bytes) -> dict[int, PartitionRecordValue]:
+        partitions = self._changed.get(topic_id)
+        if partitions is None:
+            current = self.topics_partitions.get(UUID(bytes=topic_id), [])
+            partitions = {p.id: p for p in current}
+            self._changed[topic_id] = partitions
+        return partitions
+
+    def build(self) -> Context:
+        for topic_id, partitions in self._changed.items():
+            uuid = UUID(bytes=topic_id)
+            if partitions:
+                by_id = sorted(partitions.values(), key=partition_id)
+                self.topics_partitions[uuid] = by_id
+            else:
+                self.topics_partitions.pop(uuid, None)
+        self._changed = {}
+
+        return Context(
+            topics=self.topics,
+            topic_names=self.topic_names,
+            topics_partitions=self.topics_partitions,
+            feature_levels=self.feature_levels,
+        )
+
+
+def apply_partition_change(
+    partition: PartitionRecordValue, change: kafka_parser.PartitionChangeRecord
+) -> PartitionRecordValue:
+    """Like PartitionRegistration.merge in Kafka: a new leader bumps the
+    leader epoch, any change bumps the partition epoch."""
+    leader, leader_epoch = partition.leader, partition.leader_epoch
+    if change.leader != kafka_parser.NO_LEADER_CHANGE:
+        leader, leader_epoch = change.leader, leader_epoch + 1
+
+    def changed[T](value: T | None, current: T) -> T:
+        return current if value is None else value
+
+    return replace(
+        partition,
+        replicas=changed(change.replicas, partition.replicas),
+        sync_replicas=changed(change.sync_replicas, partition.sync_replicas),
+        removing_replicas=changed(
+            change.removing_replicas, partition.removing_replicas
+        ),
+        adding_replicas=changed(change.adding_replicas, partition.adding_replicas),
+        leader=leader,
+        leader_epoch=leader_epoch,
+        partition_epoch=partition.partition_epoch + 1,
+        directories=changed(change.directories, partition.directories),
+    )
+
+
+def context_from_batches(batchs: Iterable[kafka_parser.BatchRecords]) -> Context:
+    builder = ContextBuilder()
+    builder.apply_batches(batchs)
+    return builder.build()
+
+
+class MetadataFollower:
+    """Tails the __cluster_metadata log.
+
+    Remembers the file position after the last complete batch and, on each
+    poll, streams only the batches appended since then into a new Context
+    built on top of the current one. Without `check_crc` the batch crcs are
+    not checked."""
+
+    def __init__(self, path: Path, check_crc: bool = True):
+        self.path = path
+        self.check_crc = check_crc
+        self.context = EMPTY_CONTEXT
+        self.position = 0
+        self.last_batch_position = -1
+        self.last_batch_offset = -1
+        # position of the undecodable or partial batch the log stops at,
+        # reported once
+        self.failed_position = -1
+
+    def restore(
+        self,
+        context: Context,
+        position: int,
+        last_batch_position: int,
+        last_batch_offset: int,
+    ) -> bool:
+        """Starts from a Context materialized up to `position` of the log,
+        unless the log no longer holds the batch it was built from."""
+        if last_batch_position >= 0:
+            with self.path.open("rb") as f:
+                f.seek(last_batch_position)
+                header = f.read(kafka_parser.BATCH_HEADER.size)
+            if len(header) < kafka_parser.BATCH_HEADER.size:
+                return False
+            base_offset, batch_length = kafka_parser.BATCH_HEADER.unpack(header)
+            end = last_batch_position + kafka_parser.BATCH_HEADER.size + batch_length
+            if base_offset != last_batch_offset or end != position:
+                return False
+        elif position != 0:
+            return False
+
+        self.context = context
+        self.position = position
+        self.last_batch_position = last_batch_position
+        self.last_batch_offset = last_batch_offset
+        return True
+
+    def poll(self) -> Context | None:
+        """Returns the new Context if batches were appended, else None."""
+        size = os.stat(self.path).st_size
+        if size < self.position:
+            # the log was truncated or replaced, replay it
+            self.context = EMPTY_CONTEXT
+            self.position = 0
+            self.last_batch_position = -1
+            self.last_batch_offset = -1
+            if size == 0:
+                return self.context
+        if size == self.position:
+            return None
+        return self._read_new_batches()
+
+    def _read_new_batches(self) -> Context | None:
+        builder = ContextBuilder(self.context)
+        last_batch_position = self.last_batch_position
+        last_batch_offset = self.last_batch_offset
+        end = self.position
+        with self.path.open("rb") as f:
+            f.seek(self.position)
+            # batches are folded into the builder as they are read, only one
+            # is held in memory at a time
+            try:
+                for batch in kafka_parser.read_kafka_cluster_log(f, self.check_crc):
+                    builder.apply_batch(batch)
+                    last_batch_position = end
+                    last_batch_offset = batch.id
+                    end = f.tell()
+            except kafka_parser.BatchDecodeError as e:
+                # the batches from there on are not applied until the log is
+                # rewritten
+                self._report(end, str(e))
+            else:
+                # a batch being appended, or a log cut in the middle of one
+                partial = os.fstat(f.fileno()).st_size - end
+                if partial > 0:
+                    self._report(end, f"partial batch of {partial} bytes")
+
+        if end == self.position:
+            return None
+        self.context = builder.build()
+        self.position = end
+        self.last_batch_position = last_batch_position
+        self.last_batch_offset = last_batch_offset
+        return self.context
+
+    def _report(self, position: int, reason: str):
+        if self.failed_position != position:
+            self.failed_position = position
+            print(f"{self.path} at {position}: {reason}", file=sys.stderr)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import os
+import sys
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from struct import Struct, error as StructError
+from uuid import UUID
+
+from app.kafka_encode import KafkaWriter
+from app.kafka_parser import PartitionRecordValue, int32_array, intern_uuid
+from app.kafka_parser.parser_utils import UUID_LEN, ByteReader
+from app.metadata import Context, ContextBuilder
+from app.utils import INT16, INT32, INT64
+
+# magic: int32, version: int16, crc: int32 (of everything after it), body
+SNAPSHOT_MAGIC = 0x4B4D534E
+SNAPSHOT_VERSION = 0
+SNAPSHOT_HEADER_SIZE = INT32 + INT16 + INT32
+# id, leader, leader_epoch, partition_epoch, then the length of replicas,
+# sync_replicas, removing_replicas, adding_replicas and directories; the
+# replica ids and directory uuids follow
+PARTITION_HEADER = Struct(">IiiiHHHHH")
+
+
+class InvalidSnapshot(ValueError):
+    pass
+
+
+@dataclass
+class MetadataSnapshot:
+    """Context materialized from the metadata log up to `position`.
+
+    `last_batch_position` and `last_batch_offset` locate the last batch
+    applied, so a snapshot of another log (or of a log since rewritten) is
+    detected before it is trusted."""
+
+    context: Context
+    position: int
+    last_batch_position: int
+    last_batch_offset: int
+
+    def write(self, writer: KafkaWriter):
+        writer.write_int(self.position, INT64)
+        writer.write_int(self.last_batch_position, INT64)
+        writer.write_signed_int(self.last_batch_offset, INT64)
+
+        context = self.context
+        writer.write_compact_array(list(context.topics.items()), write_topic)
+        writer.write_compact_array(
+            list(context.topics_partitions.items()), write_topic_partitions
+        )
+        writer.write_compact_array(
+            list(context.feature_levels.items()), write_feature_level
+        )
+
+    def encode(self) -> bytes:
+        writer = KafkaWriter()
+        self.write(writer)
+        body = writer.getvalue()
+
+        header = KafkaWriter()
+        header.write_int(SNAPSHOT_MAGIC, INT32)
+        header.write_int(SNAPSHOT_VERSION, INT16)
+        header.write_int(zlib.crc32(body), INT32)
+        return header.getvalue() + body
+
+
+def write_topic(writer: KafkaWriter, topic: tuple[str, UUID]):
+    name, uuid = topic
+    writer.write_compact_string(name)
+    writer.write_uuid(uuid)
+
+
+def write_topic_partitions(
+    writer: KafkaWriter, topic: tuple[UUID, list[PartitionRecordValue]]
+):
+    uuid, partitions = topic
+    writer.write_uuid(uuid)
+    writer.write_compact_array(partitions, write_partition)
+
+
+def write_partition(writer: KafkaWriter, p: PartitionRecordValue):
+    replicas = p.replicas + p.sync_replicas + p.removing_replicas + p.adding_replicas
+    writer.write_bytes(
+        PARTITION_HEADER.pack(
+            p.id,
+            p.leader,
+            p.leader_epoch,
+            p.partition_epoch,
+            len(p.replicas),
+            len(p.sync_replicas),
+            len(p.removing_replicas),
+            len(p.adding_replicas),
+            len(p.directories),
+        )
+    )
+    if sys.byteorder == "little":
+        replicas.byteswap()
+    writer.write_bytes(replicas.tobytes())
+    for directory in p.directories:
+        writer.write_bytes(directory)
+
+
+def write_feature_level(writer: KafkaWriter, feature: tuple[str, int]):
+    name, level = feature
+    writer.write_compact_string(name)
+    writer.write_int(level, INT16)
+
+
+def parse_metadata_snapshot(data: bytes | memoryview) -> MetadataSnapshot:
+    reader = ByteReader(data)
+    if reader.remaining() < SNAPSHOT_HEADER_SIZE:
+        raise InvalidSnapshot("truncated header")
+    magic = reader.read_int(INT32)
+    version = reader.read_int(INT16)
+    crc = reader.read_int(INT32)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise InvalidSnapshot(f"unknown format {magic:#x} v{version}")
+    if zlib.crc32(reader.view[reader.offset :]) != crc:
+        raise InvalidSnapshot("crc mismatch")
+
+    try:
+        return parse_snapshot_body(reader)
+    except (ValueError, IndexError, StructError, AssertionError) as e:
+        # a body with a valid crc written by an incompatible build
+        raise InvalidSnapshot(f"undecodable body: {e!r}") from e
+
+
+def parse_snapshot_body(reader: ByteReader) -> MetadataSnapshot:
+    position = reader.read_int(INT64)
+    last_batch_position = reader.read_int(INT64)
+    last_batch_offset = reader.read_signed_int(INT64)
+
+    builder = ContextBuilder()
+    for name, uuid in reader.read_compact_array(parse_topic):
+        builder.topics[name] = uuid
+        builder.topic_names[uuid] = name
+    for uuid, partitions in reader.read_compact_array(parse_topic_partitions):
+        builder.topics_partitions[uuid] = partitions
+    for name, level in reader.read_compact_array(parse_feature_level):
+        builder.feature_levels[name] = level
+    reader.assert_remain_bytes_is_zero()
+
+    return MetadataSnapshot(
+        builder.build(), position, last_batch_position, last_batch_offset
+    )
+
+
+def parse_topic(reader: ByteReader) -> tuple[str, UUID]:
+    return reader.read_compact_string(), reader.read_uuid()
+
+
+def parse_topic_partitions(
+    reader: ByteReader,
+) -> tuple[UUID, list[PartitionRecordValue]]:
+    uuid = reader.read_uuid()
+    topic_id = intern_uuid(uuid.bytes)
+    return uuid, reader.read_compact_array(lambda r: parse_partition(r, topic_id))
+
+
+def parse_partition(reader: ByteReader, topic_id: bytes) -> PartitionRecordValue:
+    view = reader.view
+    (
+        id,
+        leader,
+        leader_epoch,
+        partition_epoch,
+        n_replicas,
+        n_sync,
+        n_removing,
+        n_adding,
+        n_directories,
+    ) = PARTITION_HEADER.unpack_from(view, reader.offset)
+    reader.offset += PARTITION_HEADER.size
+
+    # each list on its own, interned like the ones parsed from the log
+    replicas = int32_array(reader.digest(n_replicas * INT32))
+    sync_replicas = int32_array(reader.digest(n_sync * INT32))
+    removing_replicas = int32_array(reader.digest(n_removing * INT32))
+    adding_replicas = int32_array(reader.digest(n_adding * INT32))
+    directories = tuple(
+        intern_uuid(reader.digest(UUID_LEN)) for _ in range(n_directories)
+    )
+
+    return PartitionRecordValue(
+        id=id,
+        topic_id=topic_id,
+        replicas=replicas,
+        sync_replicas=sync_replicas,
+        removing_replicas=removing_replicas,
+        adding_replicas=adding_replicas,
+        leader=leader,
+        leader_epoch=leader_epoch,
+        partition_epoch=partition_epoch,
+        directories=directories,
+    )
+
+
+def parse_feature_level(reader: ByteReader) -> tuple[str, int]:
+    return reader.read_compact_string(), reader.read_int(INT16)
+
+
+def read_snapshot(path: Path) -> MetadataSnapshot | None:
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    return parse_metadata_snapshot(data)
+
+
+def write_snapshot(path: Path, snapshot: MetadataSnapshot):
+    """Replaces the snapshot at `path` atomically: a reader sees either the
+    previous snapshot or the new one, never a partial write."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            f.write(snapshot.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
@@ -0,0 +1,220 @@
+"""Decodes a large metadata log on a process pool.
+
+The batches are cut into ranges on their boundaries, found by reading only
+the batch headers. Each worker folds one range and sends back its final
+state packed like a snapshot: topics, partitions and feature levels, plus
+what a range cannot resolve on its own, the topics it removes and the
+changes to partitions registered before it. The parent merges the ranges in
+log order, so later records win exactly as in a sequential replay."""
+
+from __future__ import annotations
+
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from uuid import UUID
+
+from app import kafka_parser
+from app.kafka_encode import KafkaWriter
+from app.kafka_parser import PartitionChangeRecord, int32_array, intern_uuid
+from app.kafka_parser.parser_utils import UUID_LEN, ByteReader
+from app.metadata import Context, ContextBuilder, MetadataFollower
+from app.metadata_snapshot import (
+    parse_feature_level,
+    parse_topic,
+    parse_topic_partitions,
+    write_feature_level,
+    write_topic,
+    write_topic_partitions,
+)
+from app.utils import INT32
+
+# below this, starting worker processes costs more than they save
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+# ranges per worker, so that one slow range does not hold the others back
+RANGES_PER_WORKER = 4
+
+
+class RangeBuilder(ContextBuilder):
+    """Folds a range of the log that follows others: removals and changes
+    to partitions it does not know are kept, in order, for the merge."""
+
+    def __init__(self):
+        super().__init__()
+        self.removed: list[bytes] = []
+        self.unresolved: list[PartitionChangeRecord] = []
+
+    def apply(self, value: kafka_parser.RecordValue):
+        match value:
+            case PartitionChangeRecord(id=id, topic_id=topic_id):
+                if id not in self._partitions(topic_id):
+                    self.unresolved.append(value)
+                    return
+            case kafka_parser.RemoveTopicRecord():
+                self.removed.append(value.topic_id)
+        super().apply(value)
+
+    def write(self, writer: KafkaWriter):
+        writer.write_compact_array(self.removed, lambda w, t: w.write_bytes(t))
+        writer.write_compact_array(self.unresolved, write_partition_change)
+        writer.write_compact_array(list(self.topics.items()), write_topic)
+        partitions = [
+            (UUID(bytes=topic_id), list(by_id.values()))
+            for topic_id, by_id in self._changed.items()
+            if by_id
+        ]
+        writer.write_compact_array(partitions, write_topic_partitions)
+        writer.write_compact_array(
+            list(self.feature_levels.items()), write_feature_level
+        )
+
+
+def merge_range(builder: ContextBuilder, state: bytes):
+    """Applies the packed state of a range, as if its records followed the
+    ones applied to builder."""
+    reader = ByteReader(state)
+    for topic_id in reader.read_compact_array(parse_topic_id):
+        builder.apply(kafka_parser.RemoveTopicRecord(topic_id))
+    for change in reader.read_compact_array(parse_partition_change):
+        builder.apply(change)
+    for name, uuid in reader.read_compact_array(parse_topic):
+        builder.apply(kafka_parser.TopicRecord(name, uuid))
+    for _, partitions in reader.read_compact_array(parse_topic_partitions):
+        for partition in partitions:
+            builder.apply(partition)
+    for name, level in reader.read_compact_array(parse_feature_level):
+        builder.apply(kafka_parser.FeatureLevelRecordValue(name, level))
+    reader.assert_remain_bytes_is_zero()
+
+
+def parse_topic_id(reader: ByteReader) -> bytes:
+    return intern_uuid(reader.digest(UUID_LEN))
+
+
+def write_partition_change(writer: KafkaWriter, change: PartitionChangeRecord):
+    writer.write_int(change.id, INT32)
+    writer.write_bytes(change.topic_id)
+    writer.write_signed_int(change.leader, INT32)
+    for replicas in (
+        change.sync_replicas,
+        change.replicas,
+        change.removing_replicas,
+        change.adding_replicas,
+    ):
+        # nullable, 0 for an unchanged list
+        if replicas is None:
+            writer.write_unsigned_varint(0)
+            continue
+        writer.write_unsigned_varint(len(replicas) + 1)
+        replicas = replicas[:]
+        if sys.byteorder == "little":
+            replicas.byteswap()
+        writer.write_bytes(replicas.tobytes())
+    if change.directories is None:
+        writer.write_unsigned_varint(0)
+    else:
+        writer.write_compact_array(change.directories, lambda w, d: w.write_bytes(d))
+
+
+def parse_partition_change(reader: ByteReader) -> PartitionChangeRecord:
+    id = reader.read_int(INT32)
+    topic_id = intern_uuid(reader.digest(UUID_LEN))
+    leader = reader.read_signed_int(INT32)
+
+    def replicas():
+        length = reader.read_unsigned_varint()
+        if length == 0:
+            return None
+        return int32_array(reader.digest((length - 1) * INT32))
+
+    sync_replicas = replicas()
+    all_replicas = replicas()
+    removing_replicas = replicas()
+    adding_replicas = replicas()
+    directories = None
+    length = reader.read_unsigned_varint()
+    if length > 0:
+        directories = tuple(
+            intern_uuid(reader.digest(UUID_LEN)) for _ in range(length - 1)
+        )
+    return PartitionChangeRecord(
+        id,
+        topic_id,
+        sync_replicas=sync_replicas,
+        leader=leader,
+        replicas=all_replicas,
+        removing_replicas=removing_replicas,
+        adding_replicas=adding_replicas,
+        directories=directories,
+    )
+
+
+def decode_log_range(path: Path, start: int, end: int, check_crc: bool) -> bytes | None:
+    """The packed state of the batches between start and end of the log at
+    path, None if one of them cannot be decoded. Runs in a worker process."""
+    with path.open("rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    builder = RangeBuilder()
+    try:
+        for batch in kafka_parser.iter_kafka_cluster_log(data, check_crc=check_crc):
+            builder.apply_batch(batch)
+    except kafka_parser.BatchDecodeError:
+        # left to the sequential read, which reports it
+        return None
+    writer = KafkaWriter()
+    builder.write(writer)
+    return writer.getvalue()
+
+
+def use_parallel(pending: int, n_workers: int) -> bool:
+    return n_workers > 1 and (os.cpu_count() or 1) > 1 and pending >= PARALLEL_MIN_BYTES
+
+
+def poll(follower: MetadataFollower, n_workers: int) -> Context | None:
+    """Decodes the batches appended after the position of follower on
+    n_workers processes and moves it past them. Returns None, leaving the
+    follower as it was, when the log is too small for it to pay off or a
+    range cannot be decoded: follower.poll then reads it sequentially."""
+    position = follower.position
+    with follower.path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= position or not use_parallel(size - position, n_workers):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            bounds = list(kafka_parser.scan_kafka_cluster_log(data, position))
+    if not bounds:
+        return None
+
+    range_size = (bounds[-1][0] - position) // (n_workers * RANGES_PER_WORKER) + 1
+    starts = [position]
+    for start, _, _ in bounds:
+        if start - starts[-1] >= range_size:
+            starts.append(start)
+    last_position, last_offset, last_size = bounds[-1]
+    end = last_position + last_size
+    ends = starts[1:] + [end]
+
+    builder = ContextBuilder(follower.context)
+    with ProcessPoolExecutor(n_workers) as pool:
+        states = pool.map(
+            decode_log_range,
+            repeat(follower.path),
+            starts,
+            ends,
+            repeat(follower.check_crc),
+        )
+        # merged in log order as the ranges are decoded
+        for state in states:
+            if state is None:
+                return None
+            merge_range(builder, state)
+
+    context = builder.build()
+    if not follower.restore(context, end, last_position, last_offset):
+        # the log was rewritten meanwhile
+        return None
+    return context
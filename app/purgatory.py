@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from app.kafka_encode import KafkaEncode
+
+# (topic name, partition index)
+PartitionKey = tuple[str, int]
+
+
+class Waiter:
+    """Woken by appends to the partitions it watches. A thread blocks in
+    `wait`, a coroutine awaits `wait_async` without blocking its loop."""
+
+    __slots__ = ("_event", "_loop", "_future")
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._future: asyncio.Future | None = None
+
+    def wake(self):
+        self._event.set()
+        loop, future = self._loop, self._future
+        if loop is not None and future is not None:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def wait(self, timeout: float) -> bool:
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+    async def wait_async(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        self._future = loop.create_future()
+        self._loop = loop
+        try:
+            # woken before the future was set
+            if not self._event.is_set():
+                await asyncio.wait({self._future}, timeout=timeout)
+        finally:
+            self._loop = self._future = None
+        woken = self._event.is_set()
+        self._event.clear()
+        return woken
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Purgatory:
+    """Requests parked until the partitions they read grow, like Kafka's
+    DelayedFetch purgatory: appends notify the waiters of their partition
+    instead of the waiters polling the logs."""
+
+    def __init__(self):
+        self._waiters: dict[PartitionKey, set[Waiter]] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, keys: list[PartitionKey], waiter: Waiter):
+        with self._lock:
+            for key in keys:
+                self._waiters.setdefault(key, set()).add(waiter)
+
+    def unwatch(self, keys: list[PartitionKey], waiter: Waiter):
+        with self._lock:
+            for key in keys:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def notify(self, key: PartitionKey):
+        waiters = self._waiters.get(key)
+        if not waiters:
+            return
+        with self._lock:
+            waiters = list(self._waiters.get(key, ()))
+        for waiter in waiters:
+            waiter.wake()
+
+
+@dataclass
+class DelayedResponse:
+    """A response that waits for appends to `keys` until `deadline`
+    (time.monotonic()).
+
+    `complete(expired)` builds the response, or returns None while it is not
+    satisfied; once expired it always returns the response."""
+
+    purgatory: Purgatory
+    keys: list[PartitionKey]
+    deadline: float
+    complete: Callable[[bool], KafkaEncode | None]
+
+    def wait(self) -> KafkaEncode:
+        waiter = Waiter()
+        self.purgatory.watch(self.keys, waiter)
+        try:
+            # watched before checking again, appends in between are not missed
+            while (response := self.complete(False)) is None:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0 or not waiter.wait(remaining):
+                    return self.complete(True)
+            return response
+        finally:
+            self.purgatory.unwatch(self.keys, waiter)
+
+    async def wait_async(self) -> KafkaEncode:
+        waiter = Waiter()
+        self.purgatory.watch(self.keys, waiter)
+        try:
+            while (response := self.complete(False)) is None:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0 or not await waiter.wait_async(remaining):
+                    return self.complete(True)
+            return response
+        finally:
+            self.purgatory.unwatch(self.keys, waiter)
@@ -0,0 +1,11 @@
+from .log_segment import (
+    LogSegment,
+    segment_file_name,
+    valid_batches_size,
+    assign_offsets,
+    check_batches,
+    InvalidRecordsError,
+    CorruptRecordsError,
+)
+from .offset_index import OffsetIndex, INDEX_INTERVAL_BYTES
+from .partition_log import PartitionLog, LogManager, SEGMENT_BYTES
@@ -0,0 +1,256 @@
+import mmap
+import os
+import threading
+from pathlib import Path
+from struct import Struct
+from typing import BinaryIO
+
+from app.checksum import crc32c
+from app.kafka_encode import Buffer
+from app.utils import INT32, INT64, INT64_MAX
+from .offset_index import OffsetIndex
+
+# https://kafka.apache.org/documentation/#recordbatch
+# baseOffset: int64, batchLength: int32, partitionLeaderEpoch: int32,
+# magic: int8, crc: int32, attributes: int16, lastOffsetDelta: int32, ...
+LOG_OVERHEAD = INT64 + INT32
+BATCH_HEADER = Struct(">qi")
+LAST_OFFSET_DELTA = Struct(">i")
+LAST_OFFSET_DELTA_POSITION = 23
+CRC = Struct(">I")
+CRC_POSITION = 17
+# the crc covers the batch from its attributes on
+CRC_START = CRC_POSITION + CRC.size
+BASE_OFFSET = Struct(">q")
+MAGIC_POSITION = 16
+MAGIC = 2
+# header up to the record count
+BATCH_OVERHEAD = 61
+
+
+class InvalidRecordsError(ValueError):
+    pass
+
+
+class CorruptRecordsError(InvalidRecordsError):
+    pass
+
+
+def valid_batches_size(view: Buffer) -> int:
+    """Size of the whole batches at the start of view up to the first one
+    whose crc does not match."""
+    position = 0
+    end = len(view)
+    while position + CRC_START <= end:
+        _, batch_length = BATCH_HEADER.unpack_from(view, position)
+        size = LOG_OVERHEAD + batch_length
+        if position + size > end:
+            break
+        (crc,) = CRC.unpack_from(view, position + CRC_POSITION)
+        if crc32c(view[position + CRC_START : position + size]) != crc:
+            break
+        position += size
+    return position
+
+
+def check_batches(data: Buffer) -> list[int]:
+    """Positions of the batches in data, once each is checked to be whole,
+    of the current format and matching its crc."""
+    if len(data) == 0:
+        raise InvalidRecordsError("no record batch")
+
+    positions = []
+    position = 0
+    end = len(data)
+    view = memoryview(data)
+    while position < end:
+        if position + BATCH_OVERHEAD > end:
+            raise CorruptRecordsError(f"truncated batch at {position}")
+        _, batch_length = BATCH_HEADER.unpack_from(view, position)
+        size = LOG_OVERHEAD + batch_length
+        if size < BATCH_OVERHEAD or position + size > end:
+            raise CorruptRecordsError(f"batch length {batch_length} at {position}")
+        magic = view[position + MAGIC_POSITION]
+        if magic != MAGIC:
+            raise InvalidRecordsError(f"magic {magic} at {position}")
+        (crc,) = CRC.unpack_from(view, position + CRC_POSITION)
+        if crc32c(view[position + CRC_START : position + size]) != crc:
+            raise CorruptRecordsError(f"crc mismatch at {position}")
+        positions.append(position)
+        position += size
+    return positions
+
+
+def assign_offsets(data: bytearray, positions: list[int], base_offset: int) -> int:
+    """Rewrites the base offset of the batches at positions in data so that
+    they follow each other from base_offset. The base offset is not covered
+    by the crc, the batches stay valid.
+
+    Returns the offset after the last batch."""
+    offset = base_offset
+    for position in positions:
+        delta_position = position + LAST_OFFSET_DELTA_POSITION
+        (last_offset_delta,) = LAST_OFFSET_DELTA.unpack_from(data, delta_position)
+        BASE_OFFSET.pack_into(data, position, offset)
+        offset += last_offset_delta + 1
+    return offset
+
+
+def segment_file_name(base_offset: int, suffix: str = ".log") -> str:
+    return f"{base_offset:020}{suffix}"
+
+
+class LogSegment:
+    """A `{base_offset:020}.log` file mapped in memory.
+
+    The mapping is refreshed when the file grows; views handed out by `read`
+    keep the previous mapping alive, so they stay valid. Its offset index is
+    built on the first lookup and extended as the file grows.
+
+    Produced batches are written with `append` and made durable with `sync`,
+    one fsync covers every append made before it started (group commit)."""
+
+    def __init__(self, path: Path, base_offset: int):
+        self.path = path
+        self.base_offset = base_offset
+        self._file = open(path, "rb")
+        self._lock = threading.Lock()
+        self._view = memoryview(b"")
+        self._size = 0
+        self._index: OffsetIndex | None = None
+        self._writer: BinaryIO | None = None
+        # bytes written by append, and how many of them are on disk
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._sync_done = threading.Condition()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def refresh(self) -> memoryview:
+        """Maps the bytes appended to the file since the last call."""
+        size = os.fstat(self._file.fileno()).st_size
+        if size == self._size:
+            return self._view
+
+        with self._lock:
+            if size != self._size:
+                mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(mapped)
+                self._size = len(mapped)
+        return self._view
+
+    def batches(self, position: int = 0):
+        """Yields (position, base_offset, last_offset, size) of every complete
+        batch starting at `position`."""
+        view = self.refresh()
+        end = len(view)
+        while position + LOG_OVERHEAD <= end:
+            base_offset, batch_length = BATCH_HEADER.unpack_from(view, position)
+            size = LOG_OVERHEAD + batch_length
+            if position + size > end:
+                break
+            delta_position = position + LAST_OFFSET_DELTA_POSITION
+            (last_offset_delta,) = LAST_OFFSET_DELTA.unpack_from(view, delta_position)
+            yield position, base_offset, base_offset + last_offset_delta, size
+            position += size
+
+    def offset_index(self) -> OffsetIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    index_path = self.path.with_suffix(".index")
+                    self._index = OffsetIndex(index_path, self.base_offset, len(self))
+        self._index.update(len(self), self.batches)
+        return self._index
+
+    def find_position(self, offset: int) -> int | None:
+        """Position of the first batch holding `offset` or a later one."""
+        self.refresh()
+        start = self.offset_index().lookup(offset)
+        for position, _, last_offset, _ in self.batches(start):
+            if last_offset >= offset:
+                return position
+        return None
+
+    def read(
+        self,
+        offset: int,
+        max_bytes: int,
+        min_one_batch: bool = True,
+    ) -> memoryview:
+        """Whole batches from the one holding `offset` up to `max_bytes`.
+
+        With `min_one_batch` the first batch is returned even if it is larger
+        than `max_bytes`, so consumers can always make progress."""
+        view = self.refresh()
+        position = self.find_position(offset)
+        if position is None:
+            return view[0:0]
+
+        end = position
+        for batch_position, _, _, size in self.batches(position):
+            fits = batch_position + size - position <= max_bytes
+            if not fits and not (min_one_batch and end == position):
+                break
+            end = batch_position + size
+
+        return view[position:end]
+
+    def next_offset(self) -> int:
+        """Offset following the last batch of the segment."""
+        start = self.offset_index().lookup(INT64_MAX)
+        next_offset = self.base_offset
+        for _, _, last_offset, _ in self.batches(start):
+            next_offset = last_offset + 1
+        return next_offset
+
+    def end(self) -> int:
+        """Size of the segment including the batches appended so far."""
+        self._open_writer()
+        return self._written
+
+    def append(self, data: Buffer) -> int:
+        """Writes whole batches at the end of the segment, callers serialize
+        appends. Returns the end of the segment after them, to sync."""
+        self._open_writer()
+        self._writer.write(data)
+        self._writer.flush()
+        self._written += len(data)
+        return self._written
+
+    def sync(self, end: int):
+        """Waits until the segment is on disk up to end.
+
+        The first caller runs fsync while the others wait for it; those whose
+        appends it did not cover run the next one together."""
+        with self._sync_done:
+            while self._synced < end:
+                if self._syncing:
+                    self._sync_done.wait()
+                    continue
+                self._syncing = True
+                written = self._written
+                self._sync_done.release()
+                try:
+                    os.fsync(self._writer.fileno())
+                finally:
+                    self._sync_done.acquire()
+                    self._syncing = False
+                    self._sync_done.notify_all()
+                self._synced = max(self._synced, written)
+
+    def _open_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    writer = open(self.path, "ab")
+                    self._written = self._synced = writer.tell()
+                    self._writer = writer
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._file.close()
@@ -0,0 +1,110 @@
+import sys
+import threading
+from bisect import bisect_right
+from operator import itemgetter
+from pathlib import Path
+from struct import Struct
+from typing import Callable, Iterator
+
+# https://kafka.apache.org/documentation/#log
+# sparse index: one (relative offset: int32, position: int32) entry every
+# INDEX_INTERVAL_BYTES of log, pointing at the batch holding that offset
+INDEX_INTERVAL_BYTES = 4096
+INDEX_ENTRY = Struct(">ii")
+
+# (position, base_offset, last_offset, size) of a batch, see LogSegment.batches
+Batch = tuple[int, int, int, int]
+
+entry_offset = itemgetter(0)
+
+
+class OffsetIndex:
+    """Offset -> file position index of a segment, persisted next to it as
+    `{base_offset:020}.index`.
+
+    Entries loaded from disk are trusted up to the first one that is out of
+    order or past the end of the log, the rest is rebuilt by scanning the
+    log from the last trusted entry.
+
+    Lookups do not take the lock: each (offset, position) entry is appended
+    as one tuple, so a concurrent lookup sees it whole or not at all."""
+
+    def __init__(self, path: Path, base_offset: int, log_size: int):
+        self.path = path
+        self.base_offset = base_offset
+        self.entries: list[tuple[int, int]] = []
+        self.indexed_position = 0
+        self._bytes_since_entry = 0
+        self._lock = threading.Lock()
+        self._persist = True
+        self._load(log_size)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, offset: int) -> int:
+        """Position to start scanning from for `offset`."""
+        entries = self.entries
+        i = bisect_right(entries, offset, key=entry_offset) - 1
+        if i < 0:
+            return 0
+        return entries[i][1]
+
+    def update(self, log_size: int, batches: Callable[[int], Iterator[Batch]]):
+        """Indexes the batches appended since the last call."""
+        if self.indexed_position >= log_size:
+            return
+
+        with self._lock:
+            entries = []
+            for position, _, last_offset, size in batches(self.indexed_position):
+                if self._bytes_since_entry > INDEX_INTERVAL_BYTES:
+                    if not self.entries or last_offset > self.entries[-1][0]:
+                        self.entries.append((last_offset, position))
+                        entries.append((last_offset - self.base_offset, position))
+                    self._bytes_since_entry = 0
+                self._bytes_since_entry += size
+                self.indexed_position = position + size
+            self._append(entries)
+
+    def _load(self, log_size: int):
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return
+
+        valid = 0
+        for relative_offset, position in INDEX_ENTRY.iter_unpack(
+            data[: len(data) - len(data) % INDEX_ENTRY.size]
+        ):
+            offset = self.base_offset + relative_offset
+            in_order = not self.entries or (
+                offset > self.entries[-1][0] and position > self.entries[-1][1]
+            )
+            if not in_order or position >= log_size:
+                break
+            self.entries.append((offset, position))
+            valid += INDEX_ENTRY.size
+
+        if valid != len(data):
+            self._truncate(valid)
+        if self.entries:
+            self.indexed_position = self.entries[-1][1]
+
+    def _append(self, entries: list[tuple[int, int]]):
+        if not entries or not self._persist:
+            return
+        try:
+            with self.path.open("ab") as f:
+                f.write(b"".join(INDEX_ENTRY.pack(*e) for e in entries))
+        except OSError as e:
+            print(f"offset index {self.path} kept in memory: {e}", file=sys.stderr)
+            self._persist = False
+
+    def _truncate(self, size: int):
+        try:
+            with self.path.open("r+b") as f:
+                f.truncate(size)
+        except OSError as e:
+            print(f"offset index {self.path} kept in memory: {e}", file=sys.stderr)
+            self._persist = False
@@ -0,0 +1,196 @@
+import os
+import threading
+from bisect import bisect_right
+from pathlib import Path
+
+from app.kafka_encode import Buffer
+from .log_segment import LogSegment, assign_offsets, check_batches, segment_file_name
+
+# roll a new segment past this size, like Kafka's segment.bytes
+SEGMENT_BYTES = 1024 * 1024 * 1024
+
+
+class PartitionLog:
+    """Every `{base_offset:020}.log` segment of a `{topic}-{partition}`
+    directory, sorted by base offset.
+
+    The directory is listed again only when its mtime changes, that is when
+    a segment is rolled, and segments are opened on their first read.
+    Produced batches are appended to the last segment.
+
+    The log end offset is found from the tail of the last segment when the
+    log is opened and kept on append, so `offsets` never reads the log. It
+    is found again only if the last segment changed otherwise, written by
+    another process."""
+
+    def __init__(self, dir: Path, segment_bytes: int = SEGMENT_BYTES):
+        self.dir = dir
+        self.segment_bytes = segment_bytes
+        self.base_offsets: list[int] = []
+        self._segments: dict[int, LogSegment] = {}
+        self._dir_mtime = -1
+        self._lock = threading.Lock()
+        # offset of the next appended batch, as of the `end` in _tail
+        self._next_offset = 0
+        self._tail = (-1, 0)
+        self._append_lock = threading.Lock()
+        self.refresh()
+        with self._append_lock:
+            self._sync_tail()
+
+    def refresh(self):
+        mtime = os.stat(self.dir).st_mtime_ns
+        if mtime == self._dir_mtime:
+            return
+
+        with self._lock:
+            base_offsets = []
+            for entry in os.scandir(self.dir):
+                stem, ext = os.path.splitext(entry.name)
+                if ext == ".log" and stem.isdigit():
+                    base_offsets.append(int(stem))
+            base_offsets.sort()
+            self.base_offsets = base_offsets
+            self._dir_mtime = mtime
+
+    def segment(self, base_offset: int) -> LogSegment:
+        segment = self._segments.get(base_offset)
+        if segment is None:
+            with self._lock:
+                segment = self._segments.get(base_offset)
+                if segment is None:
+                    path = self.dir / f"{base_offset:020}.log"
+                    segment = LogSegment(path, base_offset)
+                    self._segments[base_offset] = segment
+        return segment
+
+    def segment_index(self, offset: int) -> int:
+        """Index in base_offsets of the segment that may hold `offset`."""
+        return max(bisect_right(self.base_offsets, offset) - 1, 0)
+
+    def read(
+        self, offset: int, max_bytes: int, min_one_batch: bool
+    ) -> list[Buffer]:
+        """Batches from the one holding `offset` up to `max_bytes`, continuing
+        into the next segments when the first one runs out."""
+        self.refresh()
+        base_offsets = self.base_offsets
+
+        records: list[Buffer] = []
+        for base_offset in base_offsets[self.segment_index(offset) :]:
+            segment = self.segment(base_offset)
+            view = segment.read(offset, max_bytes, min_one_batch)
+            if len(view) == 0:
+                if records:
+                    # the first batch of this segment is over the limit
+                    break
+                continue
+            records.append(view)
+            max_bytes -= len(view)
+            min_one_batch = False
+            if max_bytes <= 0:
+                break
+        return records
+
+    def end(self) -> tuple[int, int]:
+        """Changes whenever batches are appended: the base offset and size of
+        the last segment."""
+        self.refresh()
+        if not self.base_offsets:
+            return -1, 0
+        base_offset = self.base_offsets[-1]
+        return base_offset, len(self.segment(base_offset).refresh())
+
+    def offsets(self) -> tuple[int, int]:
+        """Log start offset and log end offset, the offset of the next batch.
+
+        With a single replica, the log end offset is the high watermark."""
+        if self.end() != self._tail:
+            with self._append_lock:
+                self._sync_tail()
+        log_start_offset = self.base_offsets[0] if self.base_offsets else 0
+        return log_start_offset, self._next_offset
+
+    def _sync_tail(self):
+        """Finds the log end offset again if the last segment changed since it
+        was known. Holds _append_lock."""
+        end = self.end()
+        if end == self._tail:
+            return
+        base_offset, _ = end
+        if self.base_offsets:
+            self._next_offset = self.segment(base_offset).next_offset()
+        else:
+            self._next_offset = 0
+        self._tail = end
+
+    def append(self, records: bytearray) -> tuple[int, LogSegment, int]:
+        """Assigns the next offsets to the batches in records and writes them
+        at the end of the log, rolling a new segment past segment_bytes.
+
+        Returns their base offset, and the segment and position to sync."""
+        # checked before taking the lock, producers only wait for each other
+        # to write
+        positions = check_batches(records)
+        with self._append_lock:
+            self._sync_tail()
+            base_offset = self._next_offset
+            next_offset = assign_offsets(records, positions, base_offset)
+
+            if not self.base_offsets:
+                self._roll(base_offset)
+            segment = self.segment(self.base_offsets[-1])
+            end = segment.end()
+            if end > 0 and end + len(records) > self.segment_bytes:
+                self._roll(base_offset)
+                segment = self.segment(base_offset)
+            end = segment.append(records)
+            self._next_offset = next_offset
+            self._tail = (segment.base_offset, end)
+        return base_offset, segment, end
+
+    def _roll(self, base_offset: int):
+        (self.dir / segment_file_name(base_offset)).touch()
+        with self._lock:
+            self.base_offsets = self.base_offsets + [base_offset]
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+
+
+class LogManager:
+    """Partition logs of a log dir, opened once and shared by every request."""
+
+    def __init__(self, log_dir: Path, segment_bytes: int = SEGMENT_BYTES):
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self._logs: dict[tuple[str, int], PartitionLog] = {}
+        self._lock = threading.Lock()
+
+    def get(self, topic_name: str, partition_index: int) -> PartitionLog | None:
+        key = (topic_name, partition_index)
+        log = self._logs.get(key)
+        if log is not None:
+            return log
+
+        with self._lock:
+            log = self._logs.get(key)
+            dir = self.log_dir / f"{topic_name}-{partition_index}"
+            if log is None and dir.is_dir():
+                log = PartitionLog(dir, self.segment_bytes)
+                self._logs[key] = log
+        return log
+
+    def get_or_create(self, topic_name: str, partition_index: int) -> PartitionLog:
+        """The partition log, with an empty directory if it has none yet."""
+        log = self.get(topic_name, partition_index)
+        if log is None:
+            dir = self.log_dir / f"{topic_name}-{partition_index}"
+            dir.mkdir(parents=True, exist_ok=True)
+            log = self.get(topic_name, partition_index)
+        return log
+
+    def close(self):
+        for log in self._logs.values():
+            log.close()
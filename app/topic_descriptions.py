@@ -0,0 +1,74 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable
+from uuid import UUID
+
+from app.kafka_encode import Encoded, KafkaEncode, encode
+from app.kafka_parser import PartitionRecordValue
+from app.metadata import Context
+
+# the partitions of a topic without any, shared so that it keeps its identity
+NO_PARTITIONS: list[PartitionRecordValue] = []
+
+DescribeTopic = Callable[[str, UUID, list[PartitionRecordValue]], KafkaEncode]
+
+
+@dataclass(frozen=True)
+class EncodedTopic:
+    topic_id: UUID
+    # the list the description was encoded from, kept alive for the identity
+    # check
+    partitions: list[PartitionRecordValue]
+    encoded: Encoded
+
+
+class TopicDescriptionCache:
+    """Encoded DescribeTopicPartitions topics, by topic name.
+
+    A metadata change builds a new Context that shares the partition list of
+    every topic it did not touch with the Context it replaces (see
+    ContextBuilder). The encoded topic is reused while the Context still maps
+    its name to the same id and the same partition list: a change to one
+    topic only encodes that topic again. Entries of topics changed or removed
+    are dropped when a new Context is first seen."""
+
+    def __init__(self):
+        self._context: Context | None = None
+        self._topics: dict[str, EncodedTopic] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def get(self, context: Context, name: str, describe: DescribeTopic) -> Encoded:
+        """The encoded description of the topic `name` of context, which
+        must exist."""
+        topic_id = context.topics[name]
+        partitions = context.topics_partitions.get(topic_id, NO_PARTITIONS)
+        if context is not self._context:
+            self._prune(context)
+
+        entry = self._topics.get(name)
+        if (
+            entry is not None
+            and entry.topic_id == topic_id
+            and entry.partitions is partitions
+        ):
+            return entry.encoded
+
+        encoded = Encoded(encode(describe(name, topic_id, partitions)))
+        self._topics[name] = EncodedTopic(topic_id, partitions, encoded)
+        return encoded
+
+    def _prune(self, context: Context):
+        with self._lock:
+            if context is self._context:
+                return
+            self._topics = {
+                name: entry
+                for name, entry in self._topics.items()
+                if context.topics.get(name) == entry.topic_id
+                and context.topics_partitions.get(entry.topic_id, NO_PARTITIONS)
+                is entry.partitions
+            }
+            self._context = context
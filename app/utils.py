@@ -1,6 +1,3 @@
-from typing import Callable
-
-
 INT8 = 1
 INT16 = 2
 INT32 = 4
@@ -19,55 +16,40 @@ def str_from_bytes(b: bytes) -> str:
     return b.decode()
 
 
-def sum_bytes(data: list[bytes]) -> bytes:
-    acc = data[0]
-    for b in data[1:]:
-        acc = acc + b
-
-    return acc
-
-
-def encode_compact_nullable_string(string: str) -> bytes:
-    if len(string) == 0:
-        return NULL.to_bytes(INT8)
-    else:
-        return encode_compact_string(string)
-
-
-def encode_int(type_int: int) -> Callable[[int], bytes]:
-    return lambda x: x.to_bytes(type_int)
-
-
-def encode_error_code(code: int) -> bytes:
-    return code.to_bytes(INT16)
-
-
-def encode_tag_buffer(tag: int):
-    return tag.to_bytes(INT8)
+"""
+https://protobuf.dev/programming-guides/encoding/
+"""
 
+INT32_MIN, INT32_MAX = -(1 << 31), (1 << 31) - 1
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+ONE_BYTE_VARINTS = [bytes((v,)) for v in range(0x80)]
 
-def encode_compact_array[T](array: list[T], encode: Callable[[T], bytes]) -> bytes:
-    size_array = len(array)
-    if size_array == 0:
-        return (1).to_bytes(INT8)
-    array_bytes = [encode(v) for v in array]
 
-    return (size_array + 1).to_bytes(INT8) + sum_bytes(array_bytes)
+def encode_unsigned_varint(v: int) -> bytes:
+    if v < 0:
+        raise OverflowError(f"unsigned varint {v}")
+    if v <= 0x7F:
+        return ONE_BYTE_VARINTS[v]
 
+    out = bytearray()
+    while v > 0x7F:
+        out.append((v & 0x7F) | 0x80)
+        v >>= 7
+    out.append(v)
+    return bytes(out)
 
-def encode_compact_string(string: str) -> bytes:
-    size_str = len(string) + 1
-    encode_str = string.encode()
-    return size_str.to_bytes(INT8) + encode_str
 
+def zigzag_encode(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
 
-def encode_var_int(v: int) -> bytes:
-    if v <= 0b1111111:
-        return v.to_bytes(INT8)
 
-    bits = bin(v)[2:]
+def encode_varint(v: int) -> bytes:
+    if not INT32_MIN <= v <= INT32_MAX:
+        raise OverflowError(f"varint {v}")
+    return encode_unsigned_varint(zigzag_encode(v))
 
-    first = bits[-7:]
-    second = bits[:-7]
 
-    return int(f"1{first}", 2).to_bytes(INT8) + encode_var_int(int(second, 2))
+def encode_varlong(v: int) -> bytes:
+    if not INT64_MIN <= v <= INT64_MAX:
+        raise OverflowError(f"varlong {v}")
+    return encode_unsigned_varint(zigzag_encode(v))
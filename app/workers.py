@@ -0,0 +1,99 @@
+import gc
+import os
+import signal
+import sys
+import time
+from typing import Callable
+
+# a worker exiting sooner than this after its fork failed to start (port in
+# use, bad log dir): it is forked again after a growing delay, and after
+# MAX_FAILED_STARTS such exits in a row the supervisor gives up
+MIN_UPTIME_S = 1.0
+RESTART_BACKOFF_S = 0.1
+MAX_RESTART_BACKOFF_S = 30.0
+MAX_FAILED_STARTS = 5
+
+
+def restart_delay(failed_starts: int) -> float:
+    if failed_starts == 0:
+        return 0.0
+    return min(RESTART_BACKOFF_S * 2 ** (failed_starts - 1), MAX_RESTART_BACKOFF_S)
+
+
+def run_workers(n_workers: int, serve: Callable[[], None]) -> int:
+    """Supervisor: forks n_workers processes that each run serve(), binding the
+    same port with SO_REUSEPORT so the kernel spreads connections over them.
+
+    Metadata loaded before the fork (kafka_handlers.CONTEXT) is shared
+    copy-on-write, gc.freeze keeps the collector from touching those pages.
+    Each worker follows metadata changes on its own.
+    Workers that die are forked again until the supervisor is stopped, or
+    until workers keep failing to start. Returns the exit status of the
+    supervisor."""
+    gc.freeze()
+
+    # pid -> time.monotonic() of the fork
+    children: dict[int, float] = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                serve()
+            except BaseException as e:
+                print(f"worker {os.getpid()}: {e!r}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(n_workers):
+        spawn()
+
+    code = 0
+    failed_starts = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid)
+        if stopping:
+            continue
+
+        if time.monotonic() - started < MIN_UPTIME_S:
+            failed_starts += 1
+        else:
+            failed_starts = 0
+        if failed_starts >= MAX_FAILED_STARTS:
+            print(
+                f"{failed_starts} workers exited right after starting, stopping",
+                file=sys.stderr,
+            )
+            code = 1
+            stop(signal.SIGTERM, None)
+            continue
+
+        delay = restart_delay(failed_starts)
+        print(
+            f"worker {pid} exited with {status}, restarting in {delay:.1f}s",
+            file=sys.stderr,
+        )
+        time.sleep(delay)
+        # a signal may have stopped the supervisor meanwhile
+        if not stopping:
+            spawn()
+    return code
@@ -0,0 +1,42 @@
+"""ApiVersions, the first request of every connection, answered from the
+cached body against encoding it for every request.
+
+    python -m benchmarks.api_versions
+
+KAFKA_LOG_DIR and KAFKA_LOG must point at a metadata log."""
+
+import timeit
+from unittest import mock
+
+from app import kafka_handlers
+from app.api_keys.api_version import ApiVersionsRequest, ApiVersionsResponse
+from app.header_request import HeaderRequest
+from app.main import kafka_response
+
+# a storm of new connections, each sends ApiVersions v4
+REQUEST = b"\x00\x00\x00#\x00\x12\x00\x04\x00\x00\x00\x07\x00\tkafka-cli\x00\nkafka-cli\x040.1\x00"  # fmt: skip
+CONNECTIONS = 20000
+
+
+def legacy_api_versions(
+    header: HeaderRequest, body: ApiVersionsRequest
+) -> ApiVersionsResponse:
+    handled = tuple(kafka_handlers.get_handles())
+    return kafka_handlers.api_versions_response(header.api_version, handled)
+
+
+def per_request_us() -> float:
+    seconds = timeit.timeit(lambda: kafka_response(REQUEST), number=CONNECTIONS)
+    return seconds / CONNECTIONS * 1e6
+
+
+def main():
+    cached = per_request_us()
+    with mock.patch.object(kafka_handlers, "api_versions", legacy_api_versions):
+        legacy = per_request_us()
+    print(f"encoded per request: {legacy:>6.2f} us")
+    print(f"cached body:         {cached:>6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Size and decode time of gzip compressed metadata batches.
+
+    python -m benchmarks.compression
+
+Compressed batches cost a decompression on every decode, small next to the
+parsing of their records."""
+
+import timeit
+
+from app import kafka_parser
+from tests.metadata_log import partition_record, record, records_batch, topic_uuid
+
+
+def compressed_log(n_batches: int, gzip: bool) -> bytes:
+    """n_batches of 100 partition records."""
+    return b"".join(
+        records_batch(
+            offset,
+            [record(i, partition_record(i, topic_uuid(offset))) for i in range(100)],
+            gzip,
+        )
+        for offset in range(n_batches)
+    )
+
+
+def decode(log: bytes):
+    for _ in kafka_parser.iter_kafka_cluster_log(log):
+        pass
+
+
+def main():
+    plain = compressed_log(200, gzip=False)
+    gzip = compressed_log(200, gzip=True)
+    print(f"plain: {len(plain) / 1e6:.2f} MB, gzip: {len(gzip) / 1e6:.2f} MB")
+
+    runs = 5
+    seconds = timeit.timeit(lambda: decode(plain), number=runs) / runs
+    print(f"plain decode:          {seconds * 1000:>7.1f} ms")
+
+    seconds = timeit.timeit(lambda: decode(gzip), number=runs) / runs
+    print(f"gzip decode:           {seconds * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
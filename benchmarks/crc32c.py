@@ -0,0 +1,36 @@
+"""CRC-32C throughput, and the cost of checking the batches of a Fetch.
+
+    python -m benchmarks.crc32c
+
+The pure Python fallback is bound by the interpreter at a few MB/s; install
+the `crc32c` package for the native implementation."""
+
+import os
+import timeit
+
+from app import checksum
+from app.storage import valid_batches_size
+from tests.metadata_log import batch
+
+
+def throughput(f, data: bytes) -> float:
+    runs = 3
+    seconds = timeit.timeit(lambda: f(data), number=runs)
+    return len(data) * runs / seconds / 1e6
+
+
+def main():
+    data = os.urandom(4 << 20)
+    print(f"python: {throughput(checksum.crc32c_python, data):>8.1f} MB/s")
+    if checksum.NATIVE:
+        print(f"native: {throughput(checksum.crc32c, data):>8.1f} MB/s")
+    else:
+        print("native: crc32c package not installed")
+
+    # 1 MiB Fetch response of 16 KiB batches
+    log = b"".join(batch(i, [os.urandom(16 << 10)]) for i in range(64))
+    print(f"fetch check: {throughput(valid_batches_size, log):>8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
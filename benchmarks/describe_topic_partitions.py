@@ -0,0 +1,90 @@
+"""DescribeTopicPartitions of 100 topics out of 1000, answered from the
+encoded topics against encoding every topic for every request.
+
+    python -m benchmarks.describe_topic_partitions
+
+KAFKA_LOG_DIR and KAFKA_LOG must point at a metadata log."""
+
+import timeit
+from array import array
+from dataclasses import replace
+from unittest import mock
+
+from app import kafka_handlers
+from app.api_keys.describe_topic_partitions import DescribeTopicPartitionsRequest
+from app.header_request import HeaderRequest
+from app.kafka_encode import KafkaEncode, encode
+from app.kafka_parser import PartitionRecordValue
+from app.metadata import Context, ContextBuilder
+from tests.metadata_log import DIRECTORY, topic_uuid
+
+N_TOPICS = 1000
+PARTITIONS_PER_TOPIC = 10
+REQUESTED = 100
+REQUESTS = 2000
+CHANGES = 50
+
+HEADER = HeaderRequest(0, 75, 0, 0, "bench", 0)
+BODY = DescribeTopicPartitionsRequest(
+    topics=[f"topic-{t}" for t in range(0, N_TOPICS, N_TOPICS // REQUESTED)],
+    reponse_partition_limit=2000,
+    cursor=None,
+)
+
+
+def build_context() -> Context:
+    topics = {f"topic-{t}": topic_uuid(t) for t in range(N_TOPICS)}
+    replicas = array("i", [1, 2, 3])
+    directories = (DIRECTORY.bytes,) * 3
+    partitions = [
+        PartitionRecordValue(
+            p, uuid.bytes, replicas, replicas, array("i"), array("i"), 1, 0, 0,
+            directories,
+        )  # fmt: skip
+        for uuid in topics.values()
+        for p in range(PARTITIONS_PER_TOPIC)
+    ]
+    return Context.build(topics, partitions)
+
+
+def legacy_get(context: Context, name: str, describe) -> KafkaEncode:
+    topic_id = context.topics[name]
+    return describe(name, topic_id, context.topics_partitions.get(topic_id, []))
+
+
+def describe(context: Context):
+    with mock.patch.object(kafka_handlers, "get_context", return_value=context):
+        encode(kafka_handlers.describe_topic_partitions(HEADER, BODY))
+
+
+def per_request_us(context: Context) -> float:
+    return timeit.timeit(lambda: describe(context), number=REQUESTS) / REQUESTS * 1e6
+
+
+def after_change_us(context: Context) -> float:
+    """The first request after a leader change of a requested topic."""
+    total = 0.0
+    for i in range(CHANGES):
+        name = BODY.topics[i % len(BODY.topics)]
+        partitions = context.topics_partitions[context.topics[name]]
+        builder = ContextBuilder(context)
+        builder.apply(replace(partitions[0], leader=i))
+        context = builder.build()
+        total += timeit.timeit(lambda: describe(context), number=1)
+    return total / CHANGES * 1e6
+
+
+def main():
+    context = build_context()
+    cached = per_request_us(context)
+    changed = after_change_us(context)
+    with mock.patch.object(kafka_handlers.TOPIC_DESCRIPTIONS, "get", legacy_get):
+        legacy = per_request_us(context)
+
+    print(f"encoded per request:        {legacy:>7.1f} us")
+    print(f"encoded topics:             {cached:>7.1f} us")
+    print(f"first after a topic change: {changed:>7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
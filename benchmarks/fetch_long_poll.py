@@ -0,0 +1,77 @@
+"""CPU burnt by a consumer fetching from an idle partition for 2 seconds,
+answered right away (max_wait_ms=0) or long polled.
+
+    python -m benchmarks.fetch_long_poll
+"""
+
+import importlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+from uuid import UUID
+
+from app import kafka_parser
+from app.api_keys.fetch import (
+    FetchRequest_V17,
+    FetchRequest_V17Partition,
+    FetchRequest_V17Topic,
+)
+from app.metadata import Context
+from app.purgatory import DelayedResponse
+from app.storage import LogManager
+
+TOPIC = UUID(int=1)
+SECONDS = 2
+
+
+def idle_consumer(kafka_handlers, max_wait_ms: int) -> tuple[int, float]:
+    """Fetches answered and CPU seconds spent."""
+    p = FetchRequest_V17Partition(0, 0, 0, 0, 0, 1 << 20, 0)
+    topic = FetchRequest_V17Topic(TOPIC, [p], 0)
+    body = FetchRequest_V17(max_wait_ms, 1, 1 << 20, 0, 0, 0, [topic], [], "", 0)
+
+    fetches = 0
+    cpu = time.process_time()
+    end = time.monotonic() + SECONDS
+    while time.monotonic() < end:
+        response = kafka_handlers.fetch(None, body)
+        if isinstance(response, DelayedResponse):
+            response.wait()
+        fetches += 1
+    return fetches, time.process_time() - cpu
+
+
+def main():
+    replicas = kafka_parser.int32_array(b"\x00\x00\x00\x01")
+    partition = kafka_parser.PartitionRecordValue(
+        0, TOPIC.bytes, replicas, replicas, replicas[:0], replicas[:0], 1, 0, 0, ()
+    )
+    context = Context.build({"idle": TOPIC}, [partition])
+    with tempfile.TemporaryDirectory() as log_dir:
+        # an empty metadata log for kafka_handlers to load
+        metadata_log = Path(log_dir) / "__cluster_metadata-0" / "0.log"
+        metadata_log.parent.mkdir()
+        metadata_log.touch()
+        os.environ["KAFKA_LOG_DIR"] = log_dir
+        os.environ["KAFKA_LOG"] = "__cluster_metadata-0/0.log"
+        kafka_handlers = importlib.import_module("app.kafka_handlers")
+
+        logs = LogManager(Path(log_dir))
+        logs.get_or_create("idle", 0)
+        with (
+            mock.patch.object(kafka_handlers, "LOGS", logs),
+            mock.patch.object(kafka_handlers, "CONTEXT", context),
+        ):
+            for max_wait_ms in (0, 100, 500):
+                fetches, cpu = idle_consumer(kafka_handlers, max_wait_ms)
+                print(
+                    f"max_wait_ms {max_wait_ms:>3}: {fetches:>7} fetches, "
+                    f"{cpu / SECONDS:>6.1%} of a CPU"
+                )
+        logs.close()
+
+
+if __name__ == "__main__":
+    main()
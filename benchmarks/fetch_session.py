@@ -0,0 +1,108 @@
+"""A consumer of 1000 caught up partitions, 10 of which get a new batch
+between fetches: full fetches against incremental ones (KIP-227).
+
+    python -m benchmarks.fetch_session
+"""
+
+import importlib
+import os
+import tempfile
+import timeit
+from pathlib import Path
+from unittest import mock
+
+from app import kafka_parser
+from app.api_keys.fetch import (
+    FetchRequest_V17,
+    FetchRequest_V17Partition,
+    FetchRequest_V17Topic,
+)
+from app.fetch_session import FetchSessionCache
+from app.kafka_encode import encode
+from app.metadata import Context
+from app.storage import LogManager, segment_file_name
+from tests.metadata_log import batch, topic_uuid
+
+TOPICS = 100
+PARTITIONS_PER_TOPIC = 10
+GROWING = 10
+
+
+def fetch_request(session_id: int, epoch: int, offsets) -> FetchRequest_V17:
+    topics = {}
+    for (t, p), offset in offsets.items():
+        uuid = topic_uuid(t)
+        topic = topics.setdefault(uuid, FetchRequest_V17Topic(uuid, [], 0))
+        partition = FetchRequest_V17Partition(p, 0, offset, 0, 0, 1 << 20, 0)
+        topic.partitions.append(partition)
+    return FetchRequest_V17(
+        0, 1, 50 << 20, 0, session_id, epoch, list(topics.values()), [], "", 0
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as log_dir:
+        # an empty metadata log for kafka_handlers to load
+        metadata_log = Path(log_dir) / "__cluster_metadata-0" / "0.log"
+        metadata_log.parent.mkdir()
+        metadata_log.touch()
+        os.environ["KAFKA_LOG_DIR"] = log_dir
+        os.environ["KAFKA_LOG"] = "__cluster_metadata-0/0.log"
+        kafka_handlers = importlib.import_module("app.kafka_handlers")
+
+        replicas = kafka_parser.int32_array(b"\x00\x00\x00\x01")
+        topics = {}
+        partitions = []
+        for t in range(TOPICS):
+            topics[f"topic-{t}"] = topic_uuid(t)
+            for p in range(PARTITIONS_PER_TOPIC):
+                dir = Path(log_dir) / f"topic-{t}-{p}"
+                dir.mkdir()
+                (dir / segment_file_name(0)).write_bytes(batch(0, [b"v" * 100]))
+                partitions.append(
+                    kafka_parser.PartitionRecordValue(
+                        p, topic_uuid(t).bytes, replicas, replicas,
+                        replicas[:0], replicas[:0], 1, 0, 0, (),
+                    )
+                )  # fmt: skip
+        context = Context.build(topics, partitions)
+        logs = LogManager(Path(log_dir))
+        # caught up on every partition but the growing ones
+        offsets = {
+            (t, p): 1 for t in range(TOPICS) for p in range(PARTITIONS_PER_TOPIC)
+        }
+        for t in range(GROWING):
+            offsets[t, 0] = 0
+
+        with (
+            mock.patch.object(kafka_handlers, "LOGS", logs),
+            mock.patch.object(kafka_handlers, "CONTEXT", context),
+            mock.patch.object(kafka_handlers, "FETCH_SESSIONS", FetchSessionCache(10)),
+        ):
+            full = fetch_request(0, -1, offsets)
+            response = kafka_handlers.fetch(None, full)
+            size = len(encode(response))
+            seconds = timeit.timeit(lambda: kafka_handlers.fetch(None, full), number=20)
+            print(f"full:        {seconds / 20 * 1000:>6.2f} ms, {size:>6} bytes")
+
+            session_id = kafka_handlers.fetch(
+                None, fetch_request(0, 0, offsets)
+            ).session_id
+            epoch = 1
+
+            def incremental():
+                nonlocal epoch
+                response = kafka_handlers.fetch(
+                    None, fetch_request(session_id, epoch, {})
+                )
+                epoch += 1
+                return response
+
+            size = len(encode(incremental()))
+            seconds = timeit.timeit(incremental, number=20)
+            print(f"incremental: {seconds / 20 * 1000:>6.2f} ms, {size:>6} bytes")
+        logs.close()
+
+
+if __name__ == "__main__":
+    main()
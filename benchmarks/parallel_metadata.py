@@ -0,0 +1,56 @@
+"""Cold metadata load, sequential and on a process pool.
+
+    python -m benchmarks.parallel_metadata
+
+Decoding is CPU bound, so with the pool the time should drop roughly with
+the number of cores, less the merge of the packed range states in the
+parent, timed on its own on the whole log."""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from app import parallel_metadata
+from app.metadata import ContextBuilder, MetadataFollower
+from tests.metadata_log import metadata_log
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    workers = sorted({2, 4, cpus} - {1})
+    for n_topics in (16000, 64000):
+        with tempfile.TemporaryDirectory() as dir:
+            log = Path(dir) / "00000000000000000000.log"
+            log.write_bytes(metadata_log(n_topics, partitions_per_topic=3))
+            size = log.stat().st_size
+
+            start = time.perf_counter()
+            MetadataFollower(log).poll()
+            timings = [f"sequential {time.perf_counter() - start:.2f} s"]
+
+            # forced past the cpu count, to time it on one core too
+            with mock.patch("os.cpu_count", return_value=max(workers)):
+                for n_workers in workers:
+                    start = time.perf_counter()
+                    parallel_metadata.poll(MetadataFollower(log), n_workers)
+                    seconds = time.perf_counter() - start
+                    timings.append(f"{n_workers} workers {seconds:.2f} s")
+
+            start = time.perf_counter()
+            state = parallel_metadata.decode_log_range(log, 0, size, True)
+            decode = time.perf_counter() - start
+            start = time.perf_counter()
+            parallel_metadata.merge_range(ContextBuilder(), state)
+            merge = time.perf_counter() - start
+            print(
+                f"{n_topics:>6} topics {size / 1e6:>6.2f} MB: "
+                + ", ".join(timings)
+                + f"; one range decode {decode:.2f} s, merge {merge:.2f} s,"
+                + f" state {len(state) / 1e6:.2f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Cluster log parse time as the log grows.
+
+    python -m benchmarks.parse_cluster_log
+
+With a cursor based decoder the time per batch stays flat as the log grows,
+slice-and-return parsing grows linearly with the size of the log."""
+
+import timeit
+
+from app import kafka_parser
+from tests.metadata_log import metadata_log
+
+
+def main():
+    for n_topics in (250, 1000, 4000, 16000):
+        data = metadata_log(n_topics, partitions_per_topic=3)
+        runs = 3
+        seconds = timeit.timeit(
+            lambda: kafka_parser.parse_kafka_cluster_log(data), number=runs
+        )
+        per_batch_us = seconds / runs / n_topics * 1e6
+        print(
+            f"{n_topics:>6} batches {len(data) / 1e6:>6.2f} MB: "
+            f"{seconds / runs * 1e3:>9.1f} ms, {per_batch_us:>6.1f} us/batch"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Fetch reads from a partition with hundreds of segments.
+
+    python -m benchmarks.partition_log
+"""
+
+import random
+import tempfile
+import timeit
+from pathlib import Path
+
+from app.storage import LogManager, segment_file_name
+from tests.metadata_log import batch
+
+SEGMENTS = 500
+BATCHES_PER_SEGMENT = 50
+RECORDS_PER_BATCH = 10
+
+
+def write_partition(dir: Path):
+    value = b"v" * 100
+    offset = 0
+    for _ in range(SEGMENTS):
+        batches = []
+        base_offset = offset
+        for _ in range(BATCHES_PER_SEGMENT):
+            batches.append(batch(offset, [value] * RECORDS_PER_BATCH))
+            offset += RECORDS_PER_BATCH
+        (dir / segment_file_name(base_offset)).write_bytes(b"".join(batches))
+    return offset
+
+
+def main():
+    with tempfile.TemporaryDirectory() as log_dir:
+        dir = Path(log_dir) / "bench-0"
+        dir.mkdir()
+        end_offset = write_partition(dir)
+        logs = LogManager(Path(log_dir))
+        log = logs.get("bench", 0)
+
+        rng = random.Random(0)
+        offsets = [rng.randrange(end_offset) for _ in range(2000)]
+        for offset in offsets:  # open segments and build their indexes
+            log.read(offset, 1, True)
+
+        for max_bytes in (1, 64 * 1024, 1024 * 1024):
+            seconds = timeit.timeit(
+                lambda: [log.read(o, max_bytes, True) for o in offsets], number=1
+            )
+            print(
+                f"{SEGMENTS} segments, max_bytes {max_bytes:>8}: "
+                f"{seconds / len(offsets) * 1e6:>8.1f} us/fetch"
+            )
+        seconds = timeit.timeit(log.offsets, number=10000)
+        print(f"offsets (high watermark): {seconds / 10000 * 1e6:>8.1f} us/call")
+        logs.close()
+
+
+if __name__ == "__main__":
+    main()
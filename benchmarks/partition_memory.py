@@ -0,0 +1,99 @@
+"""Memory held by 1M parsed partition records.
+
+    python -m benchmarks.partition_memory
+
+Compares the original model (plain dataclasses, lists of ints, a UUID per
+field) with the slotted one (interned int32 arrays and 16 byte topic and
+directory ids). Each model is built in a fresh process and measured as the
+growth of its resident set size."""
+
+import multiprocessing
+import resource
+import sys
+from dataclasses import dataclass
+from uuid import UUID
+
+from app.kafka_parser import PartitionRecordValue, int32_array, intern_uuid
+from app.utils import INT32
+from tests.metadata_log import DIRECTORY, topic_uuid
+
+N_PARTITIONS = 1_000_000
+PARTITIONS_PER_TOPIC = 10
+REPLICAS = b"".join(r.to_bytes(INT32) for r in (1, 2, 3))
+
+
+@dataclass
+class LegacyPartitionRecordValue:
+    id: int
+    topic_uuid: UUID
+    replicas: list[int]
+    sync_replicas: list[int]
+    removing_replicas: list[int]
+    adding_replicas: list[int]
+    leader: int
+    leader_epoch: int
+    partition_epoch: int
+    directories: list[UUID]
+
+
+def legacy_partition(index: int) -> LegacyPartitionRecordValue:
+    # as parsed: every uuid and list is a new object
+    uuid = UUID(bytes=topic_uuid(index // PARTITIONS_PER_TOPIC).bytes)
+    return LegacyPartitionRecordValue(
+        index % PARTITIONS_PER_TOPIC,
+        uuid,
+        [1, 2, 3],
+        [1, 2, 3],
+        [],
+        [],
+        1,
+        0,
+        0,
+        [UUID(bytes=DIRECTORY.bytes)],
+    )
+
+
+def partition(index: int) -> PartitionRecordValue:
+    # as parsed: ids and replica arrays are interned
+    topic_id = intern_uuid(topic_uuid(index // PARTITIONS_PER_TOPIC).bytes)
+    return PartitionRecordValue(
+        index % PARTITIONS_PER_TOPIC,
+        topic_id,
+        int32_array(REPLICAS),
+        int32_array(REPLICAS),
+        int32_array(b""),
+        int32_array(b""),
+        1,
+        0,
+        0,
+        (intern_uuid(DIRECTORY.bytes),),
+    )
+
+
+def max_rss_mb() -> float:
+    # kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+def measure(name: str):
+    build = {"legacy": legacy_partition, "slotted": partition}[name]
+    before = max_rss_mb()
+    partitions = [build(i) for i in range(N_PARTITIONS)]
+    growth = max_rss_mb() - before
+    print(
+        f"{name:>8}: {growth:>7.1f} MB, {growth * 1e6 / len(partitions):>6.0f} "
+        f"bytes/partition"
+    )
+
+
+def main():
+    print(f"{N_PARTITIONS} partitions")
+    for name in ("legacy", "slotted"):
+        process = multiprocessing.Process(target=measure, args=(name,))
+        process.start()
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
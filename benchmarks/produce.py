@@ -0,0 +1,131 @@
+"""Produce throughput: producer threads appending batches to one partition
+and waiting for them to be fsynced.
+
+    python -m benchmarks.produce
+
+With more producers each fsync covers more appends (group commit), so
+throughput grows while the number of fsyncs per append drops. The same
+holds for Produce requests of concurrent connections in asyncio mode."""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from app import kafka_handlers, main as app_main
+from app.metadata import Context
+from app.storage import LogManager
+from tests.metadata_log import batch
+from tests.produce_test import TOPIC, partition, produce_request
+
+RECORDS_PER_BATCH = 100
+RECORD_SIZE = 100
+BATCHES = 2000
+PRODUCE_THREADS = 16
+
+
+def run(n_producers: int) -> tuple[float, float, float]:
+    """MB/s, records/s and fsyncs per batch."""
+    fsyncs = 0
+    fsync = os.fsync
+
+    def counting_fsync(fd: int):
+        nonlocal fsyncs
+        fsyncs += 1
+        fsync(fd)
+
+    records = batch(0, [b"v" * RECORD_SIZE] * RECORDS_PER_BATCH)
+    per_producer = BATCHES // n_producers
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        logs = LogManager(Path(log_dir))
+        log = logs.get_or_create("bench", 0)
+
+        def producer():
+            for _ in range(per_producer):
+                _, segment, end = log.append(bytearray(records))
+                segment.sync(end)
+
+        threads = [threading.Thread(target=producer) for _ in range(n_producers)]
+        os.fsync = counting_fsync
+        try:
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            seconds = time.perf_counter() - start
+        finally:
+            os.fsync = fsync
+        logs.close()
+
+    n_batches = per_producer * n_producers
+    return (
+        n_batches * len(records) / seconds / 1e6,
+        n_batches * RECORDS_PER_BATCH / seconds,
+        fsyncs / n_batches,
+    )
+
+
+def run_async(n_producers: int) -> tuple[float, float, float]:
+    """Like run, each producer a connection of the asyncio server sending
+    Produce requests to topic foo one after the other."""
+    fsyncs = 0
+    fsync = os.fsync
+
+    def counting_fsync(fd: int):
+        nonlocal fsyncs
+        fsyncs += 1
+        fsync(fd)
+
+    records = batch(0, [b"v" * RECORD_SIZE] * RECORDS_PER_BATCH)
+    request = produce_request([(0, records)])
+    per_producer = BATCHES // n_producers
+
+    async def producer():
+        for _ in range(per_producer):
+            await app_main.kafka_response_buffers_async(request)
+
+    async def produce():
+        # as set up by async_server.serve
+        executor = ThreadPoolExecutor(PRODUCE_THREADS)
+        asyncio.get_running_loop().set_default_executor(executor)
+        await asyncio.gather(*(producer() for _ in range(n_producers)))
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        logs = LogManager(Path(log_dir))
+        context = Context.build({"foo": TOPIC}, [partition(0)])
+        with (
+            mock.patch.object(kafka_handlers, "LOGS", logs),
+            mock.patch.object(kafka_handlers, "CONTEXT", context),
+            mock.patch("os.fsync", counting_fsync),
+        ):
+            start = time.perf_counter()
+            asyncio.run(produce())
+            seconds = time.perf_counter() - start
+        logs.close()
+
+    n_batches = per_producer * n_producers
+    return (
+        n_batches * len(records) / seconds / 1e6,
+        n_batches * RECORDS_PER_BATCH / seconds,
+        fsyncs / n_batches,
+    )
+
+
+def main():
+    for mode, run_mode in (("threads", run), ("asyncio", run_async)):
+        for n_producers in (1, 4, 16, 64):
+            mb, records, fsyncs = run_mode(n_producers)
+            print(
+                f"{mode:>7} {n_producers:>3} producers: {mb:>7.1f} MB/s "
+                f"{records:>10.0f} records/s {fsyncs:>5.2f} fsync/batch"
+            )
+
+
+if __name__ == "__main__":
+    main()
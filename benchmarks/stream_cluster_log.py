@@ -0,0 +1,61 @@
+"""Peak memory of loading the metadata log.
+
+    python -m benchmarks.stream_cluster_log
+
+Decoding the whole log into a dict of batches holds the file and every
+record at once; streaming batches into the Context only keeps the Context.
+The gap is widest when most records update partitions already in the log."""
+
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from app import kafka_parser
+from app.metadata import MetadataFollower, context_from_batches
+from tests.metadata_log import batch, metadata_log, partition_record, topic_uuid
+
+
+def churn_log(n_batches: int, n_topics: int) -> bytes:
+    """n_batches partition updates spread over n_topics topics."""
+    return b"".join(
+        batch(offset, [partition_record(0, topic_uuid(offset % n_topics))])
+        for offset in range(n_batches)
+    )
+
+
+def peak_mb(load) -> float:
+    tracemalloc.start()
+    load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main():
+    logs = [
+        (f"{n} topics", metadata_log(n, partitions_per_topic=3))
+        for n in (1000, 4000, 16000)
+    ]
+    logs.append(("64000 updates", churn_log(64000, n_topics=100)))
+
+    for name, data in logs:
+        with tempfile.TemporaryDirectory() as dir:
+            log = Path(dir) / "00000000000000000000.log"
+            log.write_bytes(data)
+
+            def whole_log():
+                batchs = kafka_parser.parse_kafka_cluster_log(log.read_bytes())
+                return context_from_batches(batchs.values())
+
+            def streamed():
+                return MetadataFollower(log).poll()
+
+            print(
+                f"{name:>13} {len(data) / 1e6:>6.2f} MB: "
+                f"whole log {peak_mb(whole_log):>7.1f} MB peak, "
+                f"streamed {peak_mb(streamed):>7.1f} MB peak"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Topic id -> name resolution at 100k topics, as done for every topic of a
+Fetch request.
+
+    python -m benchmarks.topic_lookup
+"""
+
+import random
+from array import array
+import timeit
+from uuid import UUID
+
+from app.kafka_parser import PartitionRecordValue
+from app.metadata import Context
+from tests.metadata_log import DIRECTORY, topic_uuid
+
+N_TOPICS = 100_000
+PARTITIONS_PER_TOPIC = 3
+
+
+def legacy_find_topic_name(context: Context, topic_id: UUID) -> str | None:
+    recorded_topic = list(
+        filter(lambda item: item[1] == topic_id, context.topics.items())
+    )
+    if len(recorded_topic) == 0:
+        return None
+    topic_name, _ = recorded_topic[0]
+    return topic_name
+
+
+def build_context() -> Context:
+    topics = {f"topic-{t}": topic_uuid(t) for t in range(N_TOPICS)}
+    replicas = array("i", [1])
+    directories = (DIRECTORY.bytes,)
+    partitions = [
+        PartitionRecordValue(
+            p,
+            uuid.bytes,
+            replicas,
+            replicas,
+            array("i"),
+            array("i"),
+            1,
+            0,
+            0,
+            directories,
+        )
+        for uuid in topics.values()
+        for p in range(PARTITIONS_PER_TOPIC)
+    ]
+    return Context.build(topics, partitions)
+
+
+def main():
+    context = build_context()
+    rng = random.Random(0)
+    ids = [topic_uuid(rng.randrange(N_TOPICS)) for _ in range(20)]
+
+    def per_lookup(f, n: int) -> float:
+        return timeit.timeit(lambda: [f(i) for i in ids], number=n) / n / len(ids)
+
+    legacy = per_lookup(lambda i: legacy_find_topic_name(context, i), 1)
+    by_id = per_lookup(context.topic_names.get, 10_000)
+    partition = per_lookup(lambda i: context.get_partition(i, 2), 10_000)
+
+    print(f"{N_TOPICS} topics")
+    print(f"  linear scan:       {legacy * 1e6:>10.2f} us/lookup")
+    print(f"  topic_names:       {by_id * 1e6:>10.2f} us/lookup")
+    print(f"  get_partition:     {partition * 1e6:>10.2f} us/lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Varint codec against the former string-of-bits implementation.
+
+    python -m benchmarks.varint
+"""
+
+import random
+import timeit
+
+from app.kafka_parser.parser_utils import decode_unsigned_varint
+from app.utils import encode_unsigned_varint
+from tests.legacy_varint import legacy_encode_var_int, legacy_parse_varint
+
+
+def main():
+    rng = random.Random(0)
+    for bits in (7, 14, 32, 63):
+        values = [rng.getrandbits(bits) for _ in range(10_000)]
+        encoded = [encode_unsigned_varint(v) for v in values]
+
+        def bench(f) -> float:
+            return timeit.timeit(f, number=5) / 5 / len(values) * 1e9
+
+        legacy_enc = bench(lambda: [legacy_encode_var_int(v) for v in values])
+        new_enc = bench(lambda: [encode_unsigned_varint(v) for v in values])
+        legacy_dec = bench(lambda: [legacy_parse_varint(e) for e in encoded])
+        new_dec = bench(lambda: [decode_unsigned_varint(e, 0) for e in encoded])
+        print(
+            f"{bits:>2} bit values: "
+            f"encode {legacy_enc:>6.0f} -> {new_enc:>4.0f} ns, "
+            f"decode {legacy_dec:>6.0f} -> {new_dec:>4.0f} ns"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import socket
+import threading
+import unittest
+
+from app import async_server, main
+
+API_VERSIONS_REQUEST = b"\x00\x00\x00#\x00\x12\x00\x04\x00\x00\x00\x07\x00\tkafka-cli\x00\nkafka-cli\x040.1\x00"  # fmt: skip
+API_VERSIONS_RESPONSE = b"\x00\x00\x00(\x00\x00\x00\x07\x00\x00\x05\x00\x12\x00\x00\x00\x04\x00\x00K\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x11\x00\x00\x00\x00\t\x00\x0b\x00\x00\x00\x00\x00\x00"  # fmt: skip
+FETCH_REQUEST = b"\x00\x00\x000\x00\x01\x00\x10Qc\x1b\xf3\x00\x0ckafka-tester\x00\x00\x00\x01\xf4\x00\x00\x00\x01\x03 \x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x00"  # fmt: skip
+FETCH_RESPONSE = b"\x00\x00\x00\x11Qc\x1b\xf3\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00"  # fmt: skip
+
+
+def free_port() -> int:
+    with socket.create_server(("localhost", 0)) as s:
+        return s.getsockname()[1]
+
+
+class AsyncServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        address = ("localhost", free_port())
+        self.server = asyncio.create_task(
+            async_server.serve(address, main.kafka_response_buffers_async, 10, 2)
+        )
+        for _ in range(100):
+            try:
+                self.reader, self.writer = await asyncio.open_connection(*address)
+                break
+            except ConnectionError:
+                await asyncio.sleep(0.01)
+        else:
+            self.fail("server did not start")
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.server.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.server
+
+    async def read_response(self) -> bytes:
+        size = await self.reader.readexactly(4)
+        return size + await self.reader.readexactly(int.from_bytes(size))
+
+    async def test_round_trip(self):
+        for request, expected in [
+            (API_VERSIONS_REQUEST, API_VERSIONS_RESPONSE),
+            (FETCH_REQUEST, FETCH_RESPONSE),
+        ]:
+            self.writer.write(request)
+            self.assertEqual(await self.read_response(), expected)
+
+    async def test_pipelined_frames(self):
+        # split mid frame, the second request arrives with the end of the first
+        requests = API_VERSIONS_REQUEST + FETCH_REQUEST + API_VERSIONS_REQUEST
+        self.writer.write(requests[:10])
+        await self.writer.drain()
+        self.writer.write(requests[10:])
+
+        self.assertEqual(await self.read_response(), API_VERSIONS_RESPONSE)
+        self.assertEqual(await self.read_response(), FETCH_RESPONSE)
+        self.assertEqual(await self.read_response(), API_VERSIONS_RESPONSE)
+
+    async def test_closes_on_frame_too_large(self):
+        self.writer.write(b"\x7f\xff\xff\xff")
+        self.assertEqual(await self.reader.read(), b"")
+
+    async def test_executor_shut_down_with_the_server(self):
+        loop = asyncio.get_running_loop()
+        name = await loop.run_in_executor(None, lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith("respond"))
+
+        # the server waits for its connections to close
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.server.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.server
+        with self.assertRaises(RuntimeError):
+            await loop.run_in_executor(None, print)
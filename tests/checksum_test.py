@@ -0,0 +1,43 @@
+import random
+import unittest
+
+from app.checksum import crc32c, crc32c_python
+from app.kafka_handlers import valid_records
+from app.storage import valid_batches_size
+from tests.metadata_log import batch
+
+
+class Crc32cTestCase(unittest.TestCase):
+    def test_known_values(self):
+        self.assertEqual(crc32c_python(b""), 0)
+        self.assertEqual(crc32c_python(b"123456789"), 0xE3069283)
+        self.assertEqual(crc32c_python(bytes(32)), 0x8A9136AA)
+
+    def test_incremental_and_native_agree(self):
+        rng = random.Random(0)
+        for size in (1, 7, 8, 9, 63, 64, 1000):
+            data = rng.randbytes(size)
+            whole = crc32c_python(data)
+            split = size // 3
+            first = crc32c_python(data[:split])
+            self.assertEqual(crc32c_python(data[split:], first), whole)
+            self.assertEqual(crc32c(data), whole)
+
+    def test_valid_batches_size(self):
+        batches = [batch(i, [b"value %d" % i]) for i in range(3)]
+        log = bytearray(b"".join(batches))
+        self.assertEqual(valid_batches_size(log), len(log))
+
+        log[len(batches[0]) + 40] ^= 0xFF
+        self.assertEqual(valid_batches_size(log), len(batches[0]))
+        self.assertEqual(valid_batches_size(log[:-1]), len(batches[0]))
+
+    def test_valid_records_stop_at_corrupt_batch(self):
+        first, second, third = [batch(i, [b"value %d" % i]) for i in range(3)]
+        corrupt = bytearray(second)
+        corrupt[-1] ^= 0xFF
+
+        self.assertEqual(valid_records([first, second]), ([first, second], False))
+        records, found = valid_records([first, bytes(corrupt) + third])
+        self.assertEqual((records, found), ([first], True))
+        self.assertEqual(valid_records([bytes(corrupt)]), ([], True))
@@ -0,0 +1,73 @@
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import compression, kafka_parser
+from app.compression import Compression, decompress
+from app.metadata import MetadataFollower
+from tests.metadata_log import (
+    batch,
+    record,
+    records_batch,
+    topic_record,
+    topic_uuid,
+)
+
+# "abc", then a 9 byte copy at offset 3
+SNAPPY_BLOCK = b"\x0c" + b"\x08abc" + b"\x15\x03"
+LZ4_FRAME = (
+    b"\x04\x22\x4d\x18\x60\x40\x82"
+    + (8).to_bytes(4, "little")
+    # 3 literals then a 9 byte match at offset 3, last sequence: 1 literal
+    + b"\x35abc\x03\x00\x10!"
+    + bytes(4)
+)
+
+
+class DecompressTestCase(unittest.TestCase):
+    def test_gzip(self):
+        data = b"records " * 100
+        self.assertEqual(decompress(Compression.GZIP, gzip.compress(data)), data)
+
+    def test_snappy_block_and_xerial_stream(self):
+        self.assertEqual(compression.snappy_decompress_block(SNAPPY_BLOCK), b"abc" * 4)
+
+        stream = compression.XERIAL_MAGIC + (1).to_bytes(4) + (1).to_bytes(4)
+        stream += (len(SNAPPY_BLOCK).to_bytes(4) + SNAPPY_BLOCK) * 2
+        decode = compression.snappy_decompress_block
+        self.assertEqual(
+            compression.decompress_snappy_with(decode, stream), b"abc" * 8
+        )
+
+    def test_lz4_frame(self):
+        self.assertEqual(compression.lz4_decompress_frame(LZ4_FRAME), b"abc" * 4 + b"!")
+
+
+class CompressedBatchTestCase(unittest.TestCase):
+    def test_gzip_batch(self):
+        records = [record(0, topic_record("foo", topic_uuid(1)))]
+        (parsed,) = kafka_parser.iter_kafka_cluster_log(
+            records_batch(0, records, gzip=True)
+        )
+        self.assertEqual(parsed.records[0].value.name, "foo")
+
+    def test_unsupported_codec_stops_the_follower(self):
+        foo = batch(0, [topic_record("foo", topic_uuid(1))])
+        bar = records_batch(1, [record(0, topic_record("bar", topic_uuid(2)))], True)
+        with tempfile.TemporaryDirectory() as dir:
+            path = Path(dir) / "00000000000000000000.log"
+            path.write_bytes(foo + bar)
+            follower = MetadataFollower(path)
+
+            with mock.patch.dict(compression.CODECS, clear=True):
+                with mock.patch("sys.stderr") as stderr:
+                    context = follower.poll()
+            self.assertIn("GZIP is not supported", str(stderr.mock_calls))
+            self.assertEqual(list(context.topics), ["foo"])
+            self.assertEqual(follower.position, len(foo))
+
+            # decoded once the codec is available
+            context = follower.poll()
+            self.assertEqual(list(context.topics), ["foo", "bar"])
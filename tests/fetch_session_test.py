@@ -0,0 +1,202 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from uuid import UUID
+
+from app import kafka_handlers, kafka_parser
+from app.api_keys import ErrorCode
+from app.api_keys.fetch import (
+    FetchForgottenTopic,
+    FetchRequest_V17,
+    FetchRequest_V17Partition,
+    FetchRequest_V17Topic,
+)
+from app.api_keys.produce import (
+    ProducePartitionData,
+    ProduceRequest,
+    ProduceTopicData,
+)
+from app.fetch_session import FINAL_EPOCH, FetchSessionCache
+from app.metadata import Context
+from app.storage import LogManager, PartitionLog
+from tests.metadata_log import batch
+
+FOO = UUID(int=1)
+BAR = UUID(int=2)
+
+
+def fetch_request(
+    session_id: int,
+    epoch: int,
+    partitions: list[tuple[UUID, int, int]],
+    forgotten: list[tuple[UUID, int]] = (),
+) -> FetchRequest_V17:
+    """Fetch of (topic id, partition, fetch offset)."""
+    topics = {}
+    for topic_id, index, offset in partitions:
+        p = FetchRequest_V17Partition(index, 0, offset, 0, 0, 1 << 20, 0)
+        topics.setdefault(topic_id, FetchRequest_V17Topic(topic_id, [], 0))
+        topics[topic_id].partitions.append(p)
+    forgotten_topics = [FetchForgottenTopic(t, [i], 0) for t, i in forgotten]
+    return FetchRequest_V17(
+        0,
+        1,
+        1 << 20,
+        0,
+        session_id,
+        epoch,
+        list(topics.values()),
+        forgotten_topics,
+        "",
+        0,
+    )
+
+
+def fetched(topics: list[FetchRequest_V17Topic]) -> list[tuple[UUID, int, int]]:
+    return [
+        (t.topic_id, p.partition, p.fetch_offset) for t in topics for p in t.partitions
+    ]
+
+
+class FetchSessionCacheTestCase(unittest.TestCase):
+    def test_incremental_fetches(self):
+        cache = FetchSessionCache(max_sessions=10)
+        full = cache.update(
+            fetch_request(0, 0, [(FOO, 0, 0), (FOO, 1, 0), (BAR, 0, 0)])
+        )
+        self.assertNotEqual(full.session_id, 0)
+        self.assertFalse(full.incremental)
+
+        # only the moved partition is sent, the session keeps the others
+        update = cache.update(fetch_request(full.session_id, 1, [(FOO, 1, 5)]))
+        self.assertTrue(update.incremental)
+        self.assertEqual(
+            fetched(update.topics), [(FOO, 0, 0), (FOO, 1, 5), (BAR, 0, 0)]
+        )
+
+        update = cache.update(fetch_request(full.session_id, 2, [], [(FOO, 0)]))
+        self.assertEqual(fetched(update.topics), [(FOO, 1, 5), (BAR, 0, 0)])
+
+    def test_session_errors(self):
+        cache = FetchSessionCache(max_sessions=10)
+        session_id = cache.update(fetch_request(0, 0, [(FOO, 0, 0)])).session_id
+
+        wrong_epoch = cache.update(fetch_request(session_id, 3, []))
+        self.assertEqual(wrong_epoch.error, ErrorCode.INVALID_FETCH_SESSION_EPOCH)
+        unknown = cache.update(fetch_request(session_id + 1, 1, []))
+        self.assertEqual(unknown.error, ErrorCode.FETCH_SESSION_ID_NOT_FOUND)
+        self.assertEqual(
+            cache.update(fetch_request(session_id, 1, [])).error, ErrorCode.NONE
+        )
+
+        closed = cache.update(fetch_request(session_id, FINAL_EPOCH, [(FOO, 0, 0)]))
+        self.assertEqual((closed.session_id, closed.incremental), (0, False))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = FetchSessionCache(max_sessions=2)
+        first = cache.update(fetch_request(0, 0, [(FOO, 0, 0)])).session_id
+        second = cache.update(fetch_request(0, 0, [(FOO, 0, 0)])).session_id
+        cache.update(fetch_request(first, 1, []))
+        cache.update(fetch_request(0, 0, [(FOO, 0, 0)]))
+
+        self.assertEqual(len(cache), 2)
+        evicted = cache.update(fetch_request(second, 1, []))
+        self.assertEqual(evicted.error, ErrorCode.FETCH_SESSION_ID_NOT_FOUND)
+        self.assertEqual(
+            cache.update(fetch_request(first, 2, [])).error, ErrorCode.NONE
+        )
+
+    def test_no_session(self):
+        self.assertEqual(
+            FetchSessionCache(0).update(fetch_request(0, 0, [(FOO, 0, 0)])).session_id,
+            0,
+        )
+        sessionless = FetchSessionCache(10).update(fetch_request(0, FINAL_EPOCH, []))
+        self.assertEqual(sessionless.session_id, 0)
+
+
+class IncrementalFetchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.logs = LogManager(Path(self.dir.name))
+        replicas = kafka_parser.int32_array(b"\x00\x00\x00\x01")
+        partitions = [
+            kafka_parser.PartitionRecordValue(
+                i,
+                FOO.bytes,
+                replicas,
+                replicas,
+                replicas[:0],
+                replicas[:0],
+                1,
+                0,
+                0,
+                (),
+            )
+            for i in range(2)
+        ]
+        context = Context.build({"foo": FOO}, partitions)
+        patches = [
+            mock.patch.object(kafka_handlers, "LOGS", self.logs),
+            mock.patch.object(kafka_handlers, "CONTEXT", context),
+            mock.patch.object(kafka_handlers, "FETCH_SESSIONS", FetchSessionCache(10)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.logs.close()
+        self.dir.cleanup()
+
+    def produce(self, index: int, records: bytes):
+        partition = ProducePartitionData(index, memoryview(records), 0)
+        topic = ProduceTopicData("foo", [partition], 0)
+        kafka_handlers.produce(None, ProduceRequest(None, 1, 1000, [topic], 0))
+
+    def test_only_partitions_with_records_are_answered(self):
+        self.produce(0, batch(0, [b"a"]))
+        self.produce(1, batch(0, [b"b"]))
+
+        full = kafka_handlers.fetch(
+            None, fetch_request(0, 0, [(FOO, 0, 0), (FOO, 1, 0)])
+        )
+        self.assertEqual(
+            [p.partition_index for p in full.responses[0].partitions], [0, 1]
+        )
+
+        # both consumed, then only partition 1 grows
+        body = fetch_request(full.session_id, 1, [(FOO, 0, 1), (FOO, 1, 1)])
+        empty = kafka_handlers.fetch(None, body)
+        self.assertEqual(empty.responses, [])
+
+        self.produce(1, batch(0, [b"c"]))
+        incremental = kafka_handlers.fetch(None, fetch_request(full.session_id, 2, []))
+        (topic,) = incremental.responses
+        self.assertEqual([p.partition_index for p in topic.partitions], [1])
+        self.assertEqual(b"".join(topic.partitions[0].records), batch(1, [b"c"]))
+
+    def test_idle_partitions_are_not_read(self):
+        self.produce(0, batch(0, [b"a"]))
+        self.produce(1, batch(0, [b"b"]))
+        body = fetch_request(0, 0, [(FOO, 0, 1), (FOO, 1, 1)])
+        session_id = kafka_handlers.fetch(None, body).session_id
+        kafka_handlers.fetch(None, fetch_request(session_id, 1, []))
+
+        self.produce(1, batch(0, [b"c"]))
+        with mock.patch.object(
+            PartitionLog, "read", autospec=True, side_effect=PartitionLog.read
+        ) as read:
+            kafka_handlers.fetch(None, fetch_request(session_id, 2, []))
+        (log, *_), _ = read.call_args
+        self.assertEqual(read.call_count, 1)
+        self.assertIs(log, self.logs.get("foo", 1))
+
+    def test_session_error_response(self):
+        response = kafka_handlers.fetch(None, fetch_request(1234, 1, []))
+        self.assertEqual(
+            response.error_code, ErrorCode.FETCH_SESSION_ID_NOT_FOUND.value
+        )
+        self.assertEqual(response.session_id, 0)
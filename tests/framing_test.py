@@ -0,0 +1,57 @@
+import socket
+import threading
+import unittest
+
+from app.framing import FrameBuffer, send_buffers
+
+
+class FrameBufferTestCase(unittest.TestCase):
+    def test_pipelined_frames(self):
+        first = b"\x00\x00\x00\x03abc"
+        second = b"\x00\x00\x00\x02de"
+        buffer = FrameBuffer(capacity=4)
+
+        buffer.feed(first + second[:3])
+        self.assertEqual(list(buffer.frames()), [first])
+
+        buffer.feed(second[3:])
+        self.assertEqual(list(buffer.frames()), [second])
+        self.assertEqual(len(buffer), 0)
+
+    def test_large_frame_grows_buffer(self):
+        payload = bytes(range(256)) * 100
+        frame = len(payload).to_bytes(4) + payload
+        buffer = FrameBuffer(capacity=16)
+
+        for i in range(0, len(frame), 1000):
+            buffer.feed(frame[i : i + 1000])
+            frames = list(buffer.frames())
+
+        self.assertEqual(frames, [frame])
+
+    def test_frame_too_large(self):
+        buffer = FrameBuffer()
+        buffer.feed(b"\x7f\xff\xff\xff")
+        with self.assertRaises(ValueError):
+            list(buffer.frames())
+
+    def test_send_buffers(self):
+        payload = memoryview(bytes(range(256)) * 4096)
+        buffers = [b"\x00\x00", bytearray(b"head"), b"", payload, b"tail"] * 3
+        expected = b"".join(buffers)
+        left, right = socket.socketpair()
+
+        received = bytearray()
+
+        def read():
+            while len(received) < len(expected):
+                received.extend(right.recv(65536))
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        send_buffers(left, buffers)
+        reader.join()
+        left.close()
+        right.close()
+
+        self.assertEqual(received, expected)
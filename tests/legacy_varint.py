@@ -0,0 +1,33 @@
+"""The former string-of-bits varint codec, the reference of the shift based
+one."""
+
+from app.utils import INT8
+
+
+def legacy_encode_var_int(v: int) -> bytes:
+    if v <= 0b1111111:
+        return v.to_bytes(INT8)
+
+    bits = bin(v)[2:]
+
+    first = bits[-7:]
+    second = bits[:-7]
+
+    return int(f"1{first}", 2).to_bytes(INT8) + legacy_encode_var_int(int(second, 2))
+
+
+def legacy_parse_varint(data: bytes) -> tuple[int, bytes]:
+    def parse_byte(data: bytes) -> tuple[str, bytes]:
+        var_int_bytes = int.from_bytes(data[:INT8])
+        data = data[INT8:]
+        string_bits = bin(var_int_bytes)
+        string_bits = string_bits[2:].zfill(8)
+        return string_bits, data
+
+    first_string, data = parse_byte(data)
+    result_string = first_string[1:]
+    while first_string[0] == "1":
+        first_string, data = parse_byte(data)
+        result_string = first_string[1:] + result_string
+
+    return int(result_string, 2), data
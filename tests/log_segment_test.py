@@ -0,0 +1,211 @@
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.storage import LogManager, LogSegment, segment_file_name
+from app.storage.offset_index import INDEX_INTERVAL_BYTES, OffsetIndex
+from tests.metadata_log import batch
+
+
+class LogSegmentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / segment_file_name(0)
+        # offsets 0-1, 2-4, 5
+        self.batches = [
+            batch(0, [b"a", b"b"]),
+            batch(2, [b"c", b"d", b"e"]),
+            batch(5, [b"f"]),
+        ]
+        self.path.write_bytes(b"".join(self.batches))
+        self.segment = LogSegment(self.path, 0)
+
+    def tearDown(self):
+        self.segment.close()
+        self.dir.cleanup()
+
+    def test_read_from_offset(self):
+        first, second, third = self.batches
+        self.assertEqual(self.segment.read(0, 1 << 20), first + second + third)
+        self.assertEqual(self.segment.read(3, 1 << 20), second + third)
+        self.assertEqual(self.segment.read(5, 1 << 20), third)
+        self.assertEqual(self.segment.read(6, 1 << 20), b"")
+
+    def test_read_bounded_by_max_bytes(self):
+        first, second, _ = self.batches
+        self.assertEqual(self.segment.read(0, len(first) + len(second)), first + second)
+        self.assertEqual(self.segment.read(0, 1), first)
+        self.assertEqual(self.segment.read(0, 1, min_one_batch=False), b"")
+
+    def test_appended_batches_are_visible(self):
+        view = self.segment.read(0, 1 << 20)
+        appended = batch(6, [b"g"])
+        # a partially written batch is not returned
+        with self.path.open("ab") as f:
+            f.write(appended[:10])
+        self.assertEqual(self.segment.read(6, 1 << 20), b"")
+
+        with self.path.open("ab") as f:
+            f.write(appended[10:])
+        self.assertEqual(self.segment.read(6, 1 << 20), appended)
+        self.assertEqual(view, b"".join(self.batches))
+
+
+class OffsetIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / segment_file_name(100)
+        self.batches = [batch(100 + 2 * i, [b"x" * 200, b"y"]) for i in range(200)]
+        self.path.write_bytes(b"".join(self.batches))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_lookup_every_offset(self):
+        segment = LogSegment(self.path, 100)
+        for i, expected in enumerate(self.batches):
+            for offset in (100 + 2 * i, 101 + 2 * i):
+                self.assertEqual(segment.read(offset, 1), expected)
+
+        index = segment.offset_index()
+        self.assertGreater(len(index), 10)
+        self.assertLess(len(index), len(self.batches))
+        segment.close()
+
+    def test_index_is_persisted_and_extended(self):
+        segment = LogSegment(self.path, 100)
+        entries = list(segment.offset_index().entries)
+        segment.close()
+        index_path = self.path.with_suffix(".index")
+        self.assertEqual(index_path.stat().st_size, len(entries) * 8)
+
+        appended = [batch(500 + 2 * i, [b"x" * 200, b"y"]) for i in range(100)]
+        with self.path.open("ab") as f:
+            f.write(b"".join(appended))
+
+        segment = LogSegment(self.path, 100)
+        self.assertEqual(segment.read(550, 1), appended[25])
+        index = segment.offset_index()
+        self.assertEqual(index.entries[: len(entries)], entries)
+        self.assertGreater(len(index), len(entries))
+        self.assertEqual(index_path.stat().st_size, len(index) * 8)
+        segment.close()
+
+    def test_entries_past_the_log_are_dropped(self):
+        segment = LogSegment(self.path, 100)
+        segment.offset_index()
+        segment.close()
+        half = sum(len(b) for b in self.batches[:100])
+        with self.path.open("r+b") as f:
+            f.truncate(half)
+
+        segment = LogSegment(self.path, 100)
+        self.assertEqual(segment.read(300, 1), b"")
+        self.assertEqual(segment.read(298, 1), self.batches[99])
+        self.assertTrue(all(p < half for _, p in segment.offset_index().entries))
+        segment.close()
+
+    def test_lookup_during_update(self):
+        index = OffsetIndex(self.path.with_suffix(".index"), 100, 0)
+        # every batch gets an entry
+        size = INDEX_INTERVAL_BYTES + 1
+        n_batches = 20000
+        log_size = 0
+        done = threading.Event()
+        errors = []
+
+        def batches(start: int):
+            for position in range(start, log_size, size):
+                offset = 100 + position // size
+                yield position, offset, offset, size
+
+        def append():
+            nonlocal log_size
+            for n in range(1, n_batches + 1):
+                log_size = n * size
+                index.update(log_size, batches)
+            done.set()
+
+        def lookup():
+            try:
+                while not done.is_set():
+                    index.lookup(100 + n_batches)
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=f) for f in (append, lookup)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(index.lookup(100 + n_batches), (n_batches - 1) * size)
+
+
+class PartitionLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.partition_dir = Path(self.dir.name) / "foo-0"
+        self.partition_dir.mkdir()
+        # three segments of two batches of two records each
+        self.batches = [batch(2 * i, [b"a", b"b"]) for i in range(6)]
+        for base_offset in (0, 4, 8):
+            segment = self.partition_dir / segment_file_name(base_offset)
+            segment.write_bytes(b"".join(self.batches[base_offset // 2 :][:2]))
+        self.logs = LogManager(Path(self.dir.name))
+
+    def tearDown(self):
+        self.logs.close()
+        self.dir.cleanup()
+
+    def test_read_across_segments(self):
+        log = self.logs.get("foo", 0)
+        self.assertEqual(log.base_offsets, [0, 4, 8])
+
+        records = log.read(3, 1 << 20, min_one_batch=True)
+        self.assertEqual(b"".join(records), b"".join(self.batches[1:]))
+        self.assertEqual(len(records), 3)
+
+        size = len(self.batches[4])
+        records = log.read(5, 2 * size, True)
+        self.assertEqual(b"".join(records), self.batches[2] + self.batches[3])
+        self.assertEqual(log.read(12, 1 << 20, True), [])
+
+    def test_rolled_segment_is_discovered(self):
+        log = self.logs.get("foo", 0)
+        rolled = batch(12, [b"c"])
+        (self.partition_dir / segment_file_name(12)).write_bytes(rolled)
+
+        self.assertEqual(log.read(12, 1 << 20, True), [rolled])
+        self.assertEqual(log.base_offsets, [0, 4, 8, 12])
+
+    def test_unknown_partition(self):
+        self.assertIsNone(self.logs.get("foo", 1))
+
+    def test_offsets(self):
+        log = self.logs.get("foo", 0)
+        self.assertEqual(log.offsets(), (0, 12))
+
+        base_offset, _, _ = log.append(bytearray(batch(0, [b"c", b"d", b"e"])))
+        self.assertEqual(base_offset, 12)
+        with mock.patch.object(LogSegment, "next_offset") as next_offset:
+            self.assertEqual(log.offsets(), (0, 15))
+        next_offset.assert_not_called()
+
+        # written by another process
+        with (self.partition_dir / segment_file_name(8)).open("ab") as f:
+            f.write(batch(15, [b"f"]))
+        self.assertEqual(log.offsets(), (0, 16))
+
+        empty = self.partition_dir.with_name("foo-1")
+        empty.mkdir()
+        self.assertEqual(self.logs.get("foo", 1).offsets(), (0, 0))
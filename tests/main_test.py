@@ -1,7 +1,12 @@
 import os
+import socket
+import threading
 from pathlib import Path
 import unittest
-from app import main
+from unittest import mock
+
+from app import kafka_handlers, main
+from app.api_keys import ApiKeys
 from app.api_keys.api_version import ApiVersionsRequest
 from app.api_keys.describe_topic_partitions import DescribeTopicPartitionsRequest
 from app.header_request import HeaderRequest
@@ -73,13 +78,56 @@ class MainTestCase(unittest.TestCase):
         ]
 
         api_version_responses = [
-            b"\x00\x00\x00!\x00\x00\x00\x07\x00\x00\x04\x00\x12\x00\x00\x00\x04\x00\x00K\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x11\x00\x00\x00\x00\x00\x00",
-            b"\x00\x00\x00!\x1d\x90\x9a\xee\x00\x00\x04\x00\x12\x00\x00\x00\x04\x00\x00K\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x11\x00\x00\x00\x00\x00\x00",
+            b"\x00\x00\x00(\x00\x00\x00\x07\x00\x00\x05\x00\x12\x00\x00\x00\x04\x00\x00K\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x11\x00\x00\x00\x00\t\x00\x0b\x00\x00\x00\x00\x00\x00",
+            b"\x00\x00\x00(\x1d\x90\x9a\xee\x00\x00\x05\x00\x12\x00\x00\x00\x04\x00\x00K\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x11\x00\x00\x00\x00\t\x00\x0b\x00\x00\x00\x00\x00\x00",
             b"\x00\x00\x00\x06\x7f\xfb\xe7=\x00#",
         ]
 
         self.__assertRequests(api_version_requests, api_version_responses)
 
+    def test_api_versions_cached(self):
+        request = b"\x00\x00\x00#\x00\x12\x00\x04\x00\x00\x00\x07\x00\tkafka-cli\x00\nkafka-cli\x040.1\x00"
+        header, body_bytes = kafka_parser.parse_header_request(request)
+        body = kafka_parser.parse_api_version_request(body_bytes)
+
+        first = kafka_handlers.api_versions(header, body)
+        self.assertIs(kafka_handlers.api_versions(header, body), first)
+
+        # a handler less, a new body without its api key
+        handles = kafka_handlers.get_handles()
+        del handles[ApiKeys.Produce.value.code]
+        with mock.patch.object(kafka_handlers, "get_handles", return_value=handles):
+            without_produce = kafka_handlers.api_versions(header, body)
+        self.assertEqual(len(without_produce.data), len(first.data) - 7)
+
+    def test_server_mode_from_env(self):
+        with mock.patch.dict(os.environ, {"KAFKA_SERVER_MODE": "asyncio"}):
+            self.assertEqual(main.parse_args([]).server_mode, "asyncio")
+        # argparse leaves defaults unchecked
+        with (
+            mock.patch.dict(os.environ, {"KAFKA_SERVER_MODE": "asyncoi"}),
+            mock.patch("sys.stderr"),
+        ):
+            with self.assertRaises(SystemExit):
+                main.parse_args([])
+
+    def test_accept_client_closes_on_bad_frame(self):
+        request = b"\x00\x00\x00#\x00\x12\x00\x04\x00\x00\x00\x07\x00\tkafka-cli\x00\nkafka-cli\x040.1\x00"
+        server, client = socket.socketpair()
+        thread = threading.Thread(target=main.accept_client, args=(server,))
+        with mock.patch("sys.stdout"), mock.patch("sys.stderr"):
+            thread.start()
+            # answered, then closed at the oversized frame that follows it
+            client.sendall(request + b"\x7f\xff\xff\xff")
+            received = b""
+            while data := client.recv(4096):
+                received += data
+            thread.join()
+        client.close()
+
+        self.assertEqual(received, main.kafka_response(request))
+        self.assertEqual(server.fileno(), -1)
+
     def test_tech(self):
         fetch_reqs = [
             b"\x00\x00\x000\x00\x01\x00\x10Qc\x1b\xf3\x00\x0ckafka-tester\x00\x00\x00\x01\xf4\x00\x00\x00\x01\x03 \x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x00",
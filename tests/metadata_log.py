@@ -0,0 +1,147 @@
+"""Synthetic record batches and __cluster_metadata logs, shared by the tests
+and the benchmarks."""
+
+from gzip import compress
+from uuid import UUID
+
+from app.checksum import crc32c
+from app.compression import Compression
+from app.utils import (
+    INT16,
+    INT32,
+    INT64,
+    INT8,
+    encode_unsigned_varint,
+    encode_varint,
+)
+
+NO_PRODUCER = (-1).to_bytes(INT64, signed=True) + (-1).to_bytes(INT16, signed=True)
+DIRECTORY = UUID("10000000-0000-4000-8000-000000000001")
+
+
+def topic_uuid(index: int) -> UUID:
+    return UUID(int=(0x4000 << 64) | (0x8000 << 48) | index)
+
+
+def topic_record(name: str, uuid: UUID) -> bytes:
+    name_bytes = name.encode()
+    return (
+        b"\x01\x02\x00"
+        + (len(name_bytes) + 1).to_bytes(INT8)
+        + name_bytes
+        + uuid.bytes
+        + b"\x00"
+    )
+
+
+def partition_record(index: int, uuid: UUID) -> bytes:
+    replicas = b"\x02" + (1).to_bytes(INT32)
+    return (
+        b"\x01\x03\x01"
+        + index.to_bytes(INT32)
+        + uuid.bytes
+        + replicas
+        + replicas
+        + b"\x01"
+        + b"\x01"
+        + (1).to_bytes(INT32)
+        + (0).to_bytes(INT32)
+        + (0).to_bytes(INT32)
+        + b"\x02"
+        + DIRECTORY.bytes
+        + b"\x00"
+    )
+
+
+def remove_topic_record(uuid: UUID) -> bytes:
+    return b"\x01\x09\x00" + uuid.bytes + b"\x00"
+
+
+def partition_change_record(
+    index: int,
+    uuid: UUID,
+    leader: int | None = None,
+    isr: list[int] | None = None,
+) -> bytes:
+    """Only the given fields change, they are tagged fields."""
+    fields = []
+    if isr is not None:
+        value = encode_unsigned_varint(len(isr) + 1)
+        value += b"".join(r.to_bytes(INT32) for r in isr)
+        fields.append((0, value))
+    if leader is not None:
+        fields.append((1, leader.to_bytes(INT32, signed=True)))
+
+    tagged = encode_unsigned_varint(len(fields)) + b"".join(
+        encode_unsigned_varint(tag) + encode_unsigned_varint(len(value)) + value
+        for tag, value in fields
+    )
+    return b"\x01\x05\x00" + index.to_bytes(INT32) + uuid.bytes + tagged
+
+
+def record(
+    offset_delta: int,
+    value: bytes,
+    key: bytes | None = None,
+    headers: tuple[tuple[bytes, bytes], ...] = (),
+) -> bytes:
+    encoded_key = encode_varint(-1) if key is None else encode_varint(len(key)) + key
+    encoded_headers = encode_varint(len(headers)) + b"".join(
+        encode_varint(len(k)) + k + encode_varint(len(v)) + v for k, v in headers
+    )
+    body = (
+        b"\x00"  # attributes
+        + b"\x00"  # timestamp delta
+        + offset_delta.to_bytes(INT8)
+        + encoded_key
+        + encode_varint(len(value))
+        + value
+        + encoded_headers
+    )
+    return encode_varint(len(body)) + body
+
+
+def batch(base_offset: int, values: list[bytes]) -> bytes:
+    return records_batch(base_offset, [record(i, v) for i, v in enumerate(values)])
+
+
+def records_batch(
+    base_offset: int, records: list[bytes], gzip: bool = False
+) -> bytes:
+    """A batch of records encoded with `record`."""
+    timestamp = (1726045957397).to_bytes(INT64)
+    data = b"".join(records)
+    attributes = 0
+    if gzip:
+        data = compress(data)
+        attributes = Compression.GZIP
+    checked = (
+        attributes.to_bytes(INT16)
+        + (len(records) - 1).to_bytes(INT32)
+        + timestamp
+        + timestamp
+        + NO_PRODUCER
+        + (-1).to_bytes(INT32, signed=True)  # base sequence
+        + len(records).to_bytes(INT32)
+        + data
+    )
+    body = (
+        (0).to_bytes(INT32)  # partition leader epoch
+        + (2).to_bytes(INT8)  # magic
+        + crc32c(checked).to_bytes(INT32)
+        + checked
+    )
+    return base_offset.to_bytes(INT64) + len(body).to_bytes(INT32) + body
+
+
+def metadata_log(n_topics: int, partitions_per_topic: int) -> bytes:
+    """One batch per topic: its TopicRecord followed by its PartitionRecords."""
+    batches = []
+    offset = 0
+    for t in range(n_topics):
+        uuid = topic_uuid(t)
+        values = [topic_record(f"topic-{t}", uuid)]
+        values += [partition_record(p, uuid) for p in range(partitions_per_topic)]
+        batches.append(batch(offset, values))
+        offset += len(values)
+    return b"".join(batches)
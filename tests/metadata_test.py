@@ -0,0 +1,417 @@
+import gc
+import io
+import tempfile
+import unittest
+import zlib
+from array import array
+from pathlib import Path
+from unittest import mock
+
+from app import kafka_handlers, kafka_parser, metadata, parallel_metadata
+from app.kafka_parser import parse_cluster_log
+from app.kafka_parser import PartitionRecordValue
+from app.metadata import Context, MetadataFollower
+from app.metadata_snapshot import (
+    SNAPSHOT_HEADER_SIZE,
+    InvalidSnapshot,
+    MetadataSnapshot,
+    parse_metadata_snapshot,
+    read_snapshot,
+    write_snapshot,
+)
+from tests.metadata_log import (
+    DIRECTORY,
+    batch,
+    partition_change_record,
+    partition_record,
+    record,
+    records_batch,
+    remove_topic_record,
+    topic_record,
+    topic_uuid,
+)
+
+
+def partition(index: int, topic: int, leader: int = 1) -> PartitionRecordValue:
+    uuid = topic_uuid(topic)
+    replicas = array("i", [1])
+    return PartitionRecordValue(
+        index,
+        uuid.bytes,
+        replicas,
+        replicas,
+        array("i"),
+        array("i"),
+        leader,
+        0,
+        0,
+        (DIRECTORY.bytes,),
+    )
+
+
+class ContextTestCase(unittest.TestCase):
+    def test_build_indexes(self):
+        topics = {"foo": topic_uuid(1), "bar": topic_uuid(2)}
+        partitions = [partition(2, 1), partition(0, 1), partition(1, 1, leader=2)]
+        partitions.append(partition(1, 1, leader=3))
+
+        context = Context.build(topics, partitions)
+
+        self.assertEqual(context.topic_names[topic_uuid(2)], "bar")
+        foo = context.topics_partitions[topic_uuid(1)]
+        self.assertEqual([p.id for p in foo], [0, 1, 2])
+        self.assertEqual(context.get_partition(topic_uuid(1), 1).leader, 3)
+        self.assertIsNone(context.get_partition(topic_uuid(1), 3))
+        self.assertIsNone(context.get_partition(topic_uuid(2), 0))
+
+
+class StreamClusterLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.log = batch(0, [topic_record("foo", topic_uuid(1))]) + batch(
+            1, [partition_record(0, topic_uuid(1))]
+        )
+
+    def test_iter_stops_before_partial_batch(self):
+        batchs = kafka_parser.iter_kafka_cluster_log(self.log + self.log[:30])
+        self.assertEqual([b.id for b in batchs], [0, 1])
+
+    def test_parse_rejects_truncated_log(self):
+        self.assertEqual(list(kafka_parser.parse_kafka_cluster_log(self.log)), [0, 1])
+        for tail in (self.log[:5], self.log[:30]):
+            with self.assertRaises(kafka_parser.TruncatedLogError) as raised:
+                kafka_parser.parse_kafka_cluster_log(self.log + tail)
+            self.assertEqual(raised.exception.position, len(self.log))
+
+    def test_read_leaves_partial_batch_unread(self):
+        f = io.BytesIO(self.log + self.log[:30])
+        batchs = kafka_parser.read_kafka_cluster_log(f)
+
+        self.assertEqual(next(batchs).id, 0)
+        self.assertEqual(next(batchs).id, 1)
+        self.assertEqual(f.tell(), len(self.log))
+        self.assertEqual(list(batchs), [])
+        self.assertEqual(f.tell(), len(self.log))
+
+    def test_partitions_share_ids_and_replicas(self):
+        log = batch(0, [partition_record(0, topic_uuid(1))]) + batch(
+            1, [partition_record(1, topic_uuid(1))]
+        )
+        first, second = [
+            b.records[0].value for b in kafka_parser.iter_kafka_cluster_log(log)
+        ]
+
+        self.assertIs(first.topic_id, second.topic_id)
+        self.assertIs(first.replicas, second.replicas)
+        self.assertEqual(list(first.replicas), [1])
+        self.assertEqual(first.topic_uuid, topic_uuid(1))
+        self.assertEqual(first.directories, (DIRECTORY.bytes,))
+
+    def test_unused_replicas_are_dropped(self):
+        key = (7).to_bytes(4) + (8).to_bytes(4)
+        replicas = kafka_parser.int32_array(key)
+        self.assertIs(kafka_parser.int32_array(key), replicas)
+
+        del replicas
+        gc.collect()
+        self.assertNotIn(key, parse_cluster_log._int32_arrays)
+
+    def test_interned_uuids_are_bounded(self):
+        with mock.patch.object(parse_cluster_log, "MAX_INTERNED_UUIDS", 4):
+            kept = kafka_parser.intern_uuid(topic_uuid(1000).bytes)
+            for i in range(1001, 1010):
+                kafka_parser.intern_uuid(topic_uuid(i).bytes)
+                # recently seen, not dropped
+                self.assertIs(kafka_parser.intern_uuid(kept), kept)
+            interned = len(parse_cluster_log._uuids) + len(parse_cluster_log._old_uuids)
+            self.assertLessEqual(interned, 2 * 4)
+
+
+class MetadataRecordsTestCase(unittest.TestCase):
+    def context(self, *values: bytes) -> Context:
+        batchs = [batch(i, [value]) for i, value in enumerate(values)]
+        return metadata.context_from_batches(
+            kafka_parser.iter_kafka_cluster_log(b"".join(batchs))
+        )
+
+    def test_unknown_types_keys_and_headers_are_skipped(self):
+        register_broker = b"\x01\x00\x03" + b"\x00" * 40
+        log = records_batch(
+            0,
+            [
+                record(0, register_broker),
+                record(1, topic_record("foo", topic_uuid(1)), key=b"k"),
+                record(2, partition_record(0, topic_uuid(1)), headers=((b"h", b"v"),)),
+            ],
+        )
+        (parsed,) = kafka_parser.iter_kafka_cluster_log(log)
+        self.assertIsNone(parsed.records[0].value)
+
+        context = metadata.context_from_batches([parsed])
+        self.assertEqual(context.topics, {"foo": topic_uuid(1)})
+        self.assertEqual(len(context.topics_partitions[topic_uuid(1)]), 1)
+
+    def test_partition_change(self):
+        context = self.context(
+            partition_record(0, topic_uuid(1)),
+            partition_change_record(0, topic_uuid(1), isr=[1, 2]),
+            partition_change_record(0, topic_uuid(1), leader=2),
+        )
+
+        p = context.get_partition(topic_uuid(1), 0)
+        self.assertEqual(list(p.sync_replicas), [1, 2])
+        self.assertEqual(list(p.replicas), [1])
+        self.assertEqual((p.leader, p.leader_epoch, p.partition_epoch), (2, 1, 2))
+
+    def test_change_to_unknown_partition_is_ignored(self):
+        context = self.context(partition_change_record(0, topic_uuid(1), leader=2))
+        self.assertEqual(context.topics_partitions, {})
+
+    def test_remove_topic(self):
+        context = self.context(
+            topic_record("foo", topic_uuid(1)),
+            partition_record(0, topic_uuid(1)),
+            topic_record("bar", topic_uuid(2)),
+            remove_topic_record(topic_uuid(1)),
+            topic_record("foo", topic_uuid(3)),
+        )
+
+        self.assertEqual(context.topics, {"bar": topic_uuid(2), "foo": topic_uuid(3)})
+        self.assertNotIn(topic_uuid(1), context.topic_names)
+        self.assertNotIn(topic_uuid(1), context.topics_partitions)
+
+
+class MetadataFollowerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "00000000000000000000.log"
+        self.path.write_bytes(b"")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def append(self, data: bytes):
+        with self.path.open("ab") as f:
+            f.write(data)
+
+    def test_follow_appended_batches(self):
+        follower = MetadataFollower(self.path)
+        self.assertIsNone(follower.poll())
+
+        foo = batch(0, [topic_record("foo", topic_uuid(1))])
+        self.append(foo)
+        first = follower.poll()
+        self.assertEqual(first.topics, {"foo": topic_uuid(1)})
+        self.assertEqual(follower.position, len(foo))
+
+        partitions = batch(1, [partition_record(0, topic_uuid(1))])
+        self.append(partitions[:20])
+        self.assertIsNone(follower.poll())
+
+        self.append(partitions[20:])
+        second = follower.poll()
+        self.assertEqual(follower.last_batch_offset, 1)
+        self.assertEqual(len(second.topics_partitions[topic_uuid(1)]), 1)
+        # readers holding the previous Context are not affected
+        self.assertEqual(first.topics_partitions, {})
+
+    def test_stops_at_corrupt_batch(self):
+        foo = batch(0, [topic_record("foo", topic_uuid(1))])
+        bar = bytearray(batch(1, [topic_record("bar", topic_uuid(2))]))
+        bar[-3] ^= 0xFF
+        self.append(foo + bar)
+
+        follower = MetadataFollower(self.path)
+        with mock.patch("sys.stderr"):
+            context = follower.poll()
+            self.assertEqual(context.topics, {"foo": topic_uuid(1)})
+            self.assertEqual(follower.position, len(foo))
+            self.assertIsNone(follower.poll())
+
+    def test_crc_not_checked(self):
+        foo = batch(0, [topic_record("foo", topic_uuid(1))])
+        bar = bytearray(batch(1, [topic_record("bar", topic_uuid(2))]))
+        # the crc follows the base offset, length, leader epoch and magic
+        bar[17] ^= 0xFF
+        self.append(foo + bar)
+
+        context = MetadataFollower(self.path, check_crc=False).poll()
+        self.assertEqual(context.topics, {"foo": topic_uuid(1), "bar": topic_uuid(2)})
+
+    def test_reports_partial_batch(self):
+        foo = batch(0, [topic_record("foo", topic_uuid(1))])
+        bar = batch(1, [topic_record("bar", topic_uuid(2))])
+        self.append(foo + bar[:20])
+
+        follower = MetadataFollower(self.path)
+        with mock.patch("sys.stderr") as stderr:
+            self.assertEqual(follower.poll().topics, {"foo": topic_uuid(1)})
+            self.assertIsNone(follower.poll())
+        reports = [c for c in stderr.mock_calls if "partial" in str(c)]
+        # once per position
+        self.assertEqual(len(reports), 1)
+        self.assertIn(f"at {len(foo)}: partial batch of 20 bytes", str(reports[0]))
+
+        self.append(bar[20:])
+        self.assertIn("bar", follower.poll().topics)
+
+    def test_truncated_log_is_replayed(self):
+        self.append(batch(0, [topic_record("foo", topic_uuid(1))]))
+        follower = MetadataFollower(self.path)
+        follower.poll()
+
+        self.path.write_bytes(b"")
+        self.assertEqual(follower.poll().topics, {})
+
+        self.append(batch(0, [topic_record("bar", topic_uuid(2))]))
+        self.assertEqual(follower.poll().topics, {"bar": topic_uuid(2)})
+
+
+class MetadataSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "00000000000000000000.log"
+        self.snapshot_path = self.path.with_suffix(".checkpoint")
+        self.path.write_bytes(
+            batch(0, [topic_record("foo", topic_uuid(1))])
+            + batch(1, [partition_record(0, topic_uuid(1))])
+        )
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def snapshot(self, follower: MetadataFollower) -> MetadataSnapshot:
+        return MetadataSnapshot(
+            follower.context,
+            follower.position,
+            follower.last_batch_position,
+            follower.last_batch_offset,
+        )
+
+    def test_round_trip(self):
+        follower = MetadataFollower(self.path)
+        follower.poll()
+        write_snapshot(self.snapshot_path, self.snapshot(follower))
+
+        snapshot = read_snapshot(self.snapshot_path)
+        self.assertEqual(snapshot, self.snapshot(follower))
+        self.assertEqual(list(Path(self.dir.name).glob("*.tmp")), [])
+
+    def test_corrupt_snapshot(self):
+        follower = MetadataFollower(self.path)
+        follower.poll()
+        data = bytearray(self.snapshot(follower).encode())
+        data[-1] ^= 1
+        with self.assertRaises(InvalidSnapshot):
+            parse_metadata_snapshot(data)
+
+    def test_snapshot_shares_replicas(self):
+        follower = MetadataFollower(self.path)
+        follower.poll()
+        [partition] = follower.context.topics_partitions[topic_uuid(1)]
+
+        snapshot = parse_metadata_snapshot(self.snapshot(follower).encode())
+        [loaded] = snapshot.context.topics_partitions[topic_uuid(1)]
+        self.assertIs(loaded.replicas, partition.replicas)
+        self.assertIs(loaded.sync_replicas, partition.sync_replicas)
+        self.assertIs(loaded.topic_id, partition.topic_id)
+
+    def test_undecodable_body(self):
+        follower = MetadataFollower(self.path)
+        follower.poll()
+        data = self.snapshot(follower).encode()
+        # a valid crc over a truncated body
+        header, body = data[: SNAPSHOT_HEADER_SIZE - 4], data[SNAPSHOT_HEADER_SIZE:-1]
+        data = header + zlib.crc32(body).to_bytes(4) + body
+        with self.assertRaises(InvalidSnapshot):
+            parse_metadata_snapshot(data)
+
+    def test_snapshot_written_at_startup(self):
+        follower = MetadataFollower(self.path)
+        follower.poll()
+        with (
+            mock.patch.object(kafka_handlers, "METADATA", follower),
+            mock.patch.object(kafka_handlers, "METADATA_SNAPSHOT", self.snapshot_path),
+            mock.patch.object(kafka_handlers, "snapshot_position", -1),
+        ):
+            kafka_handlers.save_loaded_metadata()
+            self.assertEqual(kafka_handlers.snapshot_position, follower.position)
+
+        self.assertEqual(read_snapshot(self.snapshot_path), self.snapshot(follower))
+
+    def test_restore_replays_only_the_tail(self):
+        follower = MetadataFollower(self.path)
+        follower.poll()
+        snapshot = self.snapshot(follower)
+
+        with self.path.open("ab") as f:
+            f.write(batch(2, [topic_record("bar", topic_uuid(2))]))
+
+        restored = MetadataFollower(self.path)
+        self.assertTrue(restored.restore(*vars(snapshot).values()))
+        restored.poll()
+
+        replayed = MetadataFollower(self.path)
+        replayed.poll()
+        self.assertEqual(restored.context, replayed.context)
+        self.assertEqual(restored.position, replayed.position)
+
+    def test_restore_rejects_another_log(self):
+        follower = MetadataFollower(self.path)
+        follower.poll()
+        snapshot = self.snapshot(follower)
+
+        self.path.write_bytes(batch(5, [topic_record("bar", topic_uuid(2))]) * 2)
+        restored = MetadataFollower(self.path)
+        self.assertFalse(restored.restore(*vars(snapshot).values()))
+
+
+class ParallelDecodeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "00000000000000000000.log"
+        values = [topic_record(f"topic-{i}", topic_uuid(i)) for i in range(6)]
+        values += [
+            partition_record(p, topic_uuid(i)) for i in range(6) for p in range(2)
+        ]
+        # records reaching back to the ranges before theirs
+        values += [
+            partition_change_record(0, topic_uuid(0), leader=2),
+            remove_topic_record(topic_uuid(1)),
+            partition_change_record(1, topic_uuid(2), isr=[1, 2]),
+            partition_record(1, topic_uuid(2)),
+            partition_change_record(0, topic_uuid(1), leader=3),
+            partition_change_record(0, topic_uuid(3), isr=[]),
+        ]
+        self.path.write_bytes(
+            b"".join(batch(offset, [value]) for offset, value in enumerate(values))
+        )
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_same_context_as_sequential(self):
+        sequential = MetadataFollower(self.path)
+        expected = sequential.poll()
+
+        follower = MetadataFollower(self.path)
+        with (
+            mock.patch.object(parallel_metadata, "PARALLEL_MIN_BYTES", 0),
+            mock.patch("os.cpu_count", return_value=2),
+        ):
+            context = parallel_metadata.poll(follower, 2)
+        self.assertEqual(context, expected)
+        self.assertEqual(follower.context, expected)
+        self.assertEqual(follower.position, sequential.position)
+        self.assertEqual(follower.last_batch_position, sequential.last_batch_position)
+        self.assertEqual(follower.last_batch_offset, sequential.last_batch_offset)
+        self.assertIsNone(follower.poll())
+
+    def test_sequential_on_one_cpu(self):
+        follower = MetadataFollower(self.path)
+        with (
+            mock.patch.object(parallel_metadata, "PARALLEL_MIN_BYTES", 0),
+            mock.patch("os.cpu_count", return_value=1),
+        ):
+            self.assertIsNone(parallel_metadata.poll(follower, 2))
+        self.assertEqual(follower.position, 0)
+        self.assertIsNone(parallel_metadata.poll(follower, 2))
@@ -0,0 +1,50 @@
+import unittest
+
+from app import kafka_parser
+from app.kafka_encode import KafkaWriter
+from app.kafka_parser.parser_utils import ByteReader
+from app.utils import INT8
+
+API_VERSIONS_REQUEST = b"\x00\x00\x00#\x00\x12\x00\x04\x00\x00\x00\x07\x00\tkafka-cli\x00\nkafka-cli\x040.1\x00"  # fmt: skip
+
+
+class ByteReaderTestCase(unittest.TestCase):
+    def test_digest_past_the_end(self):
+        reader = ByteReader(b"abc")
+        self.assertEqual(bytes(reader.digest(2)), b"ab")
+        with self.assertRaises(ValueError):
+            reader.digest(2)
+        with self.assertRaises(ValueError):
+            reader.digest(-1)
+        self.assertEqual(reader.offset, 2)
+
+    def test_truncated_frame(self):
+        # cut in the client id of the header
+        with self.assertRaises(ValueError):
+            kafka_parser.parse_header_request(API_VERSIONS_REQUEST[:18])
+
+        # cut in the client software version of the body
+        _, body = kafka_parser.parse_header_request(API_VERSIONS_REQUEST[:-3])
+        with self.assertRaises(ValueError):
+            kafka_parser.parse_api_version_request(body)
+
+    def test_null_strings(self):
+        reader = ByteReader(b"\x00\x02a" + b"\xff\xff\x00\x01b" + b"\x05")
+        self.assertEqual(reader.read_compact_string(), "")
+        self.assertEqual(reader.read_compact_string(), "a")
+        self.assertEqual(reader.read_nullable_string(), "")
+        self.assertEqual(reader.read_nullable_string(), "b")
+        self.assertEqual(reader.read_int(INT8), 5)
+        self.assertEqual(reader.remaining(), 0)
+
+    def test_compact_nullable_string_round_trip(self):
+        writer = KafkaWriter()
+        for string in (None, "", "foo"):
+            writer.write_compact_nullable_string(string)
+        data = writer.getvalue()
+        self.assertEqual(data, b"\x00\x01\x04foo")
+
+        reader = ByteReader(data)
+        self.assertIsNone(reader.read_compact_nullable_string())
+        self.assertEqual(reader.read_compact_nullable_string(), "")
+        self.assertEqual(reader.read_compact_nullable_string(), "foo")
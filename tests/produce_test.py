@@ -0,0 +1,265 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+from uuid import UUID
+
+from app import kafka_handlers, kafka_parser, main
+from app.api_keys import ErrorCode
+from app.api_keys.fetch import (
+    FetchRequest_V17,
+    FetchRequest_V17Partition,
+    FetchRequest_V17Topic,
+)
+from app.kafka_parser.parser_utils import ByteReader
+from app.metadata import Context
+from app.storage import LogManager, LogSegment, PartitionLog, segment_file_name
+from app.utils import INT16, INT32, INT64, encode_unsigned_varint
+from tests.metadata_log import batch
+
+TOPIC = UUID(int=1)
+
+
+def partition(index: int) -> kafka_parser.PartitionRecordValue:
+    return kafka_parser.PartitionRecordValue(
+        id=index,
+        topic_id=TOPIC.bytes,
+        replicas=kafka_parser.int32_array(b"\x00\x00\x00\x01"),
+        sync_replicas=kafka_parser.int32_array(b"\x00\x00\x00\x01"),
+        removing_replicas=kafka_parser.int32_array(b""),
+        adding_replicas=kafka_parser.int32_array(b""),
+        leader=1,
+        leader_epoch=0,
+        partition_epoch=0,
+        directories=(),
+    )
+
+
+def produce_request(
+    partitions: list[tuple[int, bytes]], acks: int = -1, correlation_id: int = 7
+) -> bytes:
+    """ProduceRequest v11 to topic foo."""
+
+    def compact(data: bytes) -> bytes:
+        return encode_unsigned_varint(len(data) + 1) + data
+
+    body = (
+        b"\x00"  # transactional_id
+        + acks.to_bytes(INT16, signed=True)
+        + (1000).to_bytes(INT32)
+        + encode_unsigned_varint(2)
+        + compact(b"foo")
+        + encode_unsigned_varint(len(partitions) + 1)
+        + b"".join(
+            index.to_bytes(INT32) + compact(records) + b"\x00"
+            for index, records in partitions
+        )
+        + b"\x00\x00"
+    )
+    header = (
+        (0).to_bytes(INT16)
+        + (11).to_bytes(INT16)
+        + correlation_id.to_bytes(INT32)
+        + (4).to_bytes(INT16)
+        + b"test"  # client_id
+        + b"\x00"
+    )
+    message = header + body
+    return len(message).to_bytes(INT32) + message
+
+
+class ProduceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.logs = LogManager(Path(self.dir.name))
+        context = Context.build({"foo": TOPIC}, [partition(0), partition(1)])
+        patches = [
+            mock.patch.object(kafka_handlers, "LOGS", self.logs),
+            mock.patch.object(kafka_handlers, "CONTEXT", context),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.logs.close()
+        self.dir.cleanup()
+
+    def produce(self, partitions: list[tuple[int, bytes]], acks: int = -1):
+        return main.kafka_response(produce_request(partitions, acks))
+
+    def partition_responses(self, response: bytes) -> list[tuple[int, int, int]]:
+        """(index, error_code, base_offset) of each partition of topic foo."""
+        reader = ByteReader(response)
+        reader.digest(INT32 + INT32 + 1)  # size, correlation id, tag buffer
+
+        def parse_partition(r: ByteReader) -> tuple[int, int, int]:
+            index = r.read_int(INT32)
+            error_code = r.read_signed_int(INT16)
+            base_offset = r.read_signed_int(INT64)
+            r.digest(INT64 + INT64)  # log append time, log start offset
+            r.read_compact_array(lambda r: None)  # record errors
+            r.digest(max(r.read_unsigned_varint() - 1, 0))  # error message
+            r.read_tag_buffer()
+            return index, error_code, base_offset
+
+        (topic,) = reader.read_compact_array(
+            lambda r: (
+                r.read_compact_string(),
+                r.read_compact_array(parse_partition),
+                r.read_tag_buffer(),
+            )
+        )
+        self.assertEqual(topic[0], "foo")
+        return topic[1]
+
+    def test_offsets_are_assigned(self):
+        first = self.produce([(0, batch(0, [b"a", b"b"]))])
+        second = self.produce([(0, batch(0, [b"c"]) + batch(0, [b"d", b"e"]))])
+        self.assertEqual(self.partition_responses(first), [(0, 0, 0)])
+        self.assertEqual(self.partition_responses(second), [(0, 0, 2)])
+
+        log = self.logs.get("foo", 0)
+        self.assertEqual(
+            b"".join(log.read(0, 1 << 20, True)),
+            batch(0, [b"a", b"b"]) + batch(2, [b"c"]) + batch(3, [b"d", b"e"]),
+        )
+
+    def test_fetch_reports_offsets(self):
+        self.produce([(0, batch(0, [b"a", b"b"]) + batch(0, [b"c"]))])
+
+        def fetch(offset: int) -> tuple[int, int, int, int]:
+            p = FetchRequest_V17Partition(0, 0, offset, 0, 0, 1 << 20, 0)
+            topic = FetchRequest_V17Topic(TOPIC, [p], 0)
+            body = FetchRequest_V17(0, 1, 1 << 20, 0, 0, -1, [topic], [], "", 0)
+            (response,) = kafka_handlers.fetch(None, body).responses[0].partitions
+            return (
+                response.error_code,
+                response.high_watermark,
+                response.last_stable_offset,
+                response.log_start_offset,
+            )
+
+        self.assertEqual(fetch(1), (0, 3, 3, 0))
+        self.assertEqual(fetch(3), (0, 3, 3, 0))
+        out_of_range = ErrorCode.OFFSET_OUT_OF_RANGE.value
+        with mock.patch.object(PartitionLog, "read") as read:
+            self.assertEqual(fetch(4), (out_of_range, 3, 3, 0))
+        read.assert_not_called()
+
+    def test_offsets_continue_an_existing_log(self):
+        dir = Path(self.dir.name) / "foo-1"
+        dir.mkdir()
+        (dir / segment_file_name(10)).write_bytes(batch(10, [b"a", b"b", b"c"]))
+
+        response = self.produce([(1, batch(0, [b"d"]))])
+        self.assertEqual(self.partition_responses(response), [(1, 0, 13)])
+
+    def test_invalid_batches_are_rejected(self):
+        corrupt = bytearray(batch(0, [b"a"]))
+        corrupt[-1] ^= 0xFF
+        response = self.produce([(0, bytes(corrupt)), (1, batch(0, [b"a"])[:30])])
+        self.assertEqual(
+            self.partition_responses(response),
+            [
+                (0, ErrorCode.CORRUPT_MESSAGE.value, -1),
+                (1, ErrorCode.CORRUPT_MESSAGE.value, -1),
+            ],
+        )
+        self.assertEqual(self.logs.get("foo", 0).read(0, 1 << 20, True), [])
+
+    def test_unknown_partition(self):
+        response = self.produce([(2, batch(0, [b"a"]))])
+        self.assertEqual(
+            self.partition_responses(response),
+            [(2, ErrorCode.UNKNOWN_TOPIC_OR_PARTITION.value, -1)],
+        )
+        self.assertFalse((Path(self.dir.name) / "foo-2").exists())
+
+    def test_acks_0_has_no_response(self):
+        self.assertEqual(self.produce([(0, batch(0, [b"a"]))], acks=0), b"")
+        self.assertEqual(len(self.logs.get("foo", 0).read(0, 1 << 20, True)), 1)
+
+    def test_segments_are_rolled(self):
+        size = len(batch(0, [b"a"]))
+        self.logs.segment_bytes = 2 * size
+        for _ in range(5):
+            self.produce([(0, batch(0, [b"a"]))])
+
+        log = self.logs.get("foo", 0)
+        self.assertEqual(log.base_offsets, [0, 2, 4])
+        self.assertEqual(len(b"".join(log.read(0, 1 << 20, True))), 5 * size)
+
+
+class GroupCommitTestCase(unittest.TestCase):
+    def test_concurrent_appends_share_fsyncs(self):
+        with tempfile.TemporaryDirectory() as dir:
+            path = Path(dir) / segment_file_name(0)
+            path.touch()
+            segment = LogSegment(path, 0)
+            fsync_started = threading.Event()
+            release = threading.Event()
+            fsyncs = []
+
+            def slow_fsync(fd):
+                fsyncs.append(fd)
+                fsync_started.set()
+                release.wait()
+
+            with mock.patch("os.fsync", slow_fsync):
+                end = segment.append(b"a")
+                first = threading.Thread(target=segment.sync, args=(end,))
+                first.start()
+                fsync_started.wait()
+                # appended while the first fsync runs: one more fsync for all
+                ends = [segment.append(b"b") for _ in range(8)]
+                threads = [
+                    threading.Thread(target=segment.sync, args=(end,)) for end in ends
+                ]
+                for t in threads:
+                    t.start()
+                release.set()
+                for t in [first, *threads]:
+                    t.join()
+
+            self.assertEqual(len(fsyncs), 2)
+            segment.close()
+
+
+class AsyncProduceTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.logs = LogManager(Path(self.dir.name))
+        context = Context.build({"foo": TOPIC}, [partition(0), partition(1)])
+        patches = [
+            mock.patch.object(kafka_handlers, "LOGS", self.logs),
+            mock.patch.object(kafka_handlers, "CONTEXT", context),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.logs.close()
+        self.dir.cleanup()
+
+    async def test_produce_does_not_block_the_loop(self):
+        # both requests wait for their fsync at the same time, which only
+        # happens if neither runs on the event loop
+        synced = threading.Barrier(2, timeout=5)
+        with mock.patch.object(LogSegment, "sync", lambda segment, end: synced.wait()):
+            responses = await asyncio.gather(
+                main.kafka_response_buffers_async(
+                    produce_request([(0, batch(0, [b"a"]))], correlation_id=1)
+                ),
+                main.kafka_response_buffers_async(
+                    produce_request([(1, batch(0, [b"b"]))], correlation_id=2)
+                ),
+            )
+
+        for buffers, index in zip(responses, (0, 1)):
+            response = b"".join(buffers)
+            self.assertEqual(response[4:8], (index + 1).to_bytes(INT32))
+            self.assertEqual(len(self.logs.get("foo", index).read(0, 1 << 20, True)), 1)
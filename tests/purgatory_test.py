@@ -0,0 +1,149 @@
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+from uuid import UUID
+
+from app import kafka_handlers, kafka_parser
+from app.api_keys.fetch import (
+    FetchRequest_V17,
+    FetchRequest_V17Partition,
+    FetchRequest_V17Topic,
+)
+from app.api_keys.produce import (
+    ProducePartitionData,
+    ProduceRequest,
+    ProduceTopicData,
+)
+from app.metadata import Context
+from app.purgatory import DelayedResponse, Purgatory
+from app.storage import LogManager
+from tests.metadata_log import batch
+
+TOPIC = UUID(int=1)
+
+
+def produce(records: bytes):
+    partition = ProducePartitionData(0, memoryview(records), 0)
+    body = ProduceRequest(None, 1, 1000, [ProduceTopicData("foo", [partition], 0)], 0)
+    kafka_handlers.produce(None, body)
+
+
+def delayed(purgatory: Purgatory, ready: list[bool], wait_s: float):
+    def complete(expired: bool) -> str | None:
+        if ready[0]:
+            return "ready"
+        return "expired" if expired else None
+
+    deadline = time.monotonic() + wait_s
+    return DelayedResponse(purgatory, [("foo", 0)], deadline, complete)
+
+
+class DelayedResponseTestCase(unittest.TestCase):
+    def notify_later(self, purgatory: Purgatory, ready: list[bool]):
+        def append():
+            time.sleep(0.05)
+            ready[0] = True
+            purgatory.notify(("foo", 0))
+
+        thread = threading.Thread(target=append)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_woken_by_notify(self):
+        purgatory = Purgatory()
+        ready = [False]
+        self.notify_later(purgatory, ready)
+
+        start = time.monotonic()
+        self.assertEqual(delayed(purgatory, ready, 10).wait(), "ready")
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_expires(self):
+        purgatory = Purgatory()
+        self.assertEqual(delayed(purgatory, [False], 0.05).wait(), "expired")
+        # the waiter is gone once answered
+        self.assertEqual(purgatory._waiters, {})
+
+    def test_async_woken_by_notify(self):
+        purgatory = Purgatory()
+        ready = [False]
+        self.notify_later(purgatory, ready)
+
+        async def wait():
+            # the event loop keeps running other tasks meanwhile
+            ticks = 0
+            waiting = asyncio.create_task(delayed(purgatory, ready, 10).wait_async())
+            while not waiting.done():
+                ticks += 1
+                await asyncio.sleep(0.001)
+            return await waiting, ticks
+
+        response, ticks = asyncio.run(wait())
+        self.assertEqual(response, "ready")
+        self.assertGreater(ticks, 1)
+
+    def test_async_expires(self):
+        response = asyncio.run(delayed(Purgatory(), [False], 0.05).wait_async())
+        self.assertEqual(response, "expired")
+
+
+class FetchLongPollTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.logs = LogManager(Path(self.dir.name))
+        replicas = kafka_parser.int32_array(b"\x00\x00\x00\x01")
+        partition = kafka_parser.PartitionRecordValue(
+            0, TOPIC.bytes, replicas, replicas, replicas[:0], replicas[:0], 1, 0, 0, ()
+        )
+        context = Context.build({"foo": TOPIC}, [partition])
+        patches = [
+            mock.patch.object(kafka_handlers, "LOGS", self.logs),
+            mock.patch.object(kafka_handlers, "CONTEXT", context),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.logs.close()
+        self.dir.cleanup()
+
+    def fetch(self, topic_id: UUID, max_wait_ms: int):
+        p = FetchRequest_V17Partition(0, 0, 0, 0, 0, 1 << 20, 0)
+        topic = FetchRequest_V17Topic(topic_id, [p], 0)
+        body = FetchRequest_V17(max_wait_ms, 1, 1 << 20, 0, 0, 0, [topic], [], "", 0)
+        return kafka_handlers.fetch(None, body)
+
+    def test_answered_right_away(self):
+        # no wait, an error, or enough bytes
+        self.assertNotIsInstance(self.fetch(TOPIC, 0), DelayedResponse)
+        self.assertNotIsInstance(self.fetch(UUID(int=2), 500), DelayedResponse)
+        produce(batch(0, [b"a"]))
+        self.assertNotIsInstance(self.fetch(TOPIC, 500), DelayedResponse)
+
+    def test_woken_by_produce(self):
+        response = self.fetch(TOPIC, 10_000)
+        self.assertIsInstance(response, DelayedResponse)
+
+        def produce_later():
+            time.sleep(0.05)
+            produce(batch(0, [b"a"]))
+
+        thread = threading.Thread(target=produce_later)
+        thread.start()
+        start = time.monotonic()
+        response = response.wait()
+        thread.join()
+
+        self.assertLess(time.monotonic() - start, 5)
+        (topic,) = response.responses
+        self.assertEqual(b"".join(topic.partitions[0].records), batch(0, [b"a"]))
+
+    def test_times_out_empty(self):
+        response = self.fetch(TOPIC, 50).wait()
+        (topic,) = response.responses
+        self.assertEqual(topic.partitions[0].records, [])
@@ -0,0 +1,82 @@
+import unittest
+from array import array
+from uuid import UUID
+
+from app import kafka_parser
+from app.kafka_encode import Encoded
+from app.kafka_parser import PartitionRecordValue
+from app.metadata import Context, ContextBuilder
+from app.topic_descriptions import TopicDescriptionCache
+from tests.metadata_log import DIRECTORY, topic_uuid
+
+
+def partition(index: int, topic: int) -> PartitionRecordValue:
+    replicas = array("i", [1])
+    return PartitionRecordValue(
+        index,
+        topic_uuid(topic).bytes,
+        replicas,
+        replicas,
+        array("i"),
+        array("i"),
+        1,
+        0,
+        0,
+        (DIRECTORY.bytes,),
+    )
+
+
+class TopicDescriptionCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.described: list[str] = []
+        topics = {"foo": topic_uuid(1), "bar": topic_uuid(2), "empty": topic_uuid(3)}
+        partitions = [partition(0, 1), partition(1, 1), partition(0, 2)]
+        self.context = Context.build(topics, partitions)
+        self.cache = TopicDescriptionCache()
+
+    def describe(
+        self, name: str, topic_id: UUID, partitions: list[PartitionRecordValue]
+    ) -> Encoded:
+        self.described.append(name)
+        return Encoded(f"{name}:{len(partitions)}".encode())
+
+    def test_encoded_once(self):
+        foo = self.cache.get(self.context, "foo", self.describe)
+        empty = self.cache.get(self.context, "empty", self.describe)
+
+        self.assertEqual(foo.data, b"foo:2")
+        self.assertEqual(empty.data, b"empty:0")
+        self.assertIs(self.cache.get(self.context, "foo", self.describe), foo)
+        self.assertIs(self.cache.get(self.context, "empty", self.describe), empty)
+        self.assertEqual(self.described, ["foo", "empty"])
+
+    def test_changed_topic_encoded_again(self):
+        foo = self.cache.get(self.context, "foo", self.describe)
+        bar = self.cache.get(self.context, "bar", self.describe)
+
+        builder = ContextBuilder(self.context)
+        builder.apply(partition(1, 2))
+        context = builder.build()
+
+        self.assertIs(self.cache.get(context, "foo", self.describe), foo)
+        new_bar = self.cache.get(context, "bar", self.describe)
+        self.assertEqual((bar.data, new_bar.data), (b"bar:1", b"bar:2"))
+        self.assertEqual(self.described, ["foo", "bar", "bar"])
+
+    def test_removed_and_recreated_topic(self):
+        self.cache.get(self.context, "foo", self.describe)
+        self.cache.get(self.context, "bar", self.describe)
+
+        builder = ContextBuilder(self.context)
+        builder.apply(kafka_parser.RemoveTopicRecord(topic_uuid(1).bytes))
+        context = builder.build()
+        self.cache.get(context, "bar", self.describe)
+        self.assertEqual(len(self.cache), 1)
+
+        # the same name, another id
+        builder = ContextBuilder(context)
+        builder.apply(kafka_parser.TopicRecord("bar", topic_uuid(4)))
+        context = builder.build()
+        bar = self.cache.get(context, "bar", self.describe)
+        self.assertEqual(bar.data, b"bar:0")
+        self.assertEqual(self.described, ["foo", "bar", "bar"])
@@ -0,0 +1,52 @@
+import random
+import unittest
+
+from app.kafka_parser.parser_utils import ByteReader, decode_unsigned_varint
+from app.utils import encode_unsigned_varint, encode_varint, encode_varlong
+from tests.legacy_varint import legacy_encode_var_int, legacy_parse_varint
+
+
+class VarintTestCase(unittest.TestCase):
+    def values(self, bits: int) -> list[int]:
+        rng = random.Random(bits)
+        edges = [0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, (1 << bits) - 1]
+        return edges + [rng.getrandbits(rng.randint(1, bits)) for _ in range(2000)]
+
+    def test_unsigned_matches_legacy(self):
+        for v in self.values(64):
+            encoded = encode_unsigned_varint(v)
+            self.assertEqual(encoded, legacy_encode_var_int(v))
+            self.assertEqual(legacy_parse_varint(encoded + b"tail"), (v, b"tail"))
+            self.assertEqual(
+                decode_unsigned_varint(encoded + b"tail", 0), (v, len(encoded))
+            )
+
+    def test_zigzag_round_trip(self):
+        for v in self.values(31):
+            for signed in (v, -v, -v - 1):
+                encoded = encode_varint(signed) + encode_varlong(signed << 32)
+                reader = ByteReader(encoded)
+                self.assertEqual(reader.read_varint(), signed)
+                self.assertEqual(reader.read_varlong(), signed << 32)
+                self.assertEqual(reader.remaining(), 0)
+
+    def test_zigzag_known_values(self):
+        expected = {
+            0: b"\x00",
+            -1: b"\x01",
+            1: b"\x02",
+            -2: b"\x03",
+            63: b"\x7e",
+            -64: b"\x7f",
+            64: b"\x80\x01",
+        }
+        for value, encoded in expected.items():
+            self.assertEqual(encode_varint(value), encoded)
+
+    def test_out_of_range(self):
+        with self.assertRaises(OverflowError):
+            encode_varint(1 << 31)
+        with self.assertRaises(OverflowError):
+            encode_varlong(-(1 << 63) - 1)
+        with self.assertRaises(OverflowError):
+            encode_unsigned_varint(-1)
@@ -0,0 +1,66 @@
+import gc
+import os
+import signal
+import time
+import unittest
+from unittest import mock
+
+from app import workers
+
+
+def failing_serve():
+    raise OSError("address already in use")
+
+
+class RunWorkersTestCase(unittest.TestCase):
+    def setUp(self):
+        handlers = {s: signal.getsignal(s) for s in (signal.SIGTERM, signal.SIGINT)}
+        for signum, handler in handlers.items():
+            self.addCleanup(signal.signal, signum, handler)
+        self.addCleanup(gc.unfreeze)
+        # the workers inherit it, their errors are expected
+        patcher = mock.patch("sys.stderr")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_gives_up_on_workers_failing_to_start(self):
+        with (
+            mock.patch.object(workers, "RESTART_BACKOFF_S", 0.001),
+            mock.patch.object(os, "fork", wraps=os.fork) as fork,
+        ):
+            code = workers.run_workers(2, failing_serve)
+
+        self.assertEqual(code, 1)
+        # 2 workers, then a restart per failure until MAX_FAILED_STARTS
+        self.assertEqual(fork.call_count, 2 + workers.MAX_FAILED_STARTS - 1)
+
+    def test_restarts_workers_that_ran(self):
+        runs = 0
+
+        def serve():
+            time.sleep(0.05)
+            os._exit(0)
+
+        def counting_fork():
+            nonlocal runs
+            runs += 1
+            if runs == 4:
+                # stop the supervisor from the parent
+                os.kill(os.getpid(), signal.SIGTERM)
+            return fork()
+
+        fork = os.fork
+        with (
+            mock.patch.object(workers, "MIN_UPTIME_S", 0.01),
+            mock.patch.object(os, "fork", counting_fork),
+        ):
+            code = workers.run_workers(1, serve)
+
+        self.assertEqual(code, 0)
+        self.assertGreaterEqual(runs, 4)
+
+    def test_restart_delay(self):
+        self.assertEqual(workers.restart_delay(0), 0.0)
+        self.assertEqual(workers.restart_delay(1), workers.RESTART_BACKOFF_S)
+        self.assertEqual(workers.restart_delay(3), workers.RESTART_BACKOFF_S * 4)
+        self.assertEqual(workers.restart_delay(100), workers.MAX_RESTART_BACKOFF_S)